@@ -0,0 +1,188 @@
+"""
+基准测试用例
+
+每个用例是一个 (quick: bool) -> dict 的函数，返回每轮耗时列表 latencies（秒）、
+每轮处理的数量 items 及其单位 unit，由 run.py 汇总为吞吐量和分位数。
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from fixtures import (
+    PLUGIN_ROOT,
+    ImageServer,
+    encode_page,
+    fake_album,
+    fake_event,
+    fake_publisher,
+    make_album,
+    plugin_module,
+    synthetic_page,
+)
+
+GILBERT_SIZES = [(256, 256), (1080, 1920), (2000, 3000)]
+PROCESS_SIZES = [(800, 1200), (1080, 1920), (2000, 3000)]
+ALBUM_PAGES = [50, 500, 2000]
+
+
+def _timed(func: Callable[[], object], repeat: int, warmup: int = 0) -> list[float]:
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _timed_async(
+    func: Callable[[], Awaitable[object]], repeat: int, warmup: int = 0
+) -> list[float]:
+    for _ in range(warmup):
+        await func()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _fanqie(pool, sessions):
+    fanqiehex = plugin_module("tools.image_hex.fanqiehex")
+    return fanqiehex.FanqieHex(pool, sessions)
+
+
+def bench_gilbert(width: int, height: int, quick: bool) -> dict:
+    session_module = plugin_module("tools.image_hex.session")
+    hex = _fanqie(None, session_module.SessionManager())
+    repeat = 3 if quick else 10
+    latencies = _timed(lambda: hex.gilbert2d(width, height), repeat, warmup=1)
+    return {"latencies": latencies, "items": width * height, "unit": "px"}
+
+
+def bench_process(mode: str, width: int, height: int, quick: bool) -> dict:
+    """
+    FanqieHex.process 的完整流程：从本机桩服务器下载、在进程池中置换并编码
+
+    第一轮包含子进程启动和置换索引生成，作为预热不计入结果。
+    """
+    pool_module = plugin_module("tools.image_hex.pool")
+    session_module = plugin_module("tools.image_hex.session")
+    transform = plugin_module("tools.image_hex.transform")
+
+    source = encode_page(synthetic_page(width, height), "JPEG", quality=90)
+    if mode == "decrypt":
+        source = transform.transform_image(source, "encrypt")
+
+    async def run() -> list[float]:
+        server = ImageServer()
+        await server.start()
+        sessions = session_module.SessionManager()
+        pool = pool_module.HexWorkerPool(max_workers=1, max_queue=1)
+        try:
+            hex = _fanqie(pool, sessions)
+            event = fake_event([server.add("page", source)])
+            return await _timed_async(
+                lambda: hex.process(event, mode), 3 if quick else 10, warmup=1
+            )
+        finally:
+            # 等待子进程退出，子进程的峰值内存才会计入 RUSAGE_CHILDREN
+            pool.shutdown(wait=True)
+            await sessions.close()
+            await server.close()
+
+    return {"latencies": asyncio.run(run()), "items": 1, "unit": "images"}
+
+
+def bench_webp_to_pdf(pages: int, quick: bool) -> dict:
+    jm = plugin_module("jm")
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "album")
+        make_album(folder, pages)
+        output = os.path.join(tmp, "album.pdf")
+        repeat = 1 if quick or pages >= 2000 else 3
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 2) as executor:
+            latencies = _timed(lambda: jm.webp_to_pdf(folder, output, executor), repeat)
+    return {"latencies": latencies, "items": pages, "unit": "pages"}
+
+
+def bench_getgraph_html(chapters: int, images: int, quick: bool) -> dict:
+    jm = plugin_module("jm")
+    image_dict = fake_album(chapters, images)
+
+    def build():
+        for key in sorted(image_dict):
+            jm.chapter_pages(key, image_dict[key], "100000", "基准测试本子")
+
+    latencies = _timed(build, 5 if quick else 20, warmup=1)
+    return {"latencies": latencies, "items": chapters * images, "unit": "images"}
+
+
+def bench_getgraph_publish(
+    chapters: int, images: int, latency: float, quick: bool
+) -> dict:
+    """getgraph 的拼接 + 并发发布，Telegraph 换成固定延迟的假客户端"""
+    jm = plugin_module("jm")
+    image_dict = fake_album(chapters, images)
+
+    async def run() -> list[float]:
+        publisher = fake_publisher(latency)
+        return await _timed_async(
+            lambda: jm.getgraph(image_dict, "100000", "基准测试本子", publisher),
+            3 if quick else 10,
+        )
+
+    return {"latencies": asyncio.run(run()), "items": chapters, "unit": "chapters"}
+
+
+def bench_plugin_import(quick: bool) -> dict:
+    """
+    在全新的解释器中导入插件入口模块，衡量插件加载耗时
+
+    AstrBot 和 aiohttp 在机器人中总是已经加载，先导入它们，只计插件自身的导入耗时；
+    子进程的峰值内存即闲置插件的常驻内存，记入 peak_child_rss_mb。
+    """
+    code = (
+        "import importlib, sys, time\n"
+        "import aiohttp\n"
+        "import astrbot.api, astrbot.api.event, astrbot.api.star\n"
+        f"sys.path.insert(0, {str(PLUGIN_ROOT.parent)!r})\n"
+        "start = time.perf_counter()\n"
+        f"importlib.import_module({PLUGIN_ROOT.name + '.main'!r})\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    latencies = []
+    for _ in range(3 if quick else 10):
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        latencies.append(float(result.stdout.split()[-1]))
+    return {"latencies": latencies, "items": 1, "unit": "imports"}
+
+
+def all_cases() -> dict[str, Callable[[bool], dict]]:
+    cases: dict[str, Callable[[bool], dict]] = {}
+    for width, height in GILBERT_SIZES:
+        cases[f"gilbert2d[{width}x{height}]"] = partial(bench_gilbert, width, height)
+    for mode in ("encrypt", "decrypt"):
+        for width, height in PROCESS_SIZES:
+            cases[f"process[{mode},{width}x{height}]"] = partial(
+                bench_process, mode, width, height
+            )
+    for pages in ALBUM_PAGES:
+        cases[f"webp_to_pdf[{pages}p]"] = partial(bench_webp_to_pdf, pages)
+    cases["getgraph.html[50x80]"] = partial(bench_getgraph_html, 50, 80)
+    cases["getgraph.publish[50x80,20ms]"] = partial(
+        bench_getgraph_publish, 50, 80, 0.02
+    )
+    cases["plugin.import"] = bench_plugin_import
+    return cases
@@ -0,0 +1,161 @@
+"""
+基准测试使用的离线数据和替身
+
+所有数据都在本地生成：图片由 NumPy 合成，图片下载走本机的 aiohttp 桩服务器，
+Telegraph 用进程内的假客户端代替，因此运行时不需要访问网络。
+"""
+
+import asyncio
+import importlib
+import io
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+from aiohttp import web
+from PIL import Image
+
+# 插件目录本身是一个包（内部使用相对导入），把它的上级目录加入搜索路径后按包名导入
+PLUGIN_ROOT = Path(__file__).resolve().parents[1]
+if str(PLUGIN_ROOT.parent) not in sys.path:
+    sys.path.insert(0, str(PLUGIN_ROOT.parent))
+
+
+def plugin_module(name: str):
+    """导入插件内的模块，例如 plugin_module("jm")"""
+    return importlib.import_module(f"{PLUGIN_ROOT.name}.{name}")
+
+
+def synthetic_page(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    合成一张类似漫画页的 RGB 图片：平滑渐变背景 + 若干色块 + 少量噪点
+
+    纯随机噪声无法压缩，编码耗时和体积都与真实图片相差很大，这里刻意避免。
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = (x * 160 // max(1, width - 1) + y * 80 // max(1, height - 1)).astype(
+        np.uint8
+    )
+    page = np.stack([base, 255 - base, base // 2 + 64], axis=-1)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        x1 = min(width, x0 + rng.integers(8, max(9, width // 3)))
+        y1 = min(height, y0 + rng.integers(8, max(9, height // 4)))
+        page[y0:y1, x0:x1] = rng.integers(0, 256, 3, dtype=np.uint8)
+    noise = rng.integers(0, 8, (height, width, 1), dtype=np.uint8)
+    return np.maximum(page, 8) - noise
+
+
+def encode_page(pixels: np.ndarray, fmt: str = "JPEG", **params) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def make_album(folder: str, pages: int, width: int = 720, height: int = 1024) -> int:
+    """
+    在 folder 中生成 pages 张 WebP 页面，文件名与 jmcomic 下载结果一致（00001.webp）
+
+    只编码少量不同的页面模板并循环复制，生成 2000 页的相册也只需几秒。
+    """
+    os.makedirs(folder, exist_ok=True)
+    templates = [
+        encode_page(synthetic_page(width, height, seed), "WEBP", quality=85)
+        for seed in range(min(pages, 8))
+    ]
+    for i in range(pages):
+        with open(os.path.join(folder, f"{i + 1:05d}.webp"), "wb") as f:
+            f.write(templates[i % len(templates)])
+    return pages
+
+
+class ImageServer:
+    """本机 HTTP 桩服务器，按名称返回预先放入的图片字节"""
+
+    def __init__(self):
+        self.images: dict[str, bytes] = {}
+        self._runner: web.AppRunner | None = None
+        self.base_url = ""
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        data = self.images.get(request.match_info["name"])
+        if data is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=data, content_type="application/octet-stream")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/img/{name}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    def add(self, name: str, data: bytes) -> str:
+        """放入一张图片，返回它的下载地址"""
+        self.images[name] = data
+        return f"{self.base_url}/img/{name}"
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def fake_event(urls: list[str]):
+    """只包含图片消息段的假消息事件，结构与 AstrMessageEvent 中用到的部分一致"""
+    import astrbot.core.message.components as Comp
+
+    message = [Comp.Image(file=url, url=url) for url in urls]
+    return SimpleNamespace(message_obj=SimpleNamespace(message=message))
+
+
+class FakeTelegraph:
+    """模拟 Telegraph 客户端，每次建页等待 latency 秒后返回一个假链接"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.pages = 0
+
+    async def create_page(self, title: str, html_content: str = "") -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.pages += 1
+        return {"url": f"https://telegra.ph/{title}-{self.pages}"}
+
+
+def fake_publisher(latency: float = 0.0, concurrency: int = 4):
+    """
+    使用假 Telegraph 客户端的 TelegraphPublisher
+
+    令牌桶放宽到不限速，测量的是页面拼接和并发发布本身的开销。
+    """
+    publisher_module = plugin_module("tools.jm.telegraph_publisher")
+
+    class FakePublisher(publisher_module.TelegraphPublisher):
+        def __init__(self):
+            super().__init__(token_path=os.devnull, concurrency=concurrency)
+            self._bucket = publisher_module.AdaptiveTokenBucket(
+                rate=1e9, burst=1_000_000
+            )
+            self.client = FakeTelegraph(latency)
+
+        async def _client(self):
+            return self.client
+
+    return FakePublisher()
+
+
+def fake_album(chapters: int, images_per_chapter: int) -> dict[str, list[str]]:
+    """getgraph 使用的 {"chapter_<id>:<名称>": [图片链接]} 字典"""
+    return {
+        f"chapter_{100000 + c}:第{c + 1}话": [
+            f"https://cdn-msp.example.org/media/photos/{100000 + c}/{i + 1:05d}.webp"
+            for i in range(images_per_chapter)
+        ]
+        for c in range(chapters)
+    }
@@ -0,0 +1,147 @@
+"""
+插件热点路径的性能基准
+
+用法（在插件目录下运行，需要安装插件依赖和 AstrBot）:
+    python benchmarks/run.py                   # 运行全部用例
+    python benchmarks/run.py -k process --quick
+    python benchmarks/run.py --save v1.0       # 结果保存为 benchmarks/baselines/v1.0.json
+    python benchmarks/run.py --compare v1.0    # 与保存的基线对比，p50 变慢超过容差时返回 1
+
+每个用例在独立的子进程中运行，峰值内存 (RSS) 互不影响；
+图片下载和 Telegraph 发布都使用本机的桩服务器和假客户端，不访问网络。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from cases import all_cases
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def _rss_mb(who: int) -> float:
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_case(name: str, quick: bool) -> dict:
+    """在子进程中运行单个用例并汇总统计数据"""
+    result = all_cases()[name](quick)
+    latencies = np.asarray(result["latencies"])
+    total = float(latencies.sum())
+    return {
+        "unit": result["unit"],
+        "items": result["items"],
+        "runs": len(latencies),
+        "throughput": result["items"] * len(latencies) / total if total else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "mean_ms": float(latencies.mean()) * 1000,
+        "peak_rss_mb": _rss_mb(resource.RUSAGE_SELF),
+        # 进程池子进程的峰值（取其中最大的一个）
+        "peak_child_rss_mb": _rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def run(names: list[str], quick: bool) -> dict[str, dict]:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(_run_case, name, quick).result()
+        results[name] = result
+        print(
+            f"{name:<36} {result['throughput']:>14,.1f} {result['unit']}/s"
+            f"  p50 {result['p50_ms']:>10.2f} ms  p99 {result['p99_ms']:>10.2f} ms"
+            f"  rss {result['peak_rss_mb']:>7.1f} MB"
+            f" (子进程 {result['peak_child_rss_mb']:.1f} MB)",
+            flush=True,
+        )
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict, tolerance: float) -> bool:
+    """打印与基线的对比，返回是否存在超过容差的性能退化"""
+    regressed = False
+    print(f"\n与基线 {baseline['name']} ({baseline['created']}) 对比:")
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None or not old["p50_ms"]:
+            print(f"  {name:<36} 基线中没有该用例")
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        rss_delta = result["peak_rss_mb"] - old["peak_rss_mb"]
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  <-- 变慢"
+            regressed = True
+        print(f"  {name:<36} p50 x{ratio:.2f}  rss {rss_delta:+.1f} MB{mark}")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="插件热点路径的性能基准")
+    parser.add_argument(
+        "-k", dest="filter", default="", help="只运行名称包含该字符串的用例"
+    )
+    parser.add_argument("--quick", action="store_true", help="减少重复次数，快速检查")
+    parser.add_argument("--list", action="store_true", help="列出全部用例")
+    parser.add_argument("--save", metavar="NAME", help="把结果保存为基线")
+    parser.add_argument("--compare", metavar="NAME", help="与保存的基线对比")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="p50 允许变慢的比例，默认 0.1"
+    )
+    args = parser.parse_args()
+
+    names = [name for name in all_cases() if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        print(f"没有匹配 {args.filter!r} 的用例")
+        return 1
+
+    baseline = None
+    if args.compare:
+        with open(BASELINE_DIR / f"{args.compare}.json", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = run(names, args.quick)
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "name": args.save,
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "quick": args.quick,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"\n基线已保存到 {path}")
+
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,181 +1,730 @@
 import asyncio
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import partial
 
-import img2pdf
-from jmcomic import (
-    JmImageDetail,
-    create_option_by_file,
-    download_album,
-    multi_thread_launcher,
+from astrbot.api import logger
+from jmcomic import JmDownloader, JmImageTool, create_option_by_file, download_album
+from jmcomic.jm_downloader import catch_exception
+
+from .tools.jm.album_cache import (
+    AlbumCache,
+    album_version,
+    parts_path,
+    photo_ids_version,
 )
-from telegraph.aio import RetryAfterError, Telegraph
+from .tools.jm.domains import DomainController
+from .tools.jm.manifest import DownloadManifest, data_digest, manifest_path
+from .tools.jm.metadata import JmMetadata
+from .tools.jm.options import JmOptionService
+from .tools.jm.progress import DownloadProgress, ThroughputModel, format_duration
+from .tools.jm.telegraph_publisher import TelegraphPublisher, split_chapter_html
+from .tools.metrics.registry import metrics
+from .tools.pdf.pages import PageOptions, encode_page, normalize_page
+from .tools.pdf.volumes import VolumeOptions, VolumeWriter, volume_files
+from .tools.pdf.writer import OrderedPageWriter, images_to_pdf, merge_pdfs
 
-from astrbot.api import logger
+# jmcomic 可能保存的图片格式（由 op.yml 的 download.image.suffix 决定）
+IMAGE_SUFFIXES = (".webp", ".jpg", ".jpeg", ".png")
+
+
+class PdfConvertError(Exception):
+    """图片转换为 PDF 失败"""
 
 
-def webp_to_pdf(folder_name, output_pdf):
-    # 获取所有webp图片并按名称排序
+class IncompleteAlbumError(Exception):
+    """本子下载不完整，且不允许生成不完整的 PDF"""
+
+
+def webp_to_pdf(
+    folder_name,
+    output_pdf,
+    executor: Executor | None = None,
+    options: PageOptions | None = None,
+):
+    # 获取所有图片并按名称排序
     try:
-        files = [f for f in os.listdir(folder_name) if f.lower().endswith(".webp")]
+        files = [
+            f for f in os.listdir(folder_name) if f.lower().endswith(IMAGE_SUFFIXES)
+        ]
         files.sort()
         file_paths = [os.path.join(folder_name, f) for f in files]
 
-        # 合并为PDF
-        with open(output_pdf, "wb") as f:
-            b = img2pdf.convert(file_paths)
-            if b:
-                f.write(b)
+        # 逐页转换并分批写入磁盘，避免整本 PDF 一次性占用内存
+        images_to_pdf(file_paths, output_pdf, executor=executor, options=options)
 
         # 返回文件数量
         return len(files)
     except Exception as e:
-        raise Exception(f"转换PDF时出错: {str(e)}")
+        raise PdfConvertError(f"转换PDF时出错: {e}") from e
+
+
+class _CapturedImageTool(JmImageTool):
+    """借用 jmcomic 的图片解密算法，解密结果留在内存中而不是保存为文件"""
+
+    @classmethod
+    def save_image(cls, image, filepath):
+        filepath.append(image)
+
+
+def _decode_image(content: bytes, image, decode: bool):
+    src = JmImageTool.open_image(content)
+    if not decode:
+        return src
+    num = JmImageTool.get_num_by_url(
+        image.scramble_id, image.download_url.split("?")[0]
+    )
+    if num == 0:
+        return src
+    decoded = []
+    _CapturedImageTool.decode_and_save(num, src, decoded)
+    return decoded[0]
+
+
+class ChapterPdfDownloader(JmDownloader):
+    """
+    每个章节下载完成后立即回调，让该章节的 PDF 转换与后续章节的下载并行进行
+
+    提供 manifest 时，已存在且校验通过的图片直接复用，损坏的图片删除后重新下载，
+    下载完成的图片记录大小和摘要，中断后再次下载只补齐缺失的部分。
+
+    提供 open_chapter 时为直出模式：章节开始时由它创建页面写入器，下载的图片
+    在内存中解密、编码后直接按页码写入章节 PDF，不再从磁盘读回；
+    keep_images 为假时连原图也不保存。
+
+    cancelled 被设置后剩余的章节和图片都跳过，已经开始的请求完成后下载线程即可返回；
+    被跳过的章节不再回调 on_photo_done。
+    """
+
+    def __init__(
+        self,
+        option,
+        on_photo_done,
+        progress: DownloadProgress | None = None,
+        manifest: DownloadManifest | None = None,
+        open_chapter=None,
+        page_options: PageOptions | None = None,
+        keep_images: bool = True,
+        cancelled: threading.Event | None = None,
+    ):
+        super().__init__(option)
+        self.on_photo_done = on_photo_done
+        self.progress = progress
+        self.manifest = manifest
+        self.open_chapter = open_chapter
+        self.page_options = page_options or PageOptions()
+        self.keep_images = keep_images
+        self.cancelled = cancelled
+        self.page_writers: dict[int, OrderedPageWriter] = {}
+
+    def is_cancelled(self) -> bool:
+        return self.cancelled is not None and self.cancelled.is_set()
+
+    def before_album(self, album):
+        super().before_album(album)
+        if self.progress is not None:
+            self.progress.album_started(len(album), int(album.page_count or 0))
+
+    def before_photo(self, photo):
+        super().before_photo(photo)
+        if self.is_cancelled():
+            photo.skip = True
+            return
+        if self.manifest is not None:
+            self.manifest.expect(
+                photo.photo_id,
+                photo.index,
+                [
+                    os.path.basename(self.option.decide_image_filepath(image))
+                    for image in photo
+                ],
+            )
+        if self.open_chapter is not None:
+            self.page_writers[photo.index] = self.open_chapter(photo)
+
+    def download_by_image_detail(self, image):
+        if self.is_cancelled():
+            return
+        if self.manifest is not None:
+            path = self.option.decide_image_filepath(image)
+            if os.path.exists(path):
+                if self.manifest.verify(image.from_photo.photo_id, path):
+                    self._reuse_image(image, path)
+                    return
+                logger.warning(f"[jm] 图片校验失败，重新下载: {path}")
+                metrics.inc("jm_download_corrupt_images")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            # 重新下载成功后会再次记录，失败时清单中不再保留旧记录
+            self.manifest.discard(image.from_photo.photo_id, path)
+        if self.open_chapter is not None:
+            self._download_direct(image)
+        else:
+            super().download_by_image_detail(image)
+
+    @catch_exception
+    def _download_direct(self, image):
+        """下载一张图片并在内存中解密，编码后直接写入章节 PDF"""
+        path = self.option.decide_image_filepath(image)
+        image.save_path = path
+        image.exists = False
+        self.before_image(image, path)
+        if image.skip:
+            return
+        resp = self.client.get_jm_image(image.download_url)
+        resp.require_success()
+        decode = (
+            self.option.decide_download_image_decode(image)
+            and image.scramble_id is not None
+        )
+        img = _decode_image(resp.content, image, decode)
+        if self.keep_images:
+            # 与 jmcomic 保存的文件一致：解密后的图片直接保存，不解密时保存原始数据
+            if decode:
+                JmImageTool.save_image(img, path)
+            else:
+                resp.transfer_to(path, image.scramble_id, False, image.download_url)
+        # 缩放会直接修改 img，需在保存原图之后编码
+        page = encode_page(img, self.page_options)
+        # 不保存原图时清单记录写入 PDF 的数据，保证章节完整性判断照常进行
+        image.page_digest = None if self.keep_images else data_digest(page)
+        # 页码取 image.index（从 1 开始），与并发下载的完成顺序无关
+        self.page_writers[image.from_photo.index].put(image.index, page)
+        self.after_image(image, path)
+
+    def _reuse_image(self, image, path: str):
+        """复用上次下载的图片，与新下载的图片一样计入章节结果"""
+        photo = image.from_photo
+        image.save_path = path
+        image.exists = True
+        self.download_success_dict[photo.from_album][photo].append((path, image))
+        metrics.inc("jm_download_reused_images")
+        if self.open_chapter is not None:
+            writer = self.page_writers[photo.index]
+            options = self.page_options
+            writer.put(
+                image.index,
+                normalize_page(
+                    path, None if options.cache else writer.tmp_dir, options
+                ),
+            )
+        if self.progress is not None:
+            self.progress.image_done(0)
+
+    def before_image(self, image, img_save_path):
+        super().before_image(image, img_save_path)
+        if self.is_cancelled():
+            image.skip = True
+
+    def after_image(self, image, img_save_path):
+        super().after_image(image, img_save_path)
+        digest = getattr(image, "page_digest", None)
+        if self.manifest is not None:
+            if digest is None:
+                self.manifest.record(image.from_photo.photo_id, img_save_path)
+            else:
+                self.manifest.record_digest(
+                    image.from_photo.photo_id, img_save_path, digest
+                )
+        if not metrics.enabled and self.progress is None:
+            return
+        if digest is not None:
+            size = digest[0]
+        else:
+            try:
+                size = os.path.getsize(img_save_path)
+            except OSError:
+                size = 0
+        metrics.inc("jm_download_images")
+        metrics.inc("jm_download_bytes", size)
+        if self.progress is not None:
+            self.progress.image_done(size)
+
+    def after_photo(self, photo):
+        super().after_photo(photo)
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.is_cancelled():
+            # 章节没有下载完，不再转换；已下载的图片记录在清单中，下次继续
+            writer = self.page_writers.pop(photo.index, None)
+            if writer is not None:
+                writer.abort()
+            return
+        if self.progress is not None:
+            images = self.download_success_dict[photo.from_album][photo]
+            self.progress.chapter_done(len(images))
+        self.on_photo_done(
+            photo,
+            self.option.decide_image_save_dir(photo),
+            self.page_writers.pop(photo.index, None),
+        )
 
 
-def cb(album, downloader, save_path, progress_callback):
-    try:
-        # 获取下载目录中的文件夹名称
-        download_folder = os.path.join(save_path, album.name)
-
-        # 计算文件数量用于预估转换时间
-        file_count = 0
-        if os.path.exists(download_folder):
-            file_count = len(
-                [f for f in os.listdir(download_folder) if f.lower().endswith(".webp")]
+async def JmDownload(
+    album_id: str,
+    save_path: str,
+    config_path: str = "",
+    progress_callback=None,
+    page_executor: Executor | None = None,
+    album_cache: AlbumCache | None = None,
+    throughput: ThroughputModel | None = None,
+    progress_interval: float = 15,
+    allow_partial: bool = True,
+    domains: DomainController | None = None,
+    page_options: PageOptions | None = None,
+    volumes: VolumeOptions | None = None,
+    direct: bool = False,
+    options: JmOptionService | None = None,
+):
+    """
+    异步下载本子并生成 PDF，返回 (PDF 路径列表, 图片数量)
+
+    download_album 在工作线程中执行，不会阻塞事件循环；
+    每个章节下载完成后立即在线程池中转换为章节 PDF，全部完成后再合并。
+    启用 volumes 分卷时不再合并整本，章节 PDF 按顺序组合为分卷，每写完一卷就通过
+    progress_callback(文本, 分卷路径) 推送，不必等整本完成；返回全部分卷。
+    下载清单记录每张图片的大小和摘要，中断后再次请求只下载缺失或损坏的图片。
+    只有全部图片校验通过才生成正式 PDF；否则 allow_partial 为真时生成文件名和标题
+    都带有「不完整」标记的 PDF（登记到缓存只为计入配额和清理，不会命中），
+    为假时抛出 IncompleteAlbumError。
+    progress_callback 为可选的协程函数，接收进度文本：下载过程中最多每
+    progress_interval 秒推送一次实际进度，下载完成时推送按 throughput
+    （本机历史转换速度）估算的剩余时间。
+    page_executor 为页面转换使用的进程池，不提供时在转换线程中串行转换；
+    page_options 控制页面的重新编码、缩放以及转换结果是否缓存在图片目录中。
+    direct 为真时图片下载后在内存中编码并直接写入章节 PDF，不再从磁盘读回；
+    原图只在提供 album_cache 且 page_options 开启页面缓存时保存，供中断后续传和
+    重新生成时复用（随缓存条目计入配额并清理），否则不保存，中断后再次请求需要
+    重新下载图片。是否保存与 op.yml 中的 download.cache 无关。
+    提供 album_cache 时命中缓存直接返回，不会创建 jmcomic 客户端。
+    提供 options 时使用它缓存的配置副本和共享客户端，不再读取 config_path。
+    提供 domains 时图片和 API 请求的并发数和域名由它自适应调整。
+    """
+    split = volumes is not None and volumes.enabled
+    # 分卷缓存为一个目录，目录名带有分卷参数，参数变化后不再复用
+    volume_suffix = f"_分卷_{volumes.tag()}" if split else ""
+    if album_cache is not None:
+        hit = await asyncio.to_thread(album_cache.get_pdf, album_id)
+        if hit and split and hit[0].endswith(volume_suffix) and os.path.isdir(hit[0]):
+            logger.info(f"[jm] 本子 {album_id} 命中分卷缓存")
+            metrics.inc("cache_requests", cache="album_pdf", result="hit")
+            return volume_files(hit[0]), hit[1]
+        if hit and not split and os.path.isfile(hit[0]):
+            logger.info(f"[jm] 本子 {album_id} 命中PDF缓存")
+            metrics.inc("cache_requests", cache="album_pdf", result="hit")
+            return [hit[0]], hit[1]
+        metrics.inc("cache_requests", cache="album_pdf", result="miss")
+
+    if options is not None:
+        # 下载目录只改在副本上，不影响其他请求
+        option = await asyncio.to_thread(options.request_option, save_path)
+    else:
+        # 如果没有提供配置文件路径，则使用默认路径
+        if config_path == "":
+            # 获取当前脚本所在目录
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            config_path = os.path.join(current_dir, "op.yml")
+
+        option = create_option_by_file(config_path)
+        # 更新下载目录为指定的保存路径
+        option.dir_rule.base_dir = save_path
+    # 确保保存目录存在
+    os.makedirs(save_path, exist_ok=True)
+
+    # 章节 PDF 暂存目录
+    parts_dir = parts_path(save_path, album_id)
+    converter = ThreadPoolExecutor(max_workers=2, thread_name_prefix="jm_pdf")
+    chapter_jobs: dict[int, Future] = {}
+    # 使用缓存时，未命中说明已有的 PDF 已过期或不在索引中，需要重新生成
+    reuse_existing = album_cache is None and not split
+    # 分卷模式下按章节顺序组装分卷，章节完成情况由下载线程通知
+    album_indices: list[int] = []
+    split_album = []
+    # 多个章节在不同的下载线程中同时完成，两个列表只能由第一个完成的章节填写一次
+    split_lock = threading.Lock()
+    chapter_complete: dict[int, bool] = {}
+    chapter_ready = asyncio.Event()
+    download_done = False
+    loop = asyncio.get_running_loop()
+    if throughput is None:
+        throughput = ThroughputModel(os.path.join(save_path, "throughput.json"))
+    progress = DownloadProgress(loop, progress_callback, throughput, progress_interval)
+    manifest = await asyncio.to_thread(
+        DownloadManifest, manifest_path(save_path, album_id)
+    )
+    # 直出模式下原图只为续传和页面缓存保留，没有缓存负责清理时不保存
+    keep_images = not direct or (
+        album_cache is not None and (page_options or PageOptions()).cache
+    )
+    # 请求被取消时通知下载线程尽快结束
+    cancelled = threading.Event()
+
+    def open_chapter(photo) -> OrderedPageWriter:
+        os.makedirs(parts_dir, exist_ok=True)
+        # 分段临时目录位于 parts_dir 中，下载中断时随 parts_dir 一起删除
+        return OrderedPageWriter(os.path.join(parts_dir, f"{photo.index:04d}.pdf"))
+
+    def close_chapter(writer: OrderedPageWriter, folder: str) -> int:
+        try:
+            with metrics.timer("pdf_convert"):
+                pages = writer.close()
+        except Exception as e:
+            raise PdfConvertError(f"转换PDF时出错: {e}") from e
+        progress.pages_written(pages)
+        if not keep_images:
+            # jmcomic 决定图片路径时会创建章节目录，没有保存图片时目录为空
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        return pages
+
+    def convert_chapter(photo_id: str, folder: str, part_pdf: str) -> int:
+        # 只转换清单中校验通过的图片，目录中残留的半截文件不会进入 PDF
+        files = manifest.image_paths(photo_id, folder)
+        if not files:
+            return 0
+        pages = 0
+        progress.convert_started()
+        try:
+            with metrics.timer("pdf_convert"):
+                images_to_pdf(
+                    files, part_pdf, executor=page_executor, options=page_options
+                )
+            pages = len(files)
+            return pages
+        except Exception as e:
+            raise PdfConvertError(f"转换PDF时出错: {e}") from e
+        finally:
+            progress.convert_finished(pages)
+
+    # 在下载线程中被调用，只提交任务，不等待
+    def on_photo_done(photo, folder: str, pages: OrderedPageWriter | None = None):
+        album = photo.from_album
+        if reuse_existing and os.path.exists(
+            os.path.join(save_path, f"{album.id}_{album.name}.pdf")
+        ):
+            if pages is not None:
+                pages.abort()
+            return
+        chapter_complete[photo.index] = manifest.is_complete([photo.photo_id])
+        if pages is not None:
+            # 直出模式下页面已经写好，只需写出最后一批并合并分段
+            chapter_jobs[photo.index] = converter.submit(close_chapter, pages, folder)
+        else:
+            os.makedirs(parts_dir, exist_ok=True)
+            part_pdf = os.path.join(parts_dir, f"{photo.index:04d}.pdf")
+            chapter_jobs[photo.index] = converter.submit(
+                convert_chapter, photo.photo_id, folder, part_pdf
             )
+        if split:
+            with split_lock:
+                if not split_album:
+                    album_indices.extend(sorted(p.index for p in album))
+                    split_album.append(album)
+            # 两个列表填好之后才唤醒组装分卷的协程
+            loop.call_soon_threadsafe(chapter_ready.set)
+
+    def volume_writer(album) -> VolumeWriter:
+        prefix = f"{album.id}_{album.name}"
+        volume_dir = os.path.join(save_path, prefix + volume_suffix)
+        shutil.rmtree(volume_dir, ignore_errors=True)
+        os.makedirs(volume_dir)
+        return VolumeWriter(
+            volumes,
+            lambda index, incomplete: os.path.join(
+                volume_dir,
+                f"{prefix}_第{index:02d}卷{'_不完整' if incomplete else ''}.pdf",
+            ),
+            album.name,
+        )
 
-        # 如果提供了进度回调函数，发送预估时间给用户
-        # 预估PDF制作时间（假设每张图片需要0.5秒处理时间）
-        estimated_time = file_count * 0.5
-        estimated_str = f"{estimated_time:.1f}秒"
-        # 使用同步方式调用回调函数
-        progress_callback(file_count, estimated_str)
+    async def assemble_volumes() -> tuple[list[str], str | None]:
+        """按章节顺序把章节 PDF 组合为分卷，每写完一卷立即推送，返回 (分卷, 分卷目录)"""
+        writer: VolumeWriter | None = None
+
+        async def deliver(paths: list[str]):
+            for index, path in enumerate(paths, len(writer.volumes) - len(paths) + 1):
+                metrics.inc("jm_volumes")
+                if progress_callback is not None:
+                    await progress_callback(f"第{index}卷已完成，发送中...", path)
+
+        position = 0
+        try:
+            while True:
+                await chapter_ready.wait()
+                chapter_ready.clear()
+                if writer is None and split_album:
+                    writer = await asyncio.to_thread(volume_writer, split_album[0])
+                while position < len(album_indices):
+                    index = album_indices[position]
+                    if index not in chapter_jobs:
+                        if not download_done:
+                            break
+                        # 下载结束仍没有该章节，说明章节下载失败，跳过
+                        position += 1
+                        continue
+                    pages = await asyncio.wrap_future(chapter_jobs[index])
+                    position += 1
+                    if pages:
+                        await deliver(
+                            await asyncio.to_thread(
+                                writer.add_chapter,
+                                os.path.join(parts_dir, f"{index:04d}.pdf"),
+                                chapter_complete[index],
+                            )
+                        )
+                if download_done and position >= len(album_indices):
+                    break
+            if writer is None:
+                return [], None
+            await deliver(await asyncio.to_thread(writer.finish))
+            return writer.volumes, os.path.dirname(writer.path_for(1, False))
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def merge_album(album, pdf_path: str, complete: bool):
+        """等待全部章节转换完成后合并为整本 PDF，返回 ([PDF 路径], PDF 路径)"""
+        part_pdfs = []
+        for index in sorted(chapter_jobs):
+            if await asyncio.wrap_future(chapter_jobs[index]):
+                part_pdfs.append(os.path.join(parts_dir, f"{index:04d}.pdf"))
+        if part_pdfs:
+            merge_start = time.perf_counter()
+            with metrics.timer("pdf_merge"):
+                await asyncio.to_thread(
+                    merge_pdfs,
+                    part_pdfs,
+                    pdf_path,
+                    album.name if complete else f"{album.name}（不完整）",
+                )
+            await asyncio.to_thread(
+                throughput.observe,
+                "merge",
+                progress.pages_converted,
+                time.perf_counter() - merge_start,
+            )
+        return [pdf_path], pdf_path
 
-        # 使用id_name的形式命名PDF文件，但需要处理特殊字符
-        # 移除或替换文件名中的特殊字符
+    assembler = asyncio.create_task(assemble_volumes()) if split else None
+    try:
+        if domains is not None and options is None:
+            await asyncio.to_thread(domains.attach, option)
+        # 在工作线程中执行下载，等待结果而不是轮询
+        download = asyncio.ensure_future(
+            asyncio.to_thread(
+                download_album,
+                album_id,
+                option,
+                partial(
+                    ChapterPdfDownloader,
+                    on_photo_done=on_photo_done,
+                    progress=progress,
+                    manifest=manifest,
+                    open_chapter=open_chapter if direct else None,
+                    page_options=page_options,
+                    keep_images=keep_images,
+                    cancelled=cancelled,
+                ),
+                # 下载失败的图片由下载清单判断，不在这里抛出
+                check_exception=False,
+            )
+        )
+        try:
+            with metrics.timer("jm_download"):
+                album, downloader = await asyncio.shield(download)
+        except asyncio.CancelledError:
+            # 取消协程不会停止工作线程：通知它跳过剩余图片，等它真正返回后
+            # 再退出，调度名额和下面的清理（转换线程池、parts_dir）才不会提前释放
+            cancelled.set()
+            await asyncio.wait([download])
+            raise
+        finally:
+            download_done = True
+            chapter_ready.set()
+        metrics.inc("jm_download_failed_images", len(downloader.download_failed_image))
+
+        # 使用id_name的形式命名PDF文件
         pdfname = f"{album.id}_{album.name}.pdf"
         pdf_path = os.path.join(save_path, pdfname)
-
-        # 确保保存目录存在
-        os.makedirs(save_path, exist_ok=True)
-
-        # 转换webp图片为PDF，并获取文件数量
-        if not os.path.exists(pdf_path):
-            webp_to_pdf(folder_name=download_folder, output_pdf=pdf_path)
-
-        # 返回PDF文件路径和文件数量
-        return pdf_path, file_count
-    except Exception as e:
-        raise Exception(f"处理PDF文件时出错: {str(e)}")
-
-
-def JmDownload(
-    album_id: str, save_path: str, config_path: str = "", progress_callback=None
-):
-    # 如果没有提供配置文件路径，则使用默认路径
-    if config_path == "":
-        # 获取当前脚本所在目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(current_dir, "op.yml")
-
-    option = create_option_by_file(config_path)
-    # 更新下载目录为指定的保存路径
-    option.dir_rule.base_dir = save_path
-
-    # 用于存储PDF路径和文件数量的变量
-    pdf_path_result = None
-    file_count_result = 0
-
-    # 定义回调函数
-    def download_callback(album, downloader):
-        nonlocal pdf_path_result, file_count_result
-        pdf_path_result, file_count_result = cb(
-            album, downloader, save_path, progress_callback
+        partial_path = os.path.join(save_path, f"{album.id}_{album.name}_不完整.pdf")
+        file_count = sum(
+            len(images)
+            for photo_dict in downloader.download_success_dict.values()
+            for images in photo_dict.values()
         )
 
-    # 执行下载
-    download_album(jm_album_id=album_id, option=option, callback=download_callback)
-
-    # 等待下载完成（简单等待一段时间，直到结果准备好）
-    import time
-
-    start_time = time.time()
-    while pdf_path_result is None and time.time() - start_time < 120:  # 最多等待2分钟
-        time.sleep(0.1)
-
-    # 返回PDF文件路径和文件数量
-    return pdf_path_result, file_count_result
-
-
-async def jmToph(albume_id: str, config_path: str) -> list[str]:
-    option = create_option_by_file(config_path)
-    client = option.new_jm_client()
-    album = client.get_album_detail(albume_id)
-
-    def blocking_io():
-        image_dict = {}
-
-        def fetch(photo):
-            # 章节实体类
-            photo = client.get_photo_detail(photo.photo_id, False)
-            print(f"章节id: {photo.photo_id}")
-            image_list: list[str] = []
-
-            # 图片实体类
-            image: JmImageDetail
-            for image in photo:
-                image_list.append(image.img_url)
+        complete = manifest.is_complete([photo.photo_id for photo in album])
+        folders = [
+            downloader.option.decide_image_save_dir(photo, ensure_exists=False)
+            for photo_dict in downloader.download_success_dict.values()
+            for photo in photo_dict
+        ]
+        if complete:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        else:
+            missing = manifest.missing()
+            if downloader.download_failed_photo:
+                missing_str = (
+                    f"{len(downloader.download_failed_photo)}个章节及{missing}张图片"
+                )
+            else:
+                missing_str = f"{missing}张图片"
+            if not allow_partial:
+                if album_cache is not None:
+                    # 已下载的图片留待下次续传，登记到缓存中计入配额
+                    await asyncio.to_thread(
+                        album_cache.put_partial,
+                        album_id,
+                        album_version(album),
+                        None,
+                        folders,
+                    )
+                raise IncompleteAlbumError(
+                    f"本子下载不完整，缺少{missing_str}，重新发送即可继续下载"
+                )
+            await progress.announce(
+                f"本子下载不完整，缺少{missing_str}，将生成不完整的PDF；"
+                "重新发送即可继续下载缺少的部分"
+            )
+            pdf_path = partial_path
 
-            image_dict[f"chapter_{photo.photo_id}:{photo.name}"] = image_list
+        if complete and reuse_existing and os.path.exists(pdf_path):
+            return [pdf_path], file_count
 
-        multi_thread_launcher(iter_objs=album, apply_each_obj_func=fetch)
-        return image_dict
+        # 下载结束时大部分章节已转换完成，按剩余页数和本机历史速度预估时间
+        progress.download_finished()
+        await progress.announce(
+            f"下载已完成，共{file_count}张图片，"
+            f"预计PDF制作还需: {format_duration(progress.remaining_seconds())}，请耐心等待..."
+        )
 
-    # 使用 asyncio.to_thread 在另一个线程运行同步代码，防止卡死机器人
-    # 注意：asyncio.to_thread 需要 Python 3.9+
-    image_dict = await asyncio.to_thread(blocking_io)
+        if split:
+            pdf_paths, pdf_path = await assembler
+        else:
+            pdf_paths, pdf_path = await merge_album(album, pdf_path, complete)
+
+        if album_cache is not None and pdf_path and os.path.exists(pdf_path):
+            if complete:
+                await asyncio.to_thread(
+                    album_cache.put_pdf,
+                    album_id,
+                    album_version(album),
+                    pdf_path,
+                    file_count,
+                    folders,
+                )
+            else:
+                # 不完整的 PDF（或分卷目录）不会被命中，登记后计入配额并随条目一起清理
+                await asyncio.to_thread(
+                    album_cache.put_partial,
+                    album_id,
+                    album_version(album),
+                    pdf_path,
+                    folders,
+                )
 
-    logger.info(f"image dict :{image_dict}")
-    return await getgraph(image_dict, album.id, album.name)
+        # 返回PDF文件路径和文件数量
+        return pdf_paths, file_count
+    finally:
+        if assembler is not None and not assembler.done():
+            assembler.cancel()
+        await asyncio.to_thread(converter.shutdown, True, cancel_futures=True)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        if domains is not None:
+            await asyncio.to_thread(domains.save)
+
+
+async def jmToph(
+    albume_id: str,
+    metadata: JmMetadata,
+    publisher: TelegraphPublisher,
+    album_cache: AlbumCache | None = None,
+    domains: DomainController | None = None,
+) -> list[str]:
+    """
+    把本子发布到 Telegraph，返回页面链接
+
+    提供 domains 时图片链接换成下载统计中表现最好的图片镜像。
+    """
+    if album_cache is not None:
+        if urls := await asyncio.to_thread(album_cache.get_urls, albume_id):
+            logger.info(f"[jm] 本子 {albume_id} 命中链接缓存")
+            metrics.inc("cache_requests", cache="album_urls", result="hit")
+            return urls
+        metrics.inc("cache_requests", cache="album_urls", result="miss")
+
+    album = await metadata.album(albume_id)
+
+    # 章节详情按获取完成的顺序返回，每拿到一个章节就立即开始发布
+    publish_tasks: dict[str, asyncio.Task] = {}
+    try:
+        async for photo in metadata.photos(album):
+            key = f"chapter_{photo['id']}:{photo['name']}"
+            image_urls = photo["image_urls"]
+            if domains is not None:
+                image_urls = [domains.image_url(url) for url in image_urls]
+            pages = chapter_pages(key, image_urls, album["id"], album["name"])
+            publish_tasks[key] = asyncio.create_task(publisher.publish(pages))
+
+        # 按 key 排序输出，与原来的顺序保持一致
+        urls = []
+        for key in sorted(publish_tasks):
+            urls.extend(
+                url.replace(".ph", ".kissnab.top") for url in await publish_tasks[key]
+            )
+    finally:
+        # 获取章节或某个章节发布失败（或请求被取消）时，其余发布任务不再继续
+        for task in publish_tasks.values():
+            task.cancel()
+        if publish_tasks:
+            await asyncio.wait(publish_tasks.values())
+    if album_cache is not None:
+        await asyncio.to_thread(
+            album_cache.put_urls,
+            albume_id,
+            photo_ids_version(album["photo_ids"]),
+            urls,
+        )
+    if domains is not None:
+        await asyncio.to_thread(domains.save)
+    return urls
+
+
+def chapter_pages(
+    key: str, image_urls: list[str], albume_id: str, albume_name: str
+) -> list[tuple[str, str]]:
+    """把一个章节转换为待发布的 (标题, HTML) 列表"""
+    id, chapter_name = key.split(":", 1)
+    id = id.replace("chapter_", "")
+    header = [f"<p>{albume_name}</p>"]
+    if id != albume_id:
+        header.append(f"<p>{chapter_name}</p>")
+    # 图片过多的章节拆分为多页，保持原有顺序
+    return [
+        (id, html_content)
+        for html_content in split_chapter_html("".join(header), image_urls)
+    ]
 
 
 async def getgraph(
-    image_dict: dict[str, list[str]], albume_id: str, albume_name: str
+    image_dict: dict[str, list[str]],
+    albume_id: str,
+    albume_name: str,
+    publisher: TelegraphPublisher,
 ) -> list[str]:
-    res = []
-    telegraph = Telegraph()
-    print(await telegraph.create_account(short_name="1337"))
-
-    html_content = f"<p>{albume_name}</p>"
+    pages: list[tuple[str, str]] = []
     # 对 key先后进行排序，然后遍历
     for key in sorted(image_dict.keys()):
-        id = key.split(":")[0].replace("chapter_", "")
-        if id != albume_id:
-            chapter_name = key.split(":")[1]
-            html_content += f"<p>{chapter_name}</p>"
-        for image_url in image_dict[key]:
-            html_content += f"<img src='{image_url}'></img>"
-        while True:
-            try:
-                logger.info("正在尝试发布到 Telegraph...")
-                response = await telegraph.create_page(
-                    id,
-                    html_content=html_content,
-                )
-                # 如果成功了，就跳出循环
-                break
-            except RetryAfterError as e:
-                # 如果触发限制
-                logger.info(
-                    f"Telegraph 限制频率（Flood control），需要等待 {e.retry_after} 秒..."
-                )
-                # 乖乖等待官方要求的时间，多加1秒缓冲
-                await asyncio.sleep(e.retry_after + 1)
-                logger.info("等待结束，正在重试...")
-            except Exception as e:
-                # 其他错误直接抛出
-                raise e
-        res.append(response["url"].replace(".ph", ".kissnab.top"))
-        html_content = f"<p>{albume_name}</p>"
-
-    return res
+        pages.extend(chapter_pages(key, image_dict[key], albume_id, albume_name))
+
+    logger.info(f"正在发布 {len(pages)} 个页面到 Telegraph...")
+    urls = await publisher.publish(pages)
+    return [url.replace(".ph", ".kissnab.top") for url in urls]
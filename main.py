@@ -1,26 +1,168 @@
+import asyncio
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+
+# 插件模块自身的导入耗时从这里开始计算
+_IMPORT_START = time.perf_counter()
 
 import astrbot.api.message_components as Comp
-from astrbot.api import logger
+from astrbot.api import AstrBotConfig, logger
 from astrbot.api.event import AstrMessageEvent, MessageChain, filter
 from astrbot.api.star import Context, Star, register
 
-from .jm import JmDownload, jmToph
-from .tools.image_hex.fanqiehex import FanqieHex
+from .tools.image_hex.pool import HexWorkerPool, PoolBrokenError, PoolBusyError
+from .tools.image_hex.result_cache import ResultCache
+from .tools.image_hex.session import SessionManager
+from .tools.jm.album_cache import AlbumCache
+from .tools.jm.domains import DomainController
+from .tools.jm.metadata import JmMetadata
+from .tools.jm.options import JmOptionService
+from .tools.jm.progress import ThroughputModel
+from .tools.jm.scheduler import JobScheduler, QuotaExceededError
+from .tools.jm.single_flight import SingleFlight
+from .tools.metrics.exporter import MetricsExporter
+from .tools.metrics.registry import metrics
+from .tools.metrics.report import format_report
+from .tools.startup.lazy import LazyModule, import_report, import_times, warm_up
+
+# 依赖 jmcomic、img2pdf、pikepdf、telegraph、NumPy 或 PIL 的模块在第一次使用时才导入
+_jm = LazyModule(".jm", __package__)
+_fanqiehex = LazyModule(".tools.image_hex.fanqiehex", __package__)
+_telegraph = LazyModule(".tools.jm.telegraph_publisher", __package__)
+_pdf_pages = LazyModule(".tools.pdf.pages", __package__)
+_pdf_volumes = LazyModule(".tools.pdf.volumes", __package__)
+_hex_codec = LazyModule(".tools.image_hex.codec", __package__)
+LAZY_MODULES = [_jm, _fanqiehex, _telegraph, _pdf_pages, _pdf_volumes, _hex_codec]
+import_times["plugin"] = time.perf_counter() - _IMPORT_START
 
 
 @register(
     "astrbot_plugin_fanbook", "xinghuan22", "一个简单的 下载JM等本子的插件", "1.0.0"
 )
 class MyPlugin(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig | None = None):
         super().__init__(context)
+        self.config = config or {}
         self.path: str = os.path.join("data", "plugins_data", "astrbot_plugin_fanbook")
         os.makedirs(self.path, exist_ok=True)
+        # 番茄混淆使用的进程池，子进程在第一次使用时才会启动
+        self.hex_pool = HexWorkerPool(
+            max_workers=self.config.get("hex_workers", 2),
+            max_queue=self.config.get("hex_queue_size", 8),
+        )
+        # 番茄混淆结果缓存（按图片内容寻址）
+        self.hex_cache = ResultCache(
+            max_bytes=self.config.get("hex_cache_mb", 128) * 1024 * 1024,
+            disk_dir=os.path.join(self.path, "hex_cache"),
+            disk_max_bytes=self.config.get("hex_disk_cache_mb", 0) * 1024 * 1024,
+        )
+        # 超过该像素数的图片（如超长条漫）改用分块模式，限制内存占用
+        self.hex_tile_pixels = self.config.get("hex_tile_pixels", 16_000_000)
+        # 图片下载共享的 HTTP 连接池
+        self.http_sessions = SessionManager(
+            proxy=self.config.get("http_proxy", "http://10.17.196.164:20172"),
+            limit=self.config.get("http_limit", 32),
+            limit_per_host=self.config.get("http_limit_per_host", 8),
+            dns_ttl=self.config.get("http_dns_ttl", 300),
+            timeout=self.config.get("http_timeout", 60),
+            max_bytes=self.config.get("image_max_mb", 32) * 1024 * 1024,
+        )
+        # 本子 PDF / Telegraph 链接缓存
+        self.album_cache = AlbumCache(
+            self.path,
+            max_bytes=self.config.get("album_cache_max_mb", 2048) * 1024 * 1024,
+            ttl=self.config.get("album_cache_ttl_hours", 72) * 3600,
+        )
+        # 合并相同本子的并发 /jm 请求
+        self.jm_flights = SingleFlight()
+        # /jm 任务调度器: 全局并发上限 + 用户/群配额 + 群间轮转
+        self.jm_scheduler = JobScheduler(
+            max_running=self.config.get("jm_max_running", 2),
+            per_user=self.config.get("jm_user_quota", 2),
+            per_group=self.config.get("jm_group_quota", 4),
+        )
+        # jmcomic 请求的自适应并发和域名切换，统计数据跨重启保留
+        self.jm_domains = DomainController(
+            os.path.join(self.path, "domains.json"),
+            min_limit=self.config.get("jm_min_concurrency", 2),
+            max_limit=self.config.get("jm_max_concurrency", 32),
+        )
+        # op.yml 只解析一次，文件修改后自动重新加载；客户端在请求之间共享
+        self.jm_options = JmOptionService(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "op.yml"),
+            domains=self.jm_domains,
+        )
+        # 本子/章节详情缓存，客户端在第一次未命中时才创建
+        self.jm_metadata = JmMetadata(
+            os.path.join(self.path, "meta_cache"), self.jm_options.client
+        )
+        # 本机 PDF 转换速度模型，用于估算剩余时间
+        self.jm_throughput = ThroughputModel(os.path.join(self.path, "throughput.json"))
+        # PDF 页面转换使用的进程池
+        self.pdf_pool = ProcessPoolExecutor(
+            max_workers=max(1, self.config.get("pdf_workers", 2))
+        )
+        # 运行指标，关闭后各处计时器不再记录
+        metrics.enabled = self.config.get("metrics_enabled", True)
+        self.metrics_exporter = MetricsExporter(
+            metrics,
+            textfile=self.config.get("metrics_textfile", ""),
+            port=self.config.get("metrics_http_port", 0),
+        )
+        self._warm_up_task: asyncio.Task | None = None
+
+    # 以下对象所在的模块依赖 PIL、pikepdf 或 telegraph，第一次使用时才创建
+
+    @cached_property
+    def hex_encode(self):
+        """番茄混淆输出图片的编码方式"""
+        return _hex_codec.EncodeOptions(
+            codec=self.config.get("hex_codec", "auto"),
+            png_level=self.config.get("hex_png_level", 6),
+            webp_method=self.config.get("hex_webp_method", 4),
+            jpeg_quality=self.config.get("hex_jpeg_quality", 92),
+        )
+
+    @cached_property
+    def telegraph(self):
+        """复用同一个 Telegraph 账号发布页面"""
+        return _telegraph.TelegraphPublisher(
+            os.path.join(self.path, "telegraph_token.json")
+        )
+
+    @cached_property
+    def pdf_page_options(self):
+        return _pdf_pages.PageOptions(
+            jpeg_quality=self.config.get("pdf_jpeg_quality", 90),
+            max_width=self.config.get("pdf_max_width", 0),
+            cache=self.config.get("pdf_page_cache", True),
+        )
+
+    @cached_property
+    def pdf_volumes(self):
+        """大本子分卷输出，每卷完成后立即发送"""
+        return _pdf_volumes.VolumeOptions(
+            mode=self.config.get("jm_volume_mode", "off"),
+            max_bytes=self.config.get("jm_volume_max_mb", 100) * 1024 * 1024,
+            max_pages=self.config.get("jm_volume_max_pages", 0),
+        )
 
     async def initialize(self):
         """可选择实现异步的插件初始化方法，当实例化该插件类之后会自动调用该方法。"""
+        logger.info(f"[fanbook] 插件模块导入耗时 {import_times['plugin'] * 1000:.0f}ms")
+        # 启动时清理过期和超出配额的本子缓存，以及上次中断遗留的暂存目录
+        await asyncio.to_thread(self.album_cache.evict)
+        await asyncio.to_thread(self.album_cache.clean_parts)
+        await asyncio.to_thread(self.jm_metadata.prune)
+        if metrics.enabled:
+            await self.metrics_exporter.start()
+        if self.config.get("lazy_warm_up", False):
+            # 启动完成后在后台导入重量级模块，第一次请求不必等待导入
+            self._warm_up_task = asyncio.create_task(
+                asyncio.to_thread(warm_up, [_jm, _fanqiehex])
+            )
 
     @filter.command("jm")
     async def jm(self, event: AstrMessageEvent):
@@ -42,6 +184,25 @@ class MyPlugin(Star):
             yield event.plain_result("未找到有效本子id。")  # 发送一条纯文本消息
             return
         message_str = message_strs[0]
+        if message_str == "stats":
+            # 运行指标仅管理员可见
+            if not event.is_admin():
+                yield event.plain_result("只有管理员可以查看运行指标。")
+                return
+            lines = [format_report(metrics), "域名:"]
+            lines.extend(self.jm_domains.status() or ["暂无数据"])
+            lines.append("模块导入:")
+            lines.extend(import_report(LAZY_MODULES))
+            yield event.plain_result("\n".join(lines))
+            return
+        if message_str == "status":
+            # 查询自己的任务排队情况
+            lines = self.jm_scheduler.status(event.get_sender_id())
+            lines.append(f"全局: {self.jm_scheduler.summary()}")
+            if len(lines) == 1:
+                lines.insert(0, "你当前没有排队或运行中的任务。")
+            yield event.plain_result("\n".join(lines))
+            return
         if len(message_strs) >= 2 and message_strs[1] in ["file", "url"]:
             send_type = message_strs[1]
         # 解析消息是不是纯数字
@@ -51,84 +212,164 @@ class MyPlugin(Star):
 
         # 记录开始时间
         start_time = time.time()
-        match send_type:
-            case "file":
-                yield event.plain_result("开始下载本子文件")  # 发送一条纯文本消息
-
-                # 定义进度回调函数（同步方式）
-                def progress_callback(file_count, estimated_str):
-                    import asyncio
-                    import threading
-
-                    # 直接在新线程中运行异步函数，避免RuntimeWarning
-                    def run_async():
-                        async def send_progress():
+        user_id = event.get_sender_id()
+        # 私聊没有群号，每个私聊会话单独作为一个轮转单位
+        group_id = event.get_group_id() or f"private:{user_id}"
+
+        async def notify_queued(position):
+            await self.context.send_message(
+                event.unified_msg_origin,
+                MessageChain().message(
+                    f"任务已加入队列，当前排在第{position}位，发送 /jm status 可查看进度"
+                ),
+            )
+
+        async def scheduled(label, job):
+            # 在调度器分配的名额内执行任务
+            queued_at = time.perf_counter()
+            async with self.jm_scheduler.slot(
+                user_id, group_id, label, on_queued=notify_queued
+            ):
+                metrics.observe("jm_queue_wait", time.perf_counter() - queued_at)
+                return await job()
+
+        # 配额按请求者占用，放在加入合并任务之前，超额的错误不会发给其他等待者；
+        # 检查和占用一步完成，同一用户连续发出的请求不会在挂起期间一起通过
+        try:
+            reservation = self.jm_scheduler.reserve(user_id, group_id)
+        except QuotaExceededError as e:
+            yield event.plain_result(str(e))
+            return
+
+        with reservation:
+            match send_type:
+                case "file":
+                    flight_key = (message_str, "file")
+                    if self.jm_flights.is_running(flight_key):
+                        yield event.plain_result("该本子正在下载中，完成后会一起发送")
+                    else:
+                        yield event.plain_result(
+                            "开始下载本子文件"
+                        )  # 发送一条纯文本消息
+
+                    # 分卷模式下已经随进度发送过的文件
+                    sent_files: set[str] = set()
+
+                    # 进度回调在事件循环中执行，下载线程通过 run_coroutine_threadsafe 投递
+                    async def progress_callback(text, file=None):
+                        await self.context.send_message(
+                            event.unified_msg_origin, MessageChain().message(text)
+                        )
+                        if file is not None:
                             await self.context.send_message(
                                 event.unified_msg_origin,
-                                MessageChain().message(
-                                    f"下载已完成，共{file_count}张图片，预计PDF制作需要: {estimated_str}，请耐心等待..."
+                                MessageChain(
+                                    chain=[
+                                        Comp.File(
+                                            file=file, name=os.path.basename(file)
+                                        )
+                                    ]
                                 ),
                             )
+                            sent_files.add(file)
 
-                        # 运行异步函数
-                        asyncio.run(send_progress())
-
-                    # 在新线程中运行异步函数
-                    thread = threading.Thread(target=run_async)
-                    thread.start()
-
-                # 调用下载函数并获取PDF文件路径和文件数量
-                try:
-                    # 获取op.yml配置文件的路径
-                    config_path = os.path.join(
-                        os.path.dirname(os.path.abspath(__file__)), "op.yml"
-                    )
-                    pdf_path, file_count = JmDownload(
-                        message_str, self.path, config_path, progress_callback
-                    )
+                    # 调用下载函数并获取PDF文件路径和文件数量
+                    try:
+                        await _jm.aload()
+                        # 相同本子的并发请求只下载一次，所有等待者共享结果和进度
+                        pdf_paths, file_count = await self.jm_flights.run(
+                            flight_key,
+                            lambda progress: scheduled(
+                                f"{message_str} file",
+                                lambda: _jm.JmDownload(
+                                    message_str,
+                                    self.path,
+                                    progress_callback=progress,
+                                    page_executor=self.pdf_pool,
+                                    album_cache=self.album_cache,
+                                    throughput=self.jm_throughput,
+                                    progress_interval=self.config.get(
+                                        "jm_progress_interval", 15
+                                    ),
+                                    allow_partial=self.config.get(
+                                        "jm_allow_partial_pdf", True
+                                    ),
+                                    domains=self.jm_domains,
+                                    page_options=self.pdf_page_options,
+                                    volumes=self.pdf_volumes,
+                                    direct=self.config.get("jm_direct_pdf", False),
+                                    options=self.jm_options,
+                                ),
+                            ),
+                            progress_callback,
+                        )
 
-                    # 计算总耗时
-                    elapsed_time = time.time() - start_time
-                    time_str = f"{elapsed_time:.2f}秒"
+                        # 计算总耗时
+                        elapsed_time = time.time() - start_time
+                        time_str = f"{elapsed_time:.2f}秒"
+                        metrics.observe("jm_request_file", elapsed_time)
 
-                    # 检查PDF文件是否存在
-                    if pdf_path and os.path.exists(pdf_path):
-                        # 发送完成消息和实际耗时
-                        yield event.plain_result(
-                            f"已完成！共{file_count}张图片，实际耗时: {time_str}，文件发送中。。。"
-                        )
+                        # 检查PDF文件是否存在
+                        pdf_paths = [p for p in pdf_paths if os.path.exists(p)]
+                        if pdf_paths:
+                            # 分卷模式下大部分分卷已经在制作过程中发送
+                            pending = [p for p in pdf_paths if p not in sent_files]
+                            volumes_str = (
+                                f"，共{len(pdf_paths)}卷" if len(pdf_paths) > 1 else ""
+                            )
+                            sending_str = "，文件发送中。。。" if pending else ""
+                            # 发送完成消息和实际耗时
+                            yield event.plain_result(
+                                f"已完成！共{file_count}张图片{volumes_str}，"
+                                f"实际耗时: {time_str}{sending_str}"
+                            )
 
-                        # 发送PDF文件回bot
-                        chain: list[Comp.BaseMessageComponent] = [
-                            Comp.File(file=pdf_path, name=os.path.basename(pdf_path))
-                        ]
-                        yield event.chain_result(chain)
-                    else:
+                            # 发送PDF文件回bot
+                            for pdf_path in pending:
+                                chain: list[Comp.BaseMessageComponent] = [
+                                    Comp.File(
+                                        file=pdf_path, name=os.path.basename(pdf_path)
+                                    )
+                                ]
+                                yield event.chain_result(chain)
+                        else:
+                            yield event.plain_result(
+                                f"下载失败: 无法生成PDF文件，耗时: {time_str}"
+                            )
+                    except Exception as e:
+                        # 计算总耗时
+                        elapsed_time = time.time() - start_time
+                        time_str = f"{elapsed_time:.2f}秒"
+                        logger.error(f"下载失败: {str(e)}")
                         yield event.plain_result(
-                            f"下载失败: 无法生成PDF文件，耗时: {time_str}"
-                        )
-                except Exception as e:
-                    # 计算总耗时
-                    elapsed_time = time.time() - start_time
-                    time_str = f"{elapsed_time:.2f}秒"
-                    logger.error(f"下载失败: {str(e)}")
-                    yield event.plain_result(f"下载失败: {str(e)}，耗时: {time_str}")
-            case "url":
-                # 获取op.yml配置文件的路径
-                config_path = os.path.join(
-                    os.path.dirname(os.path.abspath(__file__)), "op.yml"
-                )
-                result = await jmToph(message_str, config_path)
-                node_list = []
-                for res in result:
-                    node_list.append(
-                        Comp.Node(
-                            uin="0",
-                            name="jm",
-                            content=[Comp.Plain(text=res)],
+                            f"下载失败: {str(e)}，耗时: {time_str}"
                         )
+                case "url":
+                    await _jm.aload()
+                    result = await self.jm_flights.run(
+                        (message_str, "url"),
+                        lambda _: scheduled(
+                            f"{message_str} url",
+                            lambda: _jm.jmToph(
+                                message_str,
+                                self.jm_metadata,
+                                self.telegraph,
+                                self.album_cache,
+                                self.jm_domains,
+                            ),
+                        ),
                     )
-                yield event.chain_result([Comp.Nodes(nodes=node_list)])
+                    metrics.observe("jm_request_url", time.time() - start_time)
+                    node_list = []
+                    for res in result:
+                        node_list.append(
+                            Comp.Node(
+                                uin="0",
+                                name="jm",
+                                content=[Comp.Plain(text=res)],
+                            )
+                        )
+                    yield event.chain_result([Comp.Nodes(nodes=node_list)])
 
         event.stop_event()
 
@@ -148,54 +389,71 @@ class MyPlugin(Star):
 
     async def terminate(self):
         """可选择实现异步的插件销毁方法，当插件被卸载/停用时会调用。"""
+        self.hex_pool.shutdown()
+        await self.http_sessions.close()
+        await self.metrics_exporter.close()
+        self.pdf_pool.shutdown(wait=False, cancel_futures=True)
+        self.album_cache.close()
+        self.jm_domains.save()
+
+    async def _fanqie_chain(
+        self, event: AstrMessageEvent, mode: str
+    ) -> list[Comp.BaseMessageComponent]:
+        """
+        处理消息和引用消息中的全部图片，结果合并为一条转发消息，并附上每张图片的耗时
+        """
+        start_time = time.time()
+        await _fanqiehex.aload()
+        hex = _fanqiehex.FanqieHex(
+            self.hex_pool,
+            self.http_sessions,
+            self.hex_cache,
+            self.hex_encode,
+            self.hex_tile_pixels,
+        )
+        try:
+            results = await hex.process_batch(event, mode)
+        except PoolBusyError:
+            return [Comp.Plain("图片处理繁忙，请稍后再试。")]
+        except PoolBrokenError:
+            # 进程池已经丢弃，下一次请求会重新创建
+            return [Comp.Plain("图片处理进程异常退出（图片可能过大），请稍后重试。")]
+        if not results:
+            return [Comp.Plain("未找到图片。")]
+
+        node_list = []
+        timings = []
+        for i, (img, elapsed) in enumerate(results, start=1):
+            if img:
+                node_list.append(
+                    Comp.Node(
+                        uin="0",
+                        name="hex",
+                        content=[Comp.Image.fromBytes(byte=img)],
+                    )
+                )
+                timings.append(f"第{i}张: {elapsed:.2f}秒")
+            else:
+                timings.append(f"第{i}张: 处理失败")
+        elapsed_time = time.time() - start_time
+        timings.append(f"共{len(results)}张，总耗时: {elapsed_time:.2f}秒")
+        node_list.append(
+            Comp.Node(uin="0", name="hex", content=[Comp.Plain("\n".join(timings))])
+        )
+        return [Comp.Nodes(node_list)]
 
     # 注册指令的装饰器。指令名为 helloworld。注册成功后，发送 `/jm helloworld` 就会触发这个指令，并回复 `你好, {user_name}!`
     @filter.regex(r"^(番茄混淆)", priority=5)
     async def fanqie_encrypt(
         self, event: AstrMessageEvent
     ):  # 这是 handler 的描述，将会被解析方便用户了解插件内容。建议填写。
-        hex = FanqieHex()
-        img = await FanqieHex.process(hex, event, "encrypt")
-        if img:
-            yield event.chain_result(
-                [
-                    Comp.Nodes(
-                        [
-                            Comp.Node(
-                                uin="0",
-                                name="hex",
-                                content=[Comp.Image.fromBytes(byte=img)],
-                            )
-                        ]
-                    )
-                ]
-            )
-        else:
-            yield event.chain_result([Comp.Plain("未找到图片。")])
+        yield event.chain_result(await self._fanqie_chain(event, "encrypt"))
 
         event.stop_event()
 
     @filter.regex(r"^(番茄解混淆)", priority=5)
     async def decrypt(self, event: AstrMessageEvent):
         logger.info("开始解析图片")
-        hex = FanqieHex()
-        img = await FanqieHex.process(hex, event, "decrypt")
-        # logger.info(f"图片 {img}")
-        if img:
-            yield event.chain_result(
-                [
-                    Comp.Nodes(
-                        [
-                            Comp.Node(
-                                uin="0",
-                                name="hex",
-                                content=[Comp.Image.fromBytes(byte=img)],
-                            )
-                        ]
-                    )
-                ]
-            )
-        else:
-            yield event.chain_result([Comp.Plain("未找到图片。")])
+        yield event.chain_result(await self._fanqie_chain(event, "decrypt"))
 
         event.stop_event()
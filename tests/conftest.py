@@ -0,0 +1,22 @@
+"""
+插件单元测试的公共工具
+
+用法（在插件目录下运行，需要安装插件依赖和 AstrBot）:
+    python -m pytest tests
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+# 插件目录本身是一个包（内部使用相对导入），把它的上级目录加入搜索路径后按包名导入
+PLUGIN_ROOT = Path(__file__).resolve().parents[1]
+if str(PLUGIN_ROOT.parent) not in sys.path:
+    sys.path.insert(0, str(PLUGIN_ROOT.parent))
+
+OP_YML = PLUGIN_ROOT / "op.yml"
+
+
+def plugin_module(name: str):
+    """导入插件内的模块，例如 plugin_module("tools.jm.domains")"""
+    return importlib.import_module(f"{PLUGIN_ROOT.name}.{name}")
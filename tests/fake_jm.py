@@ -0,0 +1,177 @@
+"""
+不访问网络的 jmcomic 替身
+
+FakeOption 代替 op.yml 创建的 JmOption，build_jm_client 返回 FakeClient；
+配合 jmcomic 真实的 download_album 和下载器使用，章节和图片按 jmcomic 的方式
+在多个线程中并发下载，图片内容由 FakeClient 现场生成。
+"""
+
+import io
+import os
+import threading
+from types import SimpleNamespace
+
+from PIL import Image
+
+
+class FakeImage:
+    def __init__(self, photo, index: int):
+        self.from_photo = photo
+        self.index = index
+        self.tag = f"{photo.photo_id}/{index}"
+        self.img_url = (
+            f"https://cdn.test/media/photos/{photo.photo_id}/{index:05d}.webp"
+        )
+        self.download_url = self.img_url
+        self.scramble_id = None
+        self.exists = False
+        self.skip = False
+
+    def is_image(self):
+        return True
+
+
+class FakePhoto:
+    def __init__(self, album, index: int, pages: int):
+        self.from_album = album
+        self.index = index
+        self.photo_id = self.id = str(album.id * 100 + index)
+        self.album_id = album.id
+        self.name = f"ch{index}"
+        self.skip = False
+        self.images = [FakeImage(self, i) for i in range(1, pages + 1)]
+
+    def is_image(self):
+        return False
+
+    def is_photo(self):
+        return True
+
+    def __len__(self):
+        return len(self.images)
+
+    def __iter__(self):
+        return iter(self.images)
+
+    def __getitem__(self, item):
+        return self.images[item]
+
+
+class FakeAlbum:
+    def __init__(self, album_id: int = 1, chapters: int = 3, pages: int = 4):
+        self.id = self.album_id = album_id
+        self.name = f"album{album_id}"
+        self.author = "author"
+        self.tags = []
+        self.skip = False
+        self.photos = [FakePhoto(self, i, pages) for i in range(1, chapters + 1)]
+        self.page_count = chapters * pages
+
+    def __len__(self):
+        return len(self.photos)
+
+    def __iter__(self):
+        return iter(self.photos)
+
+    def __getitem__(self, item):
+        return self.photos[item]
+
+
+def image_bytes(image: FakeImage) -> bytes:
+    """每张图片的宽度不同（100 + 页码），从 PDF 的页面宽度即可判断页序"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (100 + image.index, 60), (image.index * 20 % 256, 0, 0)).save(
+        buffer, format="WEBP", lossless=True
+    )
+    return buffer.getvalue()
+
+
+class _Response:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def require_success(self):
+        pass
+
+    def transfer_to(self, path, *args, **kwargs):
+        with open(path, "wb") as f:
+            f.write(self.content)
+
+
+class FakeClient:
+    def __init__(self, album: FakeAlbum, failures: set[tuple[int, int]]):
+        self.album = album
+        # (章节序号, 页码)，这些图片下载失败
+        self.failures = failures
+        self.downloaded: list[str] = []
+        self._lock = threading.Lock()
+
+    def get_album_detail(self, album_id):
+        return self.album
+
+    def check_photo(self, photo):
+        pass
+
+    def _fetch(self, image: FakeImage) -> bytes:
+        if (image.from_photo.index, image.index) in self.failures:
+            raise RuntimeError(f"download failed: {image.tag}")
+        with self._lock:
+            self.downloaded.append(image.tag)
+        return image_bytes(image)
+
+    def download_by_image_detail(self, image, img_save_path, decode_image=True):
+        _Response(self._fetch(image)).transfer_to(img_save_path)
+
+    def get_jm_image(self, url):
+        for photo in self.album:
+            for image in photo:
+                if image.download_url == url:
+                    return _Response(self._fetch(image))
+        raise KeyError(url)
+
+
+class FakeOption:
+    def __init__(self, client: FakeClient, base_dir: str = "", cache: bool = True):
+        self.client = client
+        self.dir_rule = SimpleNamespace(base_dir=base_dir)
+        self.download = SimpleNamespace(cache=cache)
+        # 提供时每个章节在 after_photo 插件钩子处等待，让所有章节同时完成
+        self.photo_barrier: threading.Barrier | None = None
+
+    def build_jm_client(self, **kwargs):
+        return self.client
+
+    def decide_photo_batch_count(self, album):
+        return len(album)
+
+    def decide_image_batch_count(self, photo):
+        return len(photo)
+
+    def decide_image_save_dir(self, photo, ensure_exists=True):
+        path = os.path.join(self.dir_rule.base_dir, photo.name)
+        if ensure_exists:
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def decide_image_filepath(self, image):
+        return os.path.join(
+            self.decide_image_save_dir(image.from_photo), f"{image.index:05d}.webp"
+        )
+
+    def decide_download_cache(self, image):
+        return False
+
+    def decide_download_image_decode(self, image):
+        return False
+
+    def call_all_plugin(self, group, **kwargs):
+        if group == "after_photo" and self.photo_barrier is not None:
+            self.photo_barrier.wait(10)
+
+
+def install(monkeypatch, jm, album: FakeAlbum, failures=None, cache: bool = True):
+    """让 jm.JmDownload 使用替身下载 album，返回共享的 FakeClient 和 FakeOption"""
+    client = FakeClient(album, set() if failures is None else failures)
+    option = FakeOption(client, cache=cache)
+    monkeypatch.setattr(jm, "create_option_by_file", lambda path: option)
+    return client, option
@@ -0,0 +1,77 @@
+import os
+
+from conftest import plugin_module
+
+album_cache = plugin_module("tools.jm.album_cache")
+
+
+def _file(path, size: int = 100) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return str(path)
+
+
+def test_version_bump_deletes_old_pdf(tmp_path):
+    cache = album_cache.AlbumCache(str(tmp_path), max_bytes=0, ttl=0)
+    old = _file(tmp_path / "1_old.pdf")
+    cache.put_pdf("1", "v1", old, 10, [])
+    cache.put_urls("1", "v2", ["https://example.com"])
+    assert not os.path.exists(old)
+    assert cache.get_pdf("1") is None
+    assert cache.get_urls("1") == ["https://example.com"]
+
+
+def test_partial_artifacts_are_tracked(tmp_path):
+    cache = album_cache.AlbumCache(str(tmp_path), max_bytes=150, ttl=0)
+    folder = tmp_path / "images" / "1"
+    _file(folder / "00001.webp")
+    partial = _file(tmp_path / "1_album_不完整.pdf")
+    cache.put_partial("1", "v1", partial, [str(folder)])
+    assert cache.get_pdf("1") is None
+
+    # 补齐后不完整的 PDF 被删除
+    pdf = _file(tmp_path / "1_album.pdf")
+    cache.put_pdf("1", "v1", pdf, 1, [str(folder)])
+    assert not os.path.exists(partial)
+    assert cache.get_pdf("1") == (pdf, 1)
+
+    # 超出配额时不完整的产物和遗留的暂存目录随条目一起清理
+    parts = album_cache.parts_path(str(tmp_path), "2")
+    _file(os.path.join(parts, "0001.pdf"))
+    other = _file(tmp_path / "2_other_不完整.pdf")
+    cache.put_partial("2", "v1", other, [])
+    cache.put_partial("3", "v1", _file(tmp_path / "3_big_不完整.pdf"), [])
+    assert not os.path.exists(pdf)
+    assert not os.path.exists(other)
+    assert not os.path.exists(parts)
+
+
+def test_clean_parts(tmp_path):
+    cache = album_cache.AlbumCache(str(tmp_path), max_bytes=0, ttl=0)
+    parts = album_cache.parts_path(str(tmp_path), "1")
+    _file(os.path.join(parts, "0001.pdf"))
+    keep = _file(tmp_path / "1_album.pdf")
+    cache.clean_parts()
+    assert not os.path.exists(parts)
+    assert os.path.exists(keep)
+
+
+def test_files_are_deleted_outside_the_lock(tmp_path, monkeypatch):
+    cache = album_cache.AlbumCache(str(tmp_path), max_bytes=150, ttl=0)
+    deleted = []
+    delete = album_cache._delete
+
+    def checked_delete(path):
+        # 删除大目录期间其他线程的缓存查询不应被索引锁挡住
+        assert not cache._lock.locked()
+        deleted.append(path)
+        delete(path)
+
+    monkeypatch.setattr(album_cache, "_delete", checked_delete)
+    old = _file(tmp_path / "1_old.pdf")
+    cache.put_pdf("1", "v1", old, 1, [])
+    cache.put_pdf("1", "v2", _file(tmp_path / "1_new.pdf"), 1, [])
+    cache.put_partial("2", "v1", _file(tmp_path / "2_big_不完整.pdf"), [])
+    assert old in deleted
+    assert str(tmp_path / "1_new.pdf") in deleted
@@ -0,0 +1,34 @@
+import io
+
+from conftest import plugin_module
+from PIL import Image
+
+codec = plugin_module("tools.image_hex.codec")
+transform = plugin_module("tools.image_hex.transform")
+
+
+def _png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_auto_encrypt_output_stays_png():
+    auto = codec.EncodeOptions()
+    for size in ((64, 48), (2000, 1500)):
+        assert auto.choose(Image.new("RGB", size), "encrypt") == "png"
+    # WebP 只在显式选择时使用
+    webp = codec.EncodeOptions(codec="webp")
+    assert webp.choose(Image.new("RGB", (64, 48)), "encrypt") == "webp"
+
+
+def test_decrypt_skips_clean_encode_without_cache():
+    image = _png(Image.new("RGB", (64, 48), (10, 20, 30)))
+    [(output, clean, _, stages)] = transform.transform_images(
+        [image], "decrypt", keep_clean=False
+    )
+    assert output
+    assert clean == b""
+    assert "encode" not in stages
+    [(_, clean, _, _)] = transform.transform_images([image], "decrypt")
+    assert clean
@@ -0,0 +1,48 @@
+from conftest import OP_YML, plugin_module
+from jmcomic import create_option_by_file
+
+domains_module = plugin_module("tools.jm.domains")
+
+
+def _controller(tmp_path):
+    return domains_module.DomainController(str(tmp_path / "domains.json"))
+
+
+def _fail_first_domain(client):
+    """第一个域名的请求失败，其余域名返回请求的地址"""
+    calls = []
+
+    def request(url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            raise ConnectionError("boom")
+        return url
+
+    # 只验证域名切换，不解析响应内容
+    client.raise_if_resp_should_retry = lambda resp, is_image: resp
+    return request, calls
+
+
+def test_new_client_from_op_yml(tmp_path):
+    controller = _controller(tmp_path)
+    client = controller.new_client(create_option_by_file(str(OP_YML)))
+    assert client.domain_retry_strategy == controller.retry_strategy
+
+    request, calls = _fail_first_domain(client)
+    resp = client.request_with_retry(request, "/album?id=1")
+    assert len(calls) == 2
+    assert resp == calls[1]
+    failed = calls[0].split("/")[2]
+    assert controller._state(failed).error_rate > 0
+
+
+def test_attach_caches_client(tmp_path):
+    controller = _controller(tmp_path)
+    option = create_option_by_file(str(OP_YML))
+    client = controller.attach(option)
+    assert option.build_jm_client() is client
+    assert option.download.threading.image == controller.max_limit
+    assert client.domain_retry_strategy == controller.retry_strategy
+
+    request, calls = _fail_first_domain(client)
+    assert client.request_with_retry(request, "/album?id=1") == calls[-1]
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from conftest import plugin_module
+
+gilbert = plugin_module("tools.image_hex.gilbert")
+
+SIZES = [(1, 1), (1, 7), (7, 1), (2, 2), (5, 3), (3, 5), (16, 16), (37, 11), (11, 37)]
+
+
+def _generate2d(x, y, ax, ay, bx, by, coordinates):
+    """原来的递归实现，作为参考"""
+    w = abs(ax + ay)
+    h = abs(bx + by)
+    dax, day = (ax > 0) - (ax < 0), (ay > 0) - (ay < 0)
+    dbx, dby = (bx > 0) - (bx < 0), (by > 0) - (by < 0)
+    if h == 1:
+        for _ in range(w):
+            coordinates.append((x, y))
+            x, y = x + dax, y + day
+        return
+    if w == 1:
+        for _ in range(h):
+            coordinates.append((x, y))
+            x, y = x + dbx, y + dby
+        return
+    ax2, ay2, bx2, by2 = ax // 2, ay // 2, bx // 2, by // 2
+    w2, h2 = abs(ax2 + ay2), abs(bx2 + by2)
+    if 2 * w > 3 * h:
+        if (w2 % 2) and (w > 2):
+            ax2, ay2 = ax2 + dax, ay2 + day
+        _generate2d(x, y, ax2, ay2, bx, by, coordinates)
+        _generate2d(x + ax2, y + ay2, ax - ax2, ay - ay2, bx, by, coordinates)
+    else:
+        if (h2 % 2) and (h > 2):
+            bx2, by2 = bx2 + dbx, by2 + dby
+        _generate2d(x, y, bx2, by2, ax2, ay2, coordinates)
+        _generate2d(x + bx2, y + by2, ax, ay, bx - bx2, by - by2, coordinates)
+        _generate2d(
+            x + (ax - dax) + (bx2 - dbx),
+            y + (ay - day) + (by2 - dby),
+            -bx2,
+            -by2,
+            -(ax - ax2),
+            -(ay - ay2),
+            coordinates,
+        )
+
+
+def _reference_path(width: int, height: int) -> np.ndarray:
+    coordinates = []
+    if width >= height:
+        _generate2d(0, 0, width, 0, 0, height, coordinates)
+    else:
+        _generate2d(0, 0, 0, height, width, 0, coordinates)
+    return np.array([y * width + x for x, y in coordinates])
+
+
+def _reference_result(pixels: np.ndarray, width: int, height: int, mode: str):
+    """原来的置换: 路径上的像素循环移动后填回原位置"""
+    path = _reference_path(width, height)
+    offset = gilbert.path_offset(width, height)
+    result = np.zeros_like(pixels)
+    result[path] = np.roll(pixels[path], offset if mode == "encrypt" else -offset)
+    return result
+
+
+@pytest.mark.parametrize(("width", "height"), SIZES)
+def test_path_matches_recursive_reference(width, height):
+    path = gilbert.gilbert2d(width, height)
+    assert path.dtype == np.int32
+    np.testing.assert_array_equal(path, _reference_path(width, height))
+
+
+@pytest.mark.parametrize(("width", "height"), [(37, 11), (11, 37), (16, 16)])
+def test_partial_ranges_match_full_path(width, height):
+    full = gilbert.gilbert2d(width, height)
+    n = width * height
+    for start, stop in [(0, 1), (0, n), (5, 6), (13, 200), (n - 3, n), (n - 1, n + 50)]:
+        np.testing.assert_array_equal(
+            gilbert.gilbert2d(width, height, start, stop), full[start:stop]
+        )
+    assert len(gilbert.gilbert2d(width, height, n, n + 10)) == 0
+    # 分段拼接后与整条路径相同
+    chunks = [gilbert.gilbert2d(width, height, s, s + 64) for s in range(0, n, 64)]
+    np.testing.assert_array_equal(np.concatenate(chunks), full)
+
+
+@pytest.mark.parametrize(("width", "height"), SIZES)
+def test_permutation_matches_reference(width, height):
+    pixels = np.arange(width * height) * 7 + 3
+    encrypt, decrypt = gilbert.build_permutation(width, height)
+    np.testing.assert_array_equal(
+        pixels[encrypt], _reference_result(pixels, width, height, "encrypt")
+    )
+    np.testing.assert_array_equal(
+        pixels[decrypt], _reference_result(pixels, width, height, "decrypt")
+    )
+    # 解混淆还原混淆结果
+    np.testing.assert_array_equal(pixels[encrypt][decrypt], pixels)
+
+
+def test_permutation_cache_reuses_and_evicts():
+    encrypt, decrypt = gilbert.build_permutation(8, 4)
+    entry_bytes = encrypt.nbytes + decrypt.nbytes
+    cache = gilbert.PermutationCache(max_bytes=entry_bytes * 2)
+
+    first = cache.get(8, 4, "encrypt")
+    np.testing.assert_array_equal(first, encrypt)
+    np.testing.assert_array_equal(cache.get(8, 4, "decrypt"), decrypt)
+    # 命中时返回同一个数组，不再重新生成
+    assert cache.get(8, 4, "encrypt") is first
+    # (宽, 高) 不同的尺寸各自缓存
+    np.testing.assert_array_equal(
+        cache.get(4, 8, "encrypt"), gilbert.build_permutation(4, 8)[0]
+    )
+
+    # 超过容量时淘汰最久未使用的条目: (8, 4) 刚被访问，淘汰 (4, 8)
+    cache.get(8, 4, "encrypt")
+    cache.get(2, 16, "encrypt")
+    assert cache.get(8, 4, "encrypt") is first
+    assert list(cache._items) == [(2, 16), (8, 4)]
+
+    # 单个条目超过上限时不缓存
+    small = gilbert.PermutationCache(max_bytes=entry_bytes - 1)
+    assert small.get(8, 4, "encrypt") is not small.get(8, 4, "encrypt")
+    assert not small._items
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import astrbot.core.message.components as Comp
+import numpy as np
+from conftest import plugin_module
+from PIL import Image
+
+fanqiehex = plugin_module("tools.image_hex.fanqiehex")
+pool_module = plugin_module("tools.image_hex.pool")
+session_module = plugin_module("tools.image_hex.session")
+transform = plugin_module("tools.image_hex.transform")
+
+
+def _png(path, size: tuple[int, int], seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(data, "RGB").save(path)
+    return str(path)
+
+
+def _event(*segments):
+    return SimpleNamespace(message_obj=SimpleNamespace(message=list(segments)))
+
+
+def test_batch_keeps_message_order_and_reports_each_image(tmp_path):
+    quoted = _png(tmp_path / "quoted.png", (30, 20), 0)
+    first = _png(tmp_path / "first.png", (20, 30), 1)
+    second = _png(tmp_path / "second.png", (30, 20), 2)
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"\x89PNG\r\n\x1a\n" + b"x" * 64)
+    event = _event(
+        Comp.Reply(id="1", chain=[Comp.Image(file=quoted)]),
+        Comp.Image(file=first),
+        Comp.Image(file=str(broken)),
+        Comp.Image(file=second),
+        # 重复的图片只处理一次
+        Comp.Image(file=first),
+    )
+    calls = []
+
+    async def main():
+        pool = pool_module.HexWorkerPool(max_workers=2)
+        run = pool.run
+
+        async def recording_run(func, *args):
+            if func is transform.transform_images:
+                calls.append([peek(image) for image in args[0]])
+            return await run(func, *args)
+
+        peek = transform.peek_size
+        pool.run = recording_run
+        hex = fanqiehex.FanqieHex(pool, session_module.SessionManager())
+        try:
+            return await hex.process_batch(event, "encrypt")
+        finally:
+            pool.shutdown()
+
+    results = asyncio.run(main())
+    assert len(results) == 4
+    # 相同尺寸的图片分到同一个任务，任务数不超过进程数
+    assert sorted(sorted(sizes) for sizes in calls) == [
+        [(0, 0), (20, 30)],
+        [(30, 20), (30, 20)],
+    ]
+    for path, (output, elapsed) in zip([quoted, first, None, second], results):
+        if path is None:
+            # 损坏的图片单独失败，不影响同组其他图片
+            assert output == b""
+            continue
+        assert elapsed > 0
+        restored = transform.permute_image(output, "decrypt")
+        with Image.open(path) as original:
+            assert restored.tobytes() == original.tobytes()
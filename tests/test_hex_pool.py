@@ -0,0 +1,24 @@
+import asyncio
+import os
+from functools import partial
+
+import pytest
+from conftest import plugin_module
+
+pool_module = plugin_module("tools.image_hex.pool")
+
+
+def test_broken_pool_is_recreated():
+    async def main():
+        pool = pool_module.HexWorkerPool(max_workers=1)
+        try:
+            assert await pool.run(abs, -3) == 3
+            # 子进程直接退出，模拟被系统杀掉
+            with pytest.raises(pool_module.PoolBrokenError):
+                await pool.run(partial(os._exit, 1))
+            assert pool.pending == 0
+            assert await pool.run(abs, -4) == 4
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
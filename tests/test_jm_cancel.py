@@ -0,0 +1,195 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from conftest import OP_YML, plugin_module
+
+jm = plugin_module("jm")
+scheduler_module = plugin_module("tools.jm.scheduler")
+single_flight_module = plugin_module("tools.jm.single_flight")
+
+
+def _downloader(tmp_path, cancelled, done):
+    from jmcomic import create_option_by_file
+
+    option = create_option_by_file(str(OP_YML))
+    option.dir_rule.base_dir = str(tmp_path)
+    return jm.ChapterPdfDownloader(
+        option,
+        on_photo_done=lambda *args: done.append(args),
+        cancelled=cancelled,
+    )
+
+
+def _photo(index: int):
+    album = SimpleNamespace(id="1", album_id="1", name="album")
+    album.__len__ = lambda: 1
+    return SimpleNamespace(
+        id=str(index),
+        photo_id=str(index),
+        album_id="1",
+        index=index,
+        from_album=[album],
+        skip=False,
+    )
+
+
+class _Writer:
+    aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+def test_cancelled_downloader_skips_remaining_work(tmp_path):
+    cancelled = threading.Event()
+    done = []
+    downloader = _downloader(tmp_path, cancelled, done)
+
+    image = SimpleNamespace(exists=False, skip=False, tag="1", img_url="x")
+    downloader.before_image(image, str(tmp_path / "1.jpg"))
+    assert not image.skip
+
+    cancelled.set()
+    downloader.before_image(image, str(tmp_path / "1.jpg"))
+    assert image.skip
+
+    photo = _photo(1)
+    writer = downloader.page_writers[1] = _Writer()
+    downloader.after_photo(photo)
+    assert writer.aborted
+    assert not done
+
+
+def test_cancelled_flight_holds_slot_until_thread_returns():
+    async def main():
+        scheduler = scheduler_module.JobScheduler(max_running=1)
+        flights = single_flight_module.SingleFlight()
+        release = threading.Event()
+        started = asyncio.Event()
+        runs = []
+
+        def download(cancelled):
+            # 模拟下载线程：收到取消标志后还要等正在进行的请求完成
+            cancelled.wait(5)
+            release.wait(5)
+
+        async def job():
+            runs.append(1)
+            cancelled = threading.Event()
+            worker = asyncio.ensure_future(asyncio.to_thread(download, cancelled))
+            started.set()
+            try:
+                return await asyncio.shield(worker)
+            except asyncio.CancelledError:
+                cancelled.set()
+                await asyncio.wait([worker])
+                raise
+
+        async def scheduled(_progress):
+            async with scheduler.slot("u", "g", "job"):
+                return await job()
+
+        first = asyncio.create_task(flights.run("key", scheduled))
+        await started.wait()
+        started.clear()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # 下载线程返回前名额不释放，同一个任务也不会重复执行
+        second = asyncio.create_task(flights.run("key", scheduled))
+        await asyncio.sleep(0.1)
+        assert "运行中 1/1" in scheduler.summary()
+        assert len(runs) == 1
+        release.set()
+        await started.wait()
+        assert len(runs) == 2
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        await asyncio.sleep(0.1)
+        assert "运行中 0/1" in scheduler.summary()
+
+    asyncio.run(main())
+
+
+def test_quota_is_reserved_per_caller():
+    scheduler = scheduler_module.JobScheduler(per_user=1, per_group=0)
+    reservation = scheduler.reserve("a", "g")
+    with pytest.raises(scheduler_module.QuotaExceededError):
+        scheduler.reserve("a", "g")
+    # 其他用户不受影响
+    scheduler.reserve("b", "g").release()
+    reservation.release()
+    # 重复释放不会多退配额
+    reservation.release()
+    with (
+        scheduler.reserve("a", "g"),
+        pytest.raises(scheduler_module.QuotaExceededError),
+    ):
+        scheduler.reserve("a", "g")
+
+
+def test_concurrent_requests_from_one_user_reserve_atomically():
+    async def main():
+        scheduler = scheduler_module.JobScheduler(per_user=2, per_group=0)
+        flights = single_flight_module.SingleFlight()
+        release = asyncio.Event()
+        results = []
+
+        async def request(album_id: str):
+            # 与 main.py 相同的顺序：占用配额后还要经过多个挂起点才创建调度名额
+            try:
+                reservation = scheduler.reserve("a", "g")
+            except scheduler_module.QuotaExceededError:
+                results.append("quota")
+                return
+            with reservation:
+                await asyncio.sleep(0)
+
+                async def scheduled(_progress):
+                    async with scheduler.slot("a", "g", album_id):
+                        await release.wait()
+
+                await flights.run(album_id, scheduled)
+                results.append("done")
+
+        tasks = [asyncio.create_task(request(str(i))) for i in range(5)]
+        await asyncio.sleep(0.1)
+        assert results == ["quota"] * 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert sorted(results) == ["done"] * 2 + ["quota"] * 3
+        # 全部结束后配额归还
+        scheduler.reserve("a", "g").release()
+
+    asyncio.run(main())
+
+
+def test_failed_queue_notification_keeps_ticket():
+    async def main():
+        scheduler = scheduler_module.JobScheduler(max_running=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a", "g", "first"):
+                await release.wait()
+
+        async def on_queued(position):
+            raise RuntimeError("send failed")
+
+        async def queued():
+            async with scheduler.slot("b", "g", "second", on_queued=on_queued):
+                return "ran"
+
+        first = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(queued())
+        await asyncio.sleep(0)
+        assert "排队 1" in scheduler.summary()
+        release.set()
+        await first
+        assert await second == "ran"
+
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import pikepdf
+import pytest
+from conftest import plugin_module
+from fake_jm import FakeAlbum, install
+
+jm = plugin_module("jm")
+album_cache_module = plugin_module("tools.jm.album_cache")
+pages_module = plugin_module("tools.pdf.pages")
+
+
+def _download(tmp_path, album, **kwargs):
+    return asyncio.run(
+        jm.JmDownload(
+            str(album.id),
+            str(tmp_path),
+            "op.yml",
+            progress_interval=100,
+            direct=True,
+            **kwargs,
+        )
+    )
+
+
+def _images(tmp_path) -> list[str]:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), tmp_path)
+        for root, _, files in os.walk(tmp_path)
+        for name in files
+        if name.endswith(".webp")
+    )
+
+
+# jmcomic 的下载线程在图片下载失败后会重新抛出异常
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_direct_mode_resumes_when_caching_is_enabled(tmp_path, monkeypatch):
+    album = FakeAlbum(chapters=2, pages=3)
+    client, _ = install(monkeypatch, jm, album, failures={(2, 2)})
+    cache = album_cache_module.AlbumCache(str(tmp_path), max_bytes=0, ttl=0)
+
+    paths, count = _download(tmp_path, album, album_cache=cache)
+    assert count == 5
+    assert paths[0].endswith("_不完整.pdf")
+    # 开启缓存时原图保留，供下次续传
+    assert len(_images(tmp_path)) == 5
+
+    client.failures.clear()
+    client.downloaded.clear()
+    paths, count = _download(tmp_path, album, album_cache=cache)
+    # 只补下载上次失败的一张
+    assert client.downloaded == ["102/2"]
+    assert count == 6
+    with pikepdf.open(paths[0]) as pdf:
+        widths = [float(page.mediabox[2]) for page in pdf.pages]
+    # 页面宽度随页码递增，两个章节各自按页码排列
+    assert len(widths) == 6
+    assert widths[:3] == sorted(widths[:3]) == widths[3:]
+    cache.close()
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_direct_mode_keeps_no_raw_images_without_cache(tmp_path, monkeypatch, cached):
+    album = FakeAlbum(chapters=2, pages=2)
+    install(monkeypatch, jm, album)
+    # 没有本子缓存，或关闭了页面缓存时原图不落盘
+    cache = (
+        album_cache_module.AlbumCache(str(tmp_path), max_bytes=0, ttl=0)
+        if cached
+        else None
+    )
+    paths, count = _download(
+        tmp_path,
+        album,
+        album_cache=cache,
+        page_options=pages_module.PageOptions(cache=False),
+    )
+    assert count == 4
+    assert os.path.isfile(paths[0])
+    assert _images(tmp_path) == []
+    assert not os.path.exists(tmp_path / "ch1")
+    if cache is not None:
+        cache.close()
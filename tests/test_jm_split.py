@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import pikepdf
+import pytest
+from conftest import plugin_module
+from fake_jm import FakeAlbum, install
+
+jm = plugin_module("jm")
+volumes_module = plugin_module("tools.pdf.volumes")
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_split_mode_chapters_finish_concurrently(tmp_path, monkeypatch, direct):
+    chapters = 6
+    album = FakeAlbum(chapters=chapters, pages=2)
+    _, option = install(monkeypatch, jm, album)
+    # 所有章节线程同时进入 on_photo_done，抢着填写分卷用的章节列表
+    option.photo_barrier = threading.Barrier(chapters)
+    delivered = []
+
+    async def callback(text, path=None):
+        if path is not None:
+            delivered.append(path)
+
+    paths, count = asyncio.run(
+        jm.JmDownload(
+            str(album.id),
+            str(tmp_path),
+            "op.yml",
+            callback,
+            progress_interval=100,
+            volumes=volumes_module.VolumeOptions("chapter"),
+            direct=direct,
+        )
+    )
+    assert count == chapters * 2
+    assert len(paths) == chapters
+    assert delivered == paths
+    for path in paths:
+        with pikepdf.open(path) as pdf:
+            assert len(pdf.pages) == 2
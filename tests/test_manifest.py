@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pikepdf
+import pytest
+from conftest import plugin_module
+from fake_jm import FakeAlbum, install
+from PIL import Image
+
+jm = plugin_module("jm")
+manifest_module = plugin_module("tools.jm.manifest")
+
+
+def _webp(path, width: int = 20) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (width, 10), (width, 0, 0)).save(
+        path, format="WEBP", lossless=True
+    )
+    return str(path)
+
+
+def test_manifest_verifies_records_and_reloads(tmp_path):
+    path = manifest_module.manifest_path(str(tmp_path), "1")
+    manifest = manifest_module.DownloadManifest(path)
+    folder = tmp_path / "ch1"
+    names = ["00001.webp", "00002.webp", "00003.webp"]
+    manifest.expect("11", 1, names)
+    good = _webp(folder / names[0])
+    manifest.record("11", good)
+    assert manifest.verify("11", good)
+    assert not manifest.is_complete(["11"])
+    assert manifest.missing() == 2
+
+    # 大小相同但内容被改动，摘要不符
+    with open(good, "r+b") as f:
+        f.seek(20)
+        byte = f.read(1)
+        f.seek(20)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    assert not manifest.verify("11", good)
+
+    # 没有记录的旧图片：能完整解码则补记，截断的图片校验失败
+    legacy = _webp(folder / names[1])
+    assert manifest.verify("11", legacy)
+    truncated = _webp(folder / names[2], width=200)
+    with open(truncated, "r+b") as f:
+        f.truncate(30)
+    assert not manifest.verify("11", truncated)
+    assert manifest.image_paths("11", str(folder)) == [good, legacy]
+
+    manifest.discard("11", good)
+    manifest.save()
+    reloaded = manifest_module.DownloadManifest(path)
+    assert reloaded.image_paths("11", str(folder)) == [legacy]
+    assert reloaded.missing() == 2
+    # 章节图片列表变化后，不在新列表中的旧记录被丢弃
+    reloaded.expect("11", 1, names[:1])
+    assert reloaded.image_paths("11", str(folder)) == []
+    assert not reloaded.is_complete(["11", "12"])
+
+
+def _download(tmp_path, album, **kwargs):
+    return asyncio.run(
+        jm.JmDownload(
+            str(album.id), str(tmp_path), "op.yml", progress_interval=100, **kwargs
+        )
+    )
+
+
+# jmcomic 的下载线程在图片下载失败后会重新抛出异常
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_download_resumes_and_marks_partial_pdf(tmp_path, monkeypatch):
+    album = FakeAlbum(chapters=2, pages=3)
+    client, _ = install(monkeypatch, jm, album, failures={(1, 2)})
+
+    [partial], count = _download(tmp_path, album)
+    assert count == 5
+    assert partial.endswith("_不完整.pdf")
+    with pikepdf.open(partial) as pdf:
+        assert len(pdf.pages) == 5
+        assert "不完整" in str(pdf.docinfo["/Title"])
+
+    # 不允许不完整的 PDF 时直接报错，已下载的图片留待续传
+    client.downloaded.clear()
+    with pytest.raises(jm.IncompleteAlbumError):
+        _download(tmp_path, album, allow_partial=False)
+    assert client.downloaded == []
+
+    # 损坏一张、删除一张，连同上次失败的一张重新下载，其余复用
+    corrupt = tmp_path / "ch2" / "00001.webp"
+    corrupt.write_bytes(b"x" * corrupt.stat().st_size)
+    os.remove(tmp_path / "ch2" / "00003.webp")
+    client.failures.clear()
+    [pdf_path], count = _download(tmp_path, album)
+    assert sorted(client.downloaded) == ["101/2", "102/1", "102/3"]
+    assert count == 6
+    assert not pdf_path.endswith("_不完整.pdf")
+    assert not os.path.exists(partial)
+    with pikepdf.open(pdf_path) as pdf:
+        assert len(pdf.pages) == 6
+        assert str(pdf.docinfo["/Title"]) == album.name
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from conftest import plugin_module
+
+jm = plugin_module("jm")
+metadata_module = plugin_module("tools.jm.metadata")
+
+
+class _Entity(SimpleNamespace):
+    """按 jmcomic 实体的用法，迭代本子得到章节，迭代章节得到图片"""
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class _Client:
+    def __init__(self, fail: str | None = None):
+        self.fail = fail
+        self.calls = 0
+
+    def get_album_detail(self, album_id):
+        self.calls += 1
+        photos = [_Entity(photo_id=pid) for pid in ("11", "12", "13")]
+        return _Entity(id=album_id, name="album", items=photos)
+
+    def get_photo_detail(self, photo_id, fetch_album=True):
+        self.calls += 1
+        if photo_id == self.fail:
+            # 其他章节先完成并开始发布
+            time.sleep(0.2)
+            raise RuntimeError("photo failed")
+        images = [_Entity(img_url=f"https://cdn.test/{photo_id}/1.webp")]
+        return _Entity(photo_id=photo_id, name=f"ch{photo_id}", items=images)
+
+
+class _Publisher:
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def publish(self, pages):
+        self.started += 1
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [f"https://telegra.ph/{pages[0][0]}"]
+
+
+def test_metadata_is_cached_on_disk(tmp_path):
+    client = _Client()
+
+    async def main():
+        first = metadata_module.JmMetadata(str(tmp_path), lambda: client)
+        album = await first.album("1")
+        photo = await first.photo("11")
+        # 新实例没有内存缓存，从磁盘读回，不再访问上游
+        second = metadata_module.JmMetadata(str(tmp_path), lambda: client)
+        assert await second.album("1") == album
+        assert album == {"id": "1", "name": "album", "photo_ids": ["11", "12", "13"]}
+        assert await second.photo("11") == photo
+        assert client.calls == 2
+
+    asyncio.run(main())
+
+
+def test_publish_tasks_are_cancelled_when_a_chapter_fails(tmp_path):
+    client = _Client(fail="13")
+    publisher = _Publisher()
+
+    async def main():
+        metadata = metadata_module.JmMetadata(str(tmp_path), lambda: client)
+        with pytest.raises(RuntimeError):
+            await jm.jmToph("1", metadata, publisher)
+        # 已经开始的章节发布随之取消，不会留在后台继续运行
+        assert publisher.started == 2
+        assert publisher.cancelled == 2
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+from conftest import OP_YML, plugin_module
+
+domains_module = plugin_module("tools.jm.domains")
+options_module = plugin_module("tools.jm.options")
+
+
+def _touch(path, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    # 同一时间戳内连续写入时 mtime 可能不变，手动推后
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def _usable(client):
+    client.raise_if_resp_should_retry = lambda resp, is_image: resp
+    return client.request_with_retry(lambda url, **kwargs: url, "/album?id=1")
+
+
+def test_reload_builds_new_client(tmp_path):
+    path = tmp_path / "op.yml"
+    shutil.copy(OP_YML, path)
+    controller = domains_module.DomainController(str(tmp_path / "domains.json"))
+    service = options_module.JmOptionService(str(path), domains=controller)
+
+    client = service.client()
+    assert service.client() is client
+    assert client.domain_retry_strategy == controller.retry_strategy
+    assert _usable(client).endswith("/album?id=1")
+
+    _touch(path, OP_YML.read_text(encoding="utf-8").replace("AVS: ", "AVS: reload"))
+    reloaded = service.client()
+    assert reloaded is not client
+    assert service.generation == 2
+    assert reloaded.domain_retry_strategy == controller.retry_strategy
+    assert _usable(reloaded).endswith("/album?id=1")
+
+    option = service.request_option(str(tmp_path / "downloads"))
+    assert option.build_jm_client() is reloaded
+    assert option.client.postman.meta_data.cookies["AVS"].startswith("reload")
+
+
+def test_broken_reload_keeps_client(tmp_path):
+    path = tmp_path / "op.yml"
+    shutil.copy(OP_YML, path)
+    service = options_module.JmOptionService(str(path))
+    client = service.client()
+
+    _touch(path, "client: [broken")
+    assert service.client() is client
+    assert service.generation == 1
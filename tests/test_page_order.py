@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pikepdf
+from conftest import OP_YML, plugin_module
+from PIL import Image
+
+jm = plugin_module("jm")
+writer_module = plugin_module("tools.pdf.writer")
+
+
+class _Photo:
+    index = 1
+    from_album = "album"
+
+
+def test_pages_follow_image_index(tmp_path):
+    from jmcomic import create_option_by_file
+
+    option = create_option_by_file(str(OP_YML))
+    option.dir_rule.base_dir = str(tmp_path)
+    output = str(tmp_path / "chapter.pdf")
+    writer = writer_module.OrderedPageWriter(output)
+    downloader = jm.ChapterPdfDownloader(
+        option, on_photo_done=None, open_chapter=lambda photo: writer
+    )
+    photo = _Photo()
+    downloader.page_writers[photo.index] = writer
+    downloader.download_success_dict[photo.from_album] = {photo: []}
+
+    # 图片按完成顺序 3、1、4 到达，第 2 张下载失败
+    for index in (3, 1, 4):
+        path = str(tmp_path / f"{index:05d}.jpg")
+        Image.new("RGB", (100 + index, 50)).save(path)
+        image = SimpleNamespace(index=index, from_photo=photo)
+        downloader._reuse_image(image, path)
+
+    assert writer.close() == 3
+    with pikepdf.Pdf.open(output) as pdf:
+        widths = [round(float(page.mediabox[2])) for page in pdf.pages]
+    assert len(widths) == 3
+    assert widths == sorted(widths)
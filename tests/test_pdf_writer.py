@@ -0,0 +1,103 @@
+import io
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pikepdf
+from conftest import plugin_module
+from PIL import Image
+
+writer_module = plugin_module("tools.pdf.writer")
+pages_module = plugin_module("tools.pdf.pages")
+
+
+def _jpeg(width: int) -> bytes:
+    """页面宽度即页码，从 PDF 中读回宽度就能判断页序"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, 20), (width % 256, 0, 0)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _widths(path) -> list[int]:
+    with pikepdf.open(path) as pdf:
+        return [
+            int(page.Resources.XObject[key].Width)
+            for page in pdf.pages
+            for key in page.Resources.XObject
+        ]
+
+
+def _leftovers(tmp_path) -> list[str]:
+    return [name for name in os.listdir(tmp_path) if name.startswith(".pdfparts_")]
+
+
+def test_streaming_writer_merges_batches_in_order(tmp_path):
+    output = tmp_path / "out.pdf"
+    writer = writer_module.StreamingPdfWriter(str(output), batch_pages=2)
+    for width in range(10, 15):
+        writer.add_page(_jpeg(width))
+    assert writer.close() == 5
+    assert _widths(output) == [10, 11, 12, 13, 14]
+    assert _leftovers(tmp_path) == []
+
+
+def test_streaming_writer_abort_leaves_nothing(tmp_path):
+    writer = writer_module.StreamingPdfWriter(str(tmp_path / "out.pdf"), batch_pages=1)
+    writer.add_page(_jpeg(10))
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_ordered_writer_sorts_concurrent_pages_and_skips_gaps(tmp_path):
+    output = tmp_path / "out.pdf"
+    writer = writer_module.OrderedPageWriter(str(output), batch_pages=3)
+    # 第 7 页缺失：之后的页面暂存，close 时按页码写出
+    indices = [i for i in range(1, 13) if i != 7]
+    random.Random(0).shuffle(indices)
+    barrier = threading.Barrier(len(indices))
+
+    def put(index):
+        barrier.wait(5)
+        writer.put(index, _jpeg(100 + index))
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in indices]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert writer.close() == 11
+    assert _widths(output) == [100 + i for i in range(1, 13) if i != 7]
+    assert _leftovers(tmp_path) == []
+
+
+def test_merge_pdfs_keeps_order_and_sets_title(tmp_path):
+    parts = []
+    for width in (30, 10, 20):
+        part = tmp_path / f"{width}.pdf"
+        writer = writer_module.StreamingPdfWriter(str(part))
+        writer.add_page(_jpeg(width))
+        writer.close()
+        parts.append(str(part))
+    output = tmp_path / "merged.pdf"
+    writer_module.merge_pdfs(parts, str(output), "标题")
+    assert _widths(output) == [30, 10, 20]
+    with pikepdf.open(output) as pdf:
+        assert str(pdf.docinfo["/Title"]) == "标题"
+
+
+def test_images_to_pdf_keeps_file_order_with_executor(tmp_path):
+    paths = []
+    for i, width in enumerate((40, 10, 30, 20, 50)):
+        path = tmp_path / f"{i:05d}.webp"
+        Image.new("RGB", (width, 20)).save(path, format="WEBP", lossless=True)
+        paths.append(str(path))
+    output = tmp_path / "out.pdf"
+    options = pages_module.PageOptions(cache=False)
+    with ThreadPoolExecutor(4) as executor:
+        pages = writer_module.images_to_pdf(
+            paths, str(output), executor=executor, batch_pages=2, options=options
+        )
+    assert pages == 5
+    assert _widths(output) == [40, 10, 30, 20, 50]
+    assert _leftovers(tmp_path) == []
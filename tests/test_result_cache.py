@@ -0,0 +1,29 @@
+from conftest import plugin_module
+
+result_cache = plugin_module("tools.image_hex.result_cache")
+metrics = plugin_module("tools.metrics.registry").metrics
+
+
+def _count(result: str) -> float:
+    return metrics.counter("cache_requests", cache="fanqie_result", result=result)
+
+
+def test_lookups_are_reported_to_metrics(tmp_path):
+    before = {r: _count(r) for r in ("hit", "disk_hit", "miss")}
+    cache = result_cache.ResultCache(
+        max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024
+    )
+    key = result_cache.content_key(b"image", "encrypt")
+    assert cache.get(key) is None
+    cache.put(key, b"result")
+    assert cache.get(key) == b"result"
+    # 新实例只有磁盘层
+    reopened = result_cache.ResultCache(
+        max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024
+    )
+    assert reopened.get(key) == b"result"
+    assert {r: _count(r) - before[r] for r in before} == {
+        "hit": 1,
+        "disk_hit": 1,
+        "miss": 1,
+    }
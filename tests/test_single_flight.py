@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from conftest import plugin_module
+
+single_flight = plugin_module("tools.jm.single_flight")
+
+
+def test_waiters_share_one_run_result_and_progress():
+    async def main():
+        flights = single_flight.SingleFlight()
+        release = asyncio.Event()
+        runs = []
+        received = {"a": [], "b": [], "late": []}
+
+        async def job(progress):
+            runs.append(1)
+            await progress("50%")
+            await release.wait()
+            await progress("100%")
+            return "result"
+
+        def collector(name):
+            async def on_progress(text):
+                received[name].append(text)
+
+            return on_progress
+
+        async def broken(text):
+            raise RuntimeError("send failed")
+
+        a = asyncio.create_task(flights.run("k", job, collector("a")))
+        await asyncio.sleep(0)
+        b = asyncio.create_task(flights.run("k", job, collector("b")))
+        c = asyncio.create_task(flights.run("k", job, broken))
+        await asyncio.sleep(0.01)
+        assert flights.waiters("k") == 3
+        # 后加入的等待者先补发最近一次进度
+        late = asyncio.create_task(flights.run("k", job, collector("late")))
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await asyncio.gather(a, b, c, late) == ["result"] * 4
+        assert runs == [1]
+        assert received["a"] == ["50%", "100%"]
+        # b 在第一次进度之后才订阅，同样补发
+        assert received["b"] == ["50%", "100%"]
+        assert received["late"] == ["50%", "100%"]
+        assert not flights.is_running("k")
+
+    asyncio.run(main())
+
+
+def test_errors_reach_every_waiter():
+    async def main():
+        flights = single_flight.SingleFlight()
+
+        async def job(progress):
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(flights.run("k", job)) for _ in range(3)]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert not flights.is_running("k")
+
+    asyncio.run(main())
+
+
+def test_job_is_cancelled_only_when_every_waiter_leaves():
+    async def main():
+        flights = single_flight.SingleFlight()
+        cancelled = asyncio.Event()
+        release = asyncio.Event()
+
+        async def job(progress):
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "done"
+
+        a = asyncio.create_task(flights.run("k", job))
+        b = asyncio.create_task(flights.run("k", job))
+        await asyncio.sleep(0.01)
+        a.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await a
+        # 还有等待者时任务继续
+        assert not cancelled.is_set()
+        assert flights.waiters("k") == 1
+        b.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await b
+        await asyncio.sleep(0)
+        assert cancelled.is_set()
+        assert not flights.is_running("k")
+
+        # 之后的请求重新执行
+        release.set()
+        assert await flights.run("k", job) == "done"
+
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+from conftest import plugin_module
+from telegraph.aio import RetryAfterError
+
+telegraph_publisher = plugin_module("tools.jm.telegraph_publisher")
+
+
+def test_split_chapter_html_keeps_order_and_size_limit():
+    header = "<p>album</p>"
+    urls = [f"https://cdn.test/{i:05d}-{'x' * 200}.webp" for i in range(600)]
+    pages = telegraph_publisher.split_chapter_html(header, urls)
+    assert len(pages) > 1
+    for page in pages:
+        assert page.startswith(header)
+        assert len(page.encode()) <= telegraph_publisher.MAX_PAGE_HTML
+    # 拆分后按原顺序包含全部图片，没有重复
+    joined = "".join(page[len(header) :] for page in pages)
+    assert joined == "".join(f"<img src='{url}'></img>" for url in urls)
+
+
+def test_split_chapter_html_small_and_oversized():
+    assert telegraph_publisher.split_chapter_html("<p>h</p>", []) == ["<p>h</p>"]
+    # 单张图片超过上限时仍单独成页，不会死循环或丢图
+    huge = "https://cdn.test/" + "x" * telegraph_publisher.MAX_PAGE_HTML
+    pages = telegraph_publisher.split_chapter_html("<p>h</p>", ["a", huge, "b"])
+    assert len(pages) == 3
+    assert huge in pages[1]
+
+
+class _Clock:
+    """替换限速器使用的时钟和 sleep，测试不必真的等待；其余 asyncio 功能照常使用"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+
+def _use_clock(monkeypatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(
+        telegraph_publisher, "time", SimpleNamespace(monotonic=clock.monotonic)
+    )
+    monkeypatch.setattr(telegraph_publisher, "asyncio", clock)
+    return clock
+
+
+def test_token_bucket_paces_and_backs_off(monkeypatch):
+    clock = _use_clock(monkeypatch)
+
+    async def main():
+        bucket = telegraph_publisher.AdaptiveTokenBucket(rate=2.0, burst=2)
+        # 突发额度用完后按速率放行
+        for _ in range(4):
+            await bucket.acquire()
+        assert clock.now == 1.0
+
+        # retry_after 之后再多等 1 秒，速率减半；暂停期间不积累令牌，恢复后不会突发
+        bucket.on_retry_after(5)
+        assert bucket.rate == 1.0
+        await bucket.acquire()
+        assert clock.now == 1.0 + 5 + 1 + 1
+        await bucket.acquire()
+        assert clock.now == 1.0 + 5 + 1 + 2
+
+        # 成功请求逐步恢复速率，不超过初始值；限速不低于 min_rate
+        for _ in range(100):
+            bucket.on_success()
+        assert bucket.rate == 2.0
+        for _ in range(20):
+            bucket.on_retry_after(0)
+        assert bucket.rate == bucket.min_rate
+
+    asyncio.run(main())
+
+
+# 第一次发布页面 b 时触发限流
+FLOOD: dict[str, int] = {}
+CREATED: list[str] = []
+
+
+class _FakeTelegraph:
+    def __init__(self, access_token=None):
+        self.access_token = access_token
+
+    async def create_account(self, short_name):
+        return {"access_token": "token"}
+
+    async def create_page(self, title, html_content):
+        if title in FLOOD:
+            raise RetryAfterError(FLOOD.pop(title))
+        CREATED.append(title)
+        return {"url": f"https://telegra.ph/{title}"}
+
+
+def test_publisher_retries_after_flood_control(tmp_path, monkeypatch):
+    clock = _use_clock(monkeypatch)
+    monkeypatch.setattr(telegraph_publisher, "Telegraph", _FakeTelegraph)
+    FLOOD["b"] = 3
+
+    async def main():
+        publisher = telegraph_publisher.TelegraphPublisher(str(tmp_path / "token.json"))
+        urls = await publisher.publish([(t, "<p></p>") for t in "abcd"])
+        # 顺序与输入一致，被限流的页面重试后成功
+        assert urls == [f"https://telegra.ph/{t}" for t in "abcd"]
+        assert sorted(CREATED) == list("abcd")
+        assert clock.now >= 3 + 1
+        assert publisher._bucket.rate < publisher._bucket.max_rate
+        assert (tmp_path / "token.json").exists()
+
+    asyncio.run(main())
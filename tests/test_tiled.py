@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import pytest
+from conftest import plugin_module
+from PIL import Image
+
+transform = plugin_module("tools.image_hex.transform")
+tiled = plugin_module("tools.image_hex.tiled")
+
+
+def _encode(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _image(mode: str, size: tuple[int, int]) -> Image.Image:
+    rng = np.random.default_rng(0)
+    if mode == "P":
+        img = Image.fromarray(rng.integers(0, 16, size[::-1], dtype=np.uint8), "L")
+        img = img.convert("P")
+        img.info["transparency"] = 3
+        return img
+    channels = {"L": 1, "RGB": 3, "RGBA": 4}[mode]
+    data = rng.integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(data.squeeze(), mode)
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA", "P"])
+@pytest.mark.parametrize("direction", ["encrypt", "decrypt"])
+def test_tiled_output_matches_in_memory(mode, direction):
+    image = _encode(_image(mode, (67, 45)))
+    expected = transform.permute_image(image, direction).tobytes()
+    # 小于像素数的阈值触发分块模式
+    assert transform.permute_image(image, direction, tile_pixels=100).tobytes() == (
+        expected
+    )
+
+
+@pytest.mark.parametrize("chunk_pixels", [1, 50, 67 * 3, 10_000])
+def test_tiled_chunks_match_in_memory(chunk_pixels):
+    src = _image("RGB", (67, 45))
+    expected = transform.permute_image(_encode(src), "encrypt").tobytes()
+    img = Image.open(io.BytesIO(_encode(src)))
+    img.load()
+    result = tiled.permute_tiled(
+        img, "RGB", np.dtype("V3"), "encrypt", chunk_pixels=chunk_pixels
+    )
+    assert result.tobytes() == expected
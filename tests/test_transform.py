@@ -0,0 +1,71 @@
+import io
+
+import numpy as np
+import pytest
+from conftest import plugin_module
+from PIL import Image
+
+gilbert = plugin_module("tools.image_hex.gilbert")
+transform = plugin_module("tools.image_hex.transform")
+
+
+def _encode(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _image(mode: str, width: int, height: int, seed: int = 0) -> Image.Image:
+    channels = {"L": 1, "RGB": 3, "RGBA": 4}[mode]
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, (height, width, channels), dtype=np.uint8)
+    return Image.fromarray(data.squeeze(axis=2) if channels == 1 else data, mode)
+
+
+def _reference(img: Image.Image, mode: str) -> bytes:
+    """逐通道的参考实现: 按路径取出像素（每个像素一行），循环移动后填回"""
+    width, height = img.size
+    pixels = np.asarray(img).reshape(width * height, -1)
+    path = gilbert.gilbert2d(width, height)
+    offset = gilbert.path_offset(width, height)
+    result = np.empty_like(pixels)
+    shift = offset if mode == "encrypt" else -offset
+    result[path] = np.roll(pixels[path], shift, axis=0)
+    return result.tobytes()
+
+
+@pytest.mark.parametrize("pixel_mode", ["L", "RGB", "RGBA"])
+@pytest.mark.parametrize("mode", ["encrypt", "decrypt"])
+@pytest.mark.parametrize(("width", "height"), [(1, 1), (9, 4), (4, 9), (31, 17)])
+def test_packed_gather_matches_reference(pixel_mode, mode, width, height):
+    img = _image(pixel_mode, width, height)
+    result = transform.permute_image(_encode(img), mode)
+    assert result.mode == pixel_mode
+    assert result.size == (width, height)
+    assert result.tobytes() == _reference(img, mode)
+
+
+def test_out_buffer_is_reused_across_image_sizes():
+    transform._out_buffer = None
+    sizes = [
+        ("RGB", 9, 4),
+        # 像素数相同、宽高不同，复用同一个缓冲区
+        ("RGB", 4, 9),
+        ("RGB", 6, 6),
+        # 字节数不同时重新分配
+        ("RGBA", 6, 6),
+        ("L", 20, 7),
+        ("RGB", 9, 4),
+    ]
+    buffers = []
+    for seed, (pixel_mode, width, height) in enumerate(sizes):
+        img = _image(pixel_mode, width, height, seed)
+        result = transform.permute_image(_encode(img), "encrypt")
+        # 结果与复用的缓冲区共享内存，必须在处理下一张图片前比较
+        assert result.tobytes() == _reference(img, "encrypt")
+        buffers.append(transform._out_buffer)
+    assert buffers[0] is buffers[1] is buffers[2]
+    assert buffers[3] is not buffers[2]
+    assert buffers[4] is not buffers[3]
+    assert buffers[5] is not buffers[4]
+    assert buffers[5].nbytes == 9 * 4 * 3
@@ -0,0 +1,41 @@
+import io
+
+from conftest import plugin_module
+from PIL import Image
+
+codec = plugin_module("tools.image_hex.codec")
+transform = plugin_module("tools.image_hex.transform")
+
+
+def _png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _noise(size: tuple[int, int]) -> Image.Image:
+    return Image.frombytes(
+        "RGB", size, bytes(i * 7 % 256 for i in range(size[0] * size[1] * 3))
+    )
+
+
+def test_clean_result_is_lossless_when_output_is_jpeg():
+    # 超过大图阈值，自动模式下输出 JPEG
+    img = _noise((1500, 1500))
+    [(output, clean, _, _)] = transform.transform_images([_png(img)], "decrypt")
+    assert Image.open(io.BytesIO(output)).format == "JPEG"
+    with Image.open(io.BytesIO(clean)) as decoded:
+        assert decoded.format == "PNG"
+        expected = transform.permute_image(_png(img), "decrypt")
+        assert decoded.tobytes() == expected.tobytes()
+
+
+def test_watermark_keeps_mode_and_options():
+    clean = _png(_noise((64, 64)))
+    output = transform.watermark_image(clean, codec.EncodeOptions(codec="webp"))
+    with Image.open(io.BytesIO(output)) as img:
+        assert img.format == "WEBP"
+        assert img.mode == "RGB"
+    gray = _png(Image.new("L", (64, 64), 200))
+    with Image.open(io.BytesIO(transform.watermark_image(gray))) as img:
+        assert img.mode == "L"
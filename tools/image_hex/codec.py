@@ -0,0 +1,96 @@
+import io
+
+from PIL import Image
+
+# 自动模式下超过该像素数视为大图，优先考虑编码速度
+LARGE_IMAGE_PIXELS = 2_000_000
+
+CODECS = ("auto", "png", "webp", "jpeg")
+
+
+class EncodeOptions:
+    """
+    输出图片的编码选项，可被 pickle 传入子进程
+
+    codec:
+        png  无损，compress_level 0-9 越大越慢越小
+        webp 无损 WebP，method 0-6 越大越慢越小；需要显式选择
+        jpeg 有损，仅用于解混淆；混淆结果需要完美还原，会自动改用 png
+        auto 混淆结果始终用 PNG（大图降低压缩等级），解混淆大图用 JPEG
+    """
+
+    def __init__(
+        self,
+        codec: str = "auto",
+        png_level: int = 6,
+        webp_method: int = 4,
+        jpeg_quality: int = 92,
+    ):
+        self.codec = codec if codec in CODECS else "auto"
+        self.png_level = png_level
+        self.webp_method = webp_method
+        self.jpeg_quality = jpeg_quality
+
+    def cache_tag(self) -> str:
+        """参与结果缓存 key 的编码参数"""
+        return f"{self.codec}:{self.png_level}:{self.webp_method}:{self.jpeg_quality}"
+
+    def choose(self, img: Image.Image, mode: str) -> str:
+        codec = self.codec
+        if codec == "jpeg" and mode != "decrypt":
+            return "png"
+        if codec != "auto":
+            return codec
+        large = img.width * img.height > LARGE_IMAGE_PIXELS
+        if mode == "decrypt":
+            # 解混淆结果只用于查看，大图用 JPEG 同时降低编码耗时和上传体积
+            return "jpeg" if large else "png"
+        # 混淆结果默认保持原来的 PNG 输出，WebP 需要在配置中显式选择
+        return "png"
+
+
+def encode_image(
+    img: Image.Image, mode: str = "encrypt", options: EncodeOptions | None = None
+) -> bytes:
+    options = options or EncodeOptions()
+    codec = options.choose(img, mode)
+    output_buffer = io.BytesIO()
+    if codec == "jpeg":
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(
+            output_buffer,
+            format="JPEG",
+            quality=options.jpeg_quality,
+            subsampling=0 if options.jpeg_quality >= 90 else 2,
+        )
+    elif codec == "webp":
+        img.save(
+            output_buffer,
+            format="WEBP",
+            lossless=True,
+            exact=True,
+            method=options.webp_method,
+        )
+    else:
+        # 大图使用较低压缩等级，编码耗时随等级增长很快
+        level = options.png_level
+        if options.codec == "auto" and img.width * img.height > LARGE_IMAGE_PIXELS:
+            level = min(level, 1)
+        img.save(output_buffer, format="PNG", compress_level=level)
+    return output_buffer.getvalue()
+
+
+def encode_lossless(img: Image.Image, options: EncodeOptions | None = None) -> bytes:
+    """
+    以无损格式编码需要再次解码的中间结果（例如缓存的无水印解混淆结果）
+
+    选项本身是无损格式时与 encode_image 的结果相同；会选择 JPEG 时改用低压缩等级的 PNG，
+    避免取出后再次有损编码造成二次压缩。
+    """
+    options = options or EncodeOptions()
+    if options.choose(img, "decrypt") != "jpeg":
+        return encode_image(img, "decrypt", options)
+    output_buffer = io.BytesIO()
+    img.save(output_buffer, format="PNG", compress_level=1)
+    return output_buffer.getvalue()
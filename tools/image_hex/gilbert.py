@@ -0,0 +1,230 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 黄金分割比例，用于计算路径上的循环偏移量
+GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+
+def _index_dtype(pixel_count: int):
+    """像素数不超过 int32 范围时使用 int32，索引数组体积减半"""
+    return np.int32 if pixel_count < 2**31 else np.int64
+
+
+def gilbert2d(
+    width: int, height: int, start: int = 0, stop: int | None = None
+) -> np.ndarray:
+    """
+    生成广义希尔伯特曲线，返回按路径顺序排列的一维像素索引 (y * width + x)
+
+    与原递归实现的遍历顺序完全一致，但按层批量处理所有待拆分的矩形区域，
+    每层只做少量 NumPy 运算，避免逐像素的 Python 调用和元组对象。
+    指定 start/stop 时只生成路径上 [start, stop) 这一段，
+    与路径不相交的区域在拆分时直接丢弃，内存占用只与这一段的长度有关。
+    """
+    n = width * height
+    dtype = _index_dtype(n)
+    stop = n if stop is None else min(stop, n)
+    start = max(0, start)
+    out = np.empty(max(0, stop - start), dtype=dtype)
+    if len(out) == 0:
+        return out
+    partial = start > 0 or stop < n
+
+    # 每个待处理区域: 起点 (x, y)、主方向 (ax, ay)、副方向 (bx, by)、在输出中的起始位置
+    if width >= height:
+        regions = np.array([[0, 0, width, 0, 0, height, 0]], dtype=dtype)
+    else:
+        regions = np.array([[0, 0, 0, height, width, 0, 0]], dtype=dtype)
+
+    while len(regions):
+        x, y, ax, ay, bx, by, off = regions.T
+        w = np.abs(ax + ay)
+        h = np.abs(bx + by)
+        if partial:
+            # 只保留与 [start, stop) 有交集的区域
+            hit = (off < stop) & (off + w * h > start)
+            if not hit.all():
+                x, y, ax, ay, bx, by, off = (
+                    v[hit] for v in (x, y, ax, ay, bx, by, off)
+                )
+                w, h = w[hit], h[hit]
+        dax, day = np.sign(ax), np.sign(ay)
+        dbx, dby = np.sign(bx), np.sign(by)
+
+        # 叶子区域: 高度为 1 时沿主方向走一行，宽度为 1 时沿副方向走一列
+        row = h == 1
+        col = (w == 1) & ~row
+        leaf = row | col
+        if leaf.any():
+            length = np.where(row, w, h)[leaf]
+            sx = np.where(row, dax, dbx)[leaf]
+            sy = np.where(row, day, dby)[leaf]
+            starts = np.cumsum(length) - length
+            step = np.arange(length.sum(), dtype=dtype) - np.repeat(starts, length)
+            px = np.repeat(x[leaf], length) + step * np.repeat(sx, length)
+            py = np.repeat(y[leaf], length) + step * np.repeat(sy, length)
+            pos = np.repeat(off[leaf], length) + step - start
+            if partial:
+                inside = (pos >= 0) & (pos < len(out))
+                pos, px, py = pos[inside], px[inside], py[inside]
+            out[pos] = py * width + px
+
+        keep = ~leaf
+        if not keep.any():
+            break
+        x, y, ax, ay, bx, by, off = (v[keep] for v in (x, y, ax, ay, bx, by, off))
+        w, h = w[keep], h[keep]
+        dax, day, dbx, dby = dax[keep], day[keep], dbx[keep], dby[keep]
+
+        # 与 Python 的 // 保持一致（向下取整）
+        ax2, ay2 = ax // 2, ay // 2
+        bx2, by2 = bx // 2, by // 2
+        w2 = np.abs(ax2 + ay2)
+        h2 = np.abs(bx2 + by2)
+
+        children = []
+
+        # 横向拆分: 沿主方向切成两块
+        split = 2 * w > 3 * h
+        if split.any():
+            s = split
+            fix = ((w2[s] % 2) == 1) & (w[s] > 2)
+            sax2 = ax2[s] + np.where(fix, dax[s], 0)
+            say2 = ay2[s] + np.where(fix, day[s], 0)
+            first = np.abs(sax2 + say2) * h[s]
+            children.append(
+                np.stack([x[s], y[s], sax2, say2, bx[s], by[s], off[s]], axis=1)
+            )
+            children.append(
+                np.stack(
+                    [
+                        x[s] + sax2,
+                        y[s] + say2,
+                        ax[s] - sax2,
+                        ay[s] - say2,
+                        bx[s],
+                        by[s],
+                        off[s] + first,
+                    ],
+                    axis=1,
+                )
+            )
+
+        # 纵向拆分: 切成三块（下、右、上翻转）
+        t = ~split
+        if t.any():
+            fix = ((h2[t] % 2) == 1) & (h[t] > 2)
+            tbx2 = bx2[t] + np.where(fix, dbx[t], 0)
+            tby2 = by2[t] + np.where(fix, dby[t], 0)
+            tax2, tay2 = ax2[t], ay2[t]
+            first = np.abs(tbx2 + tby2) * np.abs(tax2 + tay2)
+            second = w[t] * np.abs(bx[t] - tbx2 + by[t] - tby2)
+            children.append(
+                np.stack([x[t], y[t], tbx2, tby2, tax2, tay2, off[t]], axis=1)
+            )
+            children.append(
+                np.stack(
+                    [
+                        x[t] + tbx2,
+                        y[t] + tby2,
+                        ax[t],
+                        ay[t],
+                        bx[t] - tbx2,
+                        by[t] - tby2,
+                        off[t] + first,
+                    ],
+                    axis=1,
+                )
+            )
+            children.append(
+                np.stack(
+                    [
+                        x[t] + (ax[t] - dax[t]) + (tbx2 - dbx[t]),
+                        y[t] + (ay[t] - day[t]) + (tby2 - dby[t]),
+                        -tbx2,
+                        -tby2,
+                        -(ax[t] - tax2),
+                        -(ay[t] - tay2),
+                        off[t] + first + second,
+                    ],
+                    axis=1,
+                )
+            )
+
+        regions = np.concatenate(children)
+
+    return out
+
+
+def path_offset(width: int, height: int) -> int:
+    """路径上的循环偏移量"""
+    return int(round(GOLDEN_RATIO * width * height))
+
+
+def build_permutation(width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    计算混淆/解混淆使用的一次性 gather 索引
+
+    混淆: result[path[k]] = pixels[path[k - offset]]
+    解混淆: result[path[k]] = pixels[path[k + offset]]
+    因此 result = pixels[index] 一次花式索引即可完成整张图的变换。
+    """
+    path = gilbert2d(width, height)
+    offset = path_offset(width, height)
+
+    encrypt = np.empty_like(path)
+    encrypt[path] = np.roll(path, offset)
+    decrypt = np.empty_like(path)
+    decrypt[path] = np.roll(path, -offset)
+    return encrypt, decrypt
+
+
+class PermutationCache:
+    """
+    按 (width, height) 缓存混淆/解混淆索引的 LRU 缓存，按占用字节数限制总大小
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[tuple[int, int], tuple[np.ndarray, np.ndarray]] = (
+            OrderedDict()
+        )
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, width: int, height: int, mode: str) -> np.ndarray:
+        key = (width, height)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        if item is None:
+            item = build_permutation(width, height)
+            self._put(key, item)
+        return item[0] if mode == "encrypt" else item[1]
+
+    def _put(self, key, item):
+        nbytes = item[0].nbytes + item[1].nbytes
+        if nbytes > self.max_bytes:
+            # 单个条目超过上限时不缓存
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = item
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self._size -= old[0].nbytes + old[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+# 进程内共享的缓存，FanqieHex 每次请求都会新建实例
+permutation_cache = PermutationCache()
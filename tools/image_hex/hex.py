@@ -4,25 +4,22 @@ import base64
 import io
 from pathlib import Path
 
-import aiohttp
 from PIL import Image as PILImage
 
 import astrbot.core.message.components as Comp
 from astrbot.api import logger
 from astrbot.core.platform.astr_message_event import AstrMessageEvent
 
+from .session import SessionManager
+
 
 class ImageWorkflow(abc.ABC):
-    def __init__(self, proxy=None):
-        connector = aiohttp.TCPConnector()
-        self.session = aiohttp.ClientSession(connector=connector)
-        self.proxy = proxy
+    def __init__(self, sessions: SessionManager):
+        self.sessions = sessions
 
     async def _download_image(self, url: str) -> bytes | None:
         try:
-            async with self.session.get(url, proxy=self.proxy) as resp:
-                resp.raise_for_status()
-                return await resp.read()
+            return await self.sessions.fetch(url)
         except Exception as e:
             logger.error(f"图片下载失败: {e}")
             return None
@@ -32,7 +29,11 @@ class ImageWorkflow(abc.ABC):
         使用PIL库处理图片数据。如果是GIF，则提取第一帧并转为PNG。
         """
         img_io = io.BytesIO(raw)
-        img = PILImage.open(img_io)
+        try:
+            img = PILImage.open(img_io)
+        except (OSError, ValueError, SyntaxError):
+            # 无法识别的图片原样返回，由后续处理报告这一张失败，不影响同批的其他图片
+            return raw
         if img.format != "GIF":
             return raw
         logger.info("检测到GIF, 将抽取 GIF 的第一帧来生图")
@@ -73,6 +74,40 @@ class ImageWorkflow(abc.ABC):
                     return img
         return None
 
-    async def terminate(self):
-        if self.session and not self.session.closed:
-            await self.session.close()
+    def _collect_image_sources(self, event: AstrMessageEvent) -> list[list[str]]:
+        """
+        按顺序收集引用消息和当前消息中的全部图片，每张图片给出 url/file 候选列表
+        """
+        segs: list = []
+        for s in event.message_obj.message:
+            if isinstance(s, Comp.Reply) and s.chain:
+                segs.extend(seg for seg in s.chain if isinstance(seg, Comp.Image))
+        segs.extend(
+            seg for seg in event.message_obj.message if isinstance(seg, Comp.Image)
+        )
+
+        sources: list[list[str]] = []
+        seen: set[str] = set()
+        for seg in segs:
+            candidates = [src for src in (seg.url, seg.file) if src]
+            if not candidates or candidates[0] in seen:
+                continue
+            seen.add(candidates[0])
+            sources.append(candidates)
+        return sources
+
+    async def _load_first_available(self, candidates: list[str]) -> bytes | None:
+        for src in candidates:
+            if img := await self._load_bytes(src):
+                return img
+        return None
+
+    async def get_all_images(self, event: AstrMessageEvent) -> list[bytes]:
+        """
+        并发下载消息及引用消息中的所有图片，保持图片在消息中的顺序
+        """
+        sources = self._collect_image_sources(event)
+        results = await asyncio.gather(
+            *(self._load_first_available(candidates) for candidates in sources)
+        )
+        return [img for img in results if img]
@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from astrbot.api import logger
+
+
+class PoolBusyError(Exception):
+    """排队任务数已达上限"""
+
+
+class PoolBrokenError(Exception):
+    """子进程异常退出（例如内存不足被杀），进程池已丢弃，下一个任务会重新创建"""
+
+
+class HexWorkerPool:
+    """
+    插件持有的图片处理进程池
+
+    CPU 密集的解码/置换/编码放到子进程中执行，避免阻塞 AstrBot 的事件循环。
+    同时最多运行 max_workers 个任务，排队中的任务超过 max_queue 时直接拒绝。
+    子进程异常退出后进程池不可再用，丢弃后由下一个任务重新创建。
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """运行中 + 排队中的任务数"""
+        return self._pending
+
+    def can_accept(self, count: int = 1) -> bool:
+        """是否还能再接收 count 个任务"""
+        return self._pending + count <= self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        # 同一个进程池上的任务会同时收到 BrokenProcessPool，只丢弃一次
+        if self._executor is executor:
+            logger.warning("[fanqiehex] 图片处理子进程异常退出，重新创建进程池")
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func, *args):
+        """
+        在进程池中执行 func(*args)，func 及参数/返回值需要可以被 pickle
+
+        子进程异常退出时抛出 PoolBrokenError，不自动重试（可能正是这个任务导致的）。
+        """
+        if not self.can_accept():
+            raise PoolBusyError(f"当前有 {self._pending} 个图片任务在处理")
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor()
+                try:
+                    return await loop.run_in_executor(executor, func, *args)
+                except BrokenProcessPool as e:
+                    self._discard(executor)
+                    raise PoolBrokenError("图片处理进程异常退出") from e
+        finally:
+            self._pending -= 1
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            logger.info("[fanqiehex] 关闭图片处理进程池")
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from astrbot.api import logger
+
+from ..metrics.registry import metrics
+
+
+def content_key(image_bytes: bytes, mode: str) -> str:
+    """源图片内容 + 模式的 BLAKE2 摘要"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(mode.encode())
+    h.update(b"\0")
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    按内容寻址的混淆/解混淆结果缓存
+
+    内存层为按字节数限制的 LRU；提供 disk_dir 时启用磁盘层，
+    同样按总大小淘汰最久未使用的文件。解混淆结果存的是未加水印的版本。
+    命中情况记录在指标 cache_requests{cache="fanqie_result"} 中。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 128 * 1024 * 1024,
+        disk_dir: str | None = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        # 按修改时间恢复 LRU 顺序
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_size += size
+        self._evict_disk()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.max_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                metrics.inc("cache_requests", cache="fanqie_result", result="hit")
+                return data
+            if self.disk_dir and key in self._disk:
+                try:
+                    with open(self._disk_path(key), "rb") as f:
+                        data = f.read()
+                    os.utime(self._disk_path(key))
+                except OSError:
+                    self._disk_size -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self._put_memory(key, data)
+                    metrics.inc(
+                        "cache_requests", cache="fanqie_result", result="disk_hit"
+                    )
+                    return data
+            metrics.inc("cache_requests", cache="fanqie_result", result="miss")
+            return None
+
+    def put(self, key: str, data: bytes):
+        with self._lock:
+            self._put_memory(key, data)
+            if not self.disk_dir or key in self._disk:
+                return
+            if len(data) > self.disk_max_bytes:
+                return
+            try:
+                tmp = self._disk_path(key) + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self._disk_path(key))
+            except OSError as e:
+                logger.warning(f"[fanqiehex] 写入磁盘缓存失败: {e}")
+                return
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            self._evict_disk()
@@ -0,0 +1,75 @@
+import asyncio
+
+import aiohttp
+from astrbot.api import logger
+
+from ..metrics.registry import metrics
+
+
+class ImageTooLargeError(Exception):
+    """下载的图片超过大小上限"""
+
+
+class SessionManager:
+    """
+    插件级共享的 aiohttp 会话
+
+    所有图片下载复用同一个连接池（保持 keep-alive 和 DNS 缓存），
+    会话在第一次使用时创建，由插件在 terminate 时关闭。
+    """
+
+    def __init__(
+        self,
+        proxy: str | None = None,
+        limit: int = 32,
+        limit_per_host: int = 8,
+        dns_ttl: int = 300,
+        timeout: float = 60,
+        connect_timeout: float = 10,
+        max_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.proxy = proxy or None
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout, sock_connect=connect_timeout
+        )
+        self.max_bytes = max_bytes
+        self._session: aiohttp.ClientSession | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> aiohttp.ClientSession:
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_ttl,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector, timeout=self.timeout
+                )
+            return self._session
+
+    async def fetch(self, url: str) -> bytes:
+        """流式读取响应，超过 max_bytes 时立即中断"""
+        session = await self.get()
+        with metrics.timer("image_fetch"):
+            async with session.get(url, proxy=self.proxy) as resp:
+                resp.raise_for_status()
+                if resp.content_length and resp.content_length > self.max_bytes:
+                    raise ImageTooLargeError(f"图片大小 {resp.content_length} 超过上限")
+                buffer = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    buffer.extend(chunk)
+                    if len(buffer) > self.max_bytes:
+                        raise ImageTooLargeError(f"图片大小超过上限 {self.max_bytes}")
+        metrics.inc("image_fetch_bytes", len(buffer))
+        return bytes(buffer)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            logger.info("[fanqiehex] 关闭共享 HTTP 会话")
+            await self._session.close()
+        self._session = None
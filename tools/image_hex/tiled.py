@@ -0,0 +1,78 @@
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from .gilbert import _index_dtype, gilbert2d, path_offset
+
+# 分块模式下每块处理的像素数
+CHUNK_PIXELS = 1 << 20
+
+
+def _temp_array(dtype, shape) -> np.memmap:
+    """以匿名临时文件为后端的数组，数据由系统页缓存管理而不占用进程堆内存"""
+    return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode="w+", shape=shape)
+
+
+def _ring_slice(arr: np.ndarray, start: int, length: int) -> np.ndarray:
+    """取环形数组上从 start 开始的 length 个元素"""
+    n = len(arr)
+    start %= n
+    if start + length <= n:
+        return arr[start : start + length]
+    return np.concatenate((arr[start:], arr[: start + length - n]))
+
+
+def permute_tiled(
+    img: Image.Image,
+    pixel_mode: str,
+    dtype,
+    mode: str,
+    chunk_pixels: int = CHUNK_PIXELS,
+) -> Image.Image:
+    """
+    分块执行番茄混淆 / 解混淆，结果与整图一次置换完全相同
+
+    img 为已解码的原图，按行条带转换为 pixel_mode 后写入内存映射文件，之后即释放；
+    曲线路径按块生成后同样写入内存映射文件，像素按块读取和写回。
+    整张图大小的格式转换副本、置换索引和中间数组都不再占用进程内存，
+    适合超长条漫等超大图片。
+
+    限制: PNG/JPEG/WebP 等格式的解码器不支持按条带解码，原图在调用前已经
+    整张解码，峰值内存仍至少为一张解码后的原图。
+    """
+    width, height = img.size
+    n = width * height
+    itemsize = np.dtype(dtype).itemsize
+
+    # 按行条带转换像素格式并复制到内存映射文件，之后释放 PIL 图片
+    source = _temp_array(np.uint8, (height, width * itemsize))
+    rows = max(1, chunk_pixels // width)
+    for y in range(0, height, rows):
+        strip = img.crop((0, y, width, min(height, y + rows)))
+        if strip.mode != pixel_mode:
+            strip = strip.convert(pixel_mode)
+        strip = np.asarray(strip)
+        source[y : y + len(strip)] = strip.reshape(len(strip), -1)
+    img.close()
+    pixels = source.reshape(-1).view(dtype)
+
+    path = _temp_array(_index_dtype(n), (n,))
+    for start in range(0, n, chunk_pixels):
+        path[start : start + chunk_pixels] = gilbert2d(
+            width, height, start, start + chunk_pixels
+        )
+
+    # 混淆: result[path[k]] = pixels[path[k - offset]]
+    # 解混淆: result[path[k]] = pixels[path[k + offset]]
+    offset = path_offset(width, height)
+    shift = -offset if mode == "encrypt" else offset
+    result = _temp_array(np.uint8, (n * itemsize,))
+    out = result.view(dtype)
+    for start in range(0, n, chunk_pixels):
+        dst = path[start : start + chunk_pixels]
+        out[dst] = pixels[_ring_slice(path, start + shift, len(dst))]
+
+    return Image.frombuffer(
+        pixel_mode, (width, height), result, "raw", pixel_mode, 0, 1
+    )
@@ -0,0 +1,279 @@
+import io
+import secrets
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .codec import EncodeOptions, encode_image, encode_lossless
+from .gilbert import permutation_cache
+from .tiled import permute_tiled
+
+# 本模块只包含纯 CPU 计算，不依赖 astrbot，可在子进程中执行
+
+
+# 每种像素格式对应的 NumPy 元素类型: 每个像素作为一个元素整体搬移
+_PIXEL_DTYPES = {"L": np.uint8, "RGB": np.dtype("V3"), "RGBA": np.uint32}
+
+# 损坏、截断或过大的图片在解码和编码时抛出的异常
+_IMAGE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+# 进程内复用的输出缓冲区，避免每次请求重新分配整张图的内存
+_out_buffer: np.ndarray | None = None
+
+
+def _pixel_mode(img: Image.Image) -> str:
+    """选择能无损表示原图的最小像素格式，不透明图片不再强制转为 RGBA"""
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        return "RGBA"
+    if img.mode in ("L", "1"):
+        return "L"
+    return "RGB"
+
+
+def _get_out_buffer(count: int, dtype) -> np.ndarray:
+    global _out_buffer
+    nbytes = count * np.dtype(dtype).itemsize
+    if _out_buffer is None or _out_buffer.nbytes != nbytes:
+        _out_buffer = np.empty(nbytes, dtype=np.uint8)
+    return _out_buffer.view(dtype)
+
+
+def permute_image(
+    image_bytes: bytes,
+    mode: str,
+    tile_pixels: int = 0,
+    stages: dict[str, float] | None = None,
+) -> Image.Image:
+    """
+    解码图片并执行番茄混淆 (encrypt) / 解混淆 (decrypt)，不加水印
+
+    返回的图片与进程内复用的输出缓冲区共享内存，需要在处理下一张图片前用完。
+    像素数超过 tile_pixels (大于 0 时) 的图片改用分块模式处理。
+    提供 stages 时写入解码 (decode) 和置换 (permute) 的耗时。
+    """
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(initial_bytes=image_bytes))
+    img.load()
+    pixel_mode = _pixel_mode(img)
+    width, height = img.size
+    dtype = _PIXEL_DTYPES[pixel_mode]
+    if 0 < tile_pixels < width * height:
+        # 分块模式按条带转换像素格式，不再生成整张图的转换副本
+        decoded = time.perf_counter()
+        if stages is not None:
+            stages["decode"] = decoded - start
+        res_img = permute_tiled(img, pixel_mode, dtype, mode)
+        if stages is not None:
+            stages["permute"] = time.perf_counter() - decoded
+        return res_img
+    if img.mode != pixel_mode:
+        img = img.convert(pixel_mode)
+    decoded = time.perf_counter()
+    if stages is not None:
+        stages["decode"] = decoded - start
+
+    # 每个像素视为一个元素（RGBA 打包为 uint32，RGB 为 3 字节），一次 take 搬完整个像素
+    pixels = np.asarray(img).view(dtype).reshape(-1)
+    del img
+
+    # 获取按 (宽, 高) 缓存的置换索引，同尺寸图片只需一次花式索引
+    index = permutation_cache.get(width, height, mode)
+
+    # -------------------------------------------------
+    # 核心算法逻辑
+    # -------------------------------------------------
+    # 混淆: 路径上的像素序列向右循环移动 offset 后填回原位置
+    # 解混淆: 向左循环移动 offset (还原)
+    # 两者都已预先合并为一个 gather 索引: result = pixels[index]
+    result = _get_out_buffer(pixels.size, dtype)
+    np.take(pixels, index, out=result)
+    if stages is not None:
+        stages["permute"] = time.perf_counter() - decoded
+
+    # 直接引用输出缓冲区构造图片，不再复制
+    return Image.frombuffer(
+        pixel_mode, (width, height), result, "raw", pixel_mode, 0, 1
+    )
+
+
+def transform_image(
+    image_bytes: bytes,
+    mode: str,
+    options: EncodeOptions | None = None,
+    tile_pixels: int = 0,
+) -> bytes:
+    """
+    对图片执行番茄混淆 (encrypt) / 解混淆 (decrypt)，返回编码后的字节
+
+    只接收和返回 bytes，便于在进程池中运行。解混淆的结果会加上随机水印。
+    """
+    res_img = permute_image(image_bytes, mode, tile_pixels)
+    if mode == "decrypt":
+        res_img = add_watermark(res_img, text=secrets.token_hex(10))
+    return encode_image(res_img, mode, options)
+
+
+def watermark_image(clean_bytes: bytes, options: EncodeOptions | None = None) -> bytes:
+    """给未加水印的解混淆结果加上随机水印，保持原图的像素格式"""
+    img = Image.open(io.BytesIO(initial_bytes=clean_bytes))
+    img.load()
+    # 调色板等格式无法直接取色绘制，转为能无损表示它的格式
+    if img.mode not in _PIXEL_DTYPES:
+        img = img.convert(_pixel_mode(img))
+    return encode_image(
+        add_watermark(img, text=secrets.token_hex(10)), "decrypt", options
+    )
+
+
+def transform_images(
+    images: list[bytes],
+    mode: str,
+    options: EncodeOptions | None = None,
+    tile_pixels: int = 0,
+    keep_clean: bool = True,
+) -> list[tuple[bytes, bytes, float, dict[str, float]]]:
+    """
+    在同一个进程中依次处理一组图片，
+    返回 (输出结果, 无水印结果, 耗时秒数, 各阶段耗时) 列表
+
+    调用方把相同尺寸的图片分到同一组，这样置换索引只需在该进程中生成一次。
+    无水印结果用于写入结果缓存，总是无损编码，混淆模式下与输出结果相同；
+    解混淆时 keep_clean 为假（调用方没有结果缓存）则不再额外编码，返回空的无水印结果。
+    各阶段耗时在子进程中测量，由调用方写入运行指标。
+    """
+    results = []
+    for image_bytes in images:
+        start = time.perf_counter()
+        stages: dict[str, float] = {}
+        try:
+            res_img = permute_image(image_bytes, mode, tile_pixels, stages)
+            clean = b""
+            if mode != "decrypt" or keep_clean:
+                encode_start = time.perf_counter()
+                if mode == "decrypt":
+                    # 无水印结果命中缓存后还要解码加水印，必须无损保存
+                    clean = encode_lossless(res_img, options)
+                else:
+                    clean = encode_image(res_img, mode, options)
+                stages["encode"] = time.perf_counter() - encode_start
+            if mode == "decrypt":
+                watermark_start = time.perf_counter()
+                output = encode_image(
+                    add_watermark(res_img, text=secrets.token_hex(10)), mode, options
+                )
+                stages["watermark"] = time.perf_counter() - watermark_start
+            else:
+                output = clean
+        except _IMAGE_ERRORS:
+            # 单张图片损坏时不影响同组的其他图片，由调用方提示失败
+            output = clean = b""
+        results.append((output, clean, time.perf_counter() - start, stages))
+    return results
+
+
+def watermark_images(
+    images: list[bytes], options: EncodeOptions | None = None
+) -> list[tuple[bytes, float]]:
+    """批量给缓存中的解混淆结果加水印，返回 (结果, 耗时秒数) 列表"""
+    results = []
+    for clean_bytes in images:
+        start = time.perf_counter()
+        try:
+            output = watermark_image(clean_bytes, options)
+        except _IMAGE_ERRORS:
+            output = b""
+        results.append((output, time.perf_counter() - start))
+    return results
+
+
+def peek_size(image_bytes: bytes) -> tuple[int, int]:
+    """只解析图片头部获取尺寸，不解码像素，无法识别时返回 (0, 0)"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.size
+    except _IMAGE_ERRORS:
+        return (0, 0)
+
+
+def add_watermark(img, text="kissnab"):
+    """
+    在图片右下角添加与背景色相近的微小水印
+    """
+    draw = ImageDraw.Draw(img)
+    width, height = img.size
+
+    # 1. 设置字体大小 (自适应图片高度，很小)
+    # 大约占图片高度的 1.5% 到 2%，最小 10px
+    font_size = max(10, int(height * 0.01))
+
+    try:
+        # 尝试加载常用字体，如果没有则使用默认字体
+        # Windows/Linux 路径可能不同，这里尝试加载 Arial
+        font = ImageFont.truetype("arial.ttf", font_size)
+    except OSError:
+        font = ImageFont.load_default(size=font_size)
+
+    # 2. 计算文字宽高
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+
+    # 3. 确定位置 (右下角，留出少量边距)
+    margin = 5
+    x = width - text_w - margin
+    y = height - text_h - margin
+
+    # 边界检查，防止图片太小文字出界
+    if x < 0:
+        x = 0
+    if y < 0:
+        y = 0
+
+    # 4. 采样背景颜色以计算"相近色"
+    # 获取文字区域中心点的颜色
+    sample_x = min(width - 1, int(x + text_w / 2))
+    sample_y = min(height - 1, int(y + text_h / 2))
+
+    bg_color = img.getpixel((sample_x, sample_y))
+
+    # 提取 RGB
+    if isinstance(bg_color, int):  # 灰度图
+        r = g = b = bg_color
+        a = 255
+    elif len(bg_color) == 4:  # RGBA
+        r, g, b, a = bg_color
+    else:  # RGB
+        r, g, b = bg_color
+        a = 255
+
+    # 计算亮度 (Luminance)
+    luminance = 0.299 * r + 0.587 * g + 0.114 * b
+
+    # 5. 生成水印颜色
+    # 策略：如果背景亮，文字就稍微暗一点；如果背景暗，文字就稍微亮一点
+    # delta 控制色差大小，值越小越"隐形"
+    delta = 5
+
+    if luminance > 128:
+        # 背景亮 -> 文字微暗
+        new_r = max(0, r - delta)
+        new_g = max(0, g - delta)
+        new_b = max(0, b - delta)
+    else:
+        # 背景暗 -> 文字微亮
+        new_r = min(255, r + delta)
+        new_g = min(255, g + delta)
+        new_b = min(255, b + delta)
+
+    if img.mode == "L":
+        text_color = new_r
+    elif img.mode == "RGB":
+        text_color = (new_r, new_g, new_b)
+    else:
+        text_color = (new_r, new_g, new_b, int(a * 0.9))  # 稍微加点透明度融合更好
+
+    # 6. 绘制文字
+    draw.text((x, y), text, font=font, fill=text_color)
+
+    return img
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from astrbot.api import logger
+
+from .manifest import manifest_path
+
+
+def photo_ids_version(photo_ids: list[str]) -> str:
+    """根据章节 id 列表生成本子的内容版本，新增章节后版本会变化"""
+    joined = ",".join(str(photo_id) for photo_id in photo_ids)
+    return hashlib.blake2b(joined.encode(), digest_size=8).hexdigest()
+
+
+def album_version(album) -> str:
+    return photo_ids_version([photo.photo_id for photo in album])
+
+
+def parts_path(save_path: str, album_id: str) -> str:
+    """本子下载期间章节 PDF 的暂存目录"""
+    return os.path.join(save_path, f".{album_id}_parts")
+
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _delete(path: str | None):
+    if not path:
+        return
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _delete_all(paths: list[str | None]):
+    # 在索引锁之外调用，删除大目录时不会阻塞其他线程和事件循环中的缓存查询
+    for path in dict.fromkeys(paths):
+        _delete(path)
+
+
+class AlbumCache:
+    """
+    本子产物缓存，索引保存在 SQLite 中
+
+    按本子 id 记录 PDF 路径、页数、占用空间、原始图片目录和 Telegraph 链接。
+    命中时完全跳过 jmcomic 客户端；超过 TTL 的条目和超出磁盘配额时最久未访问的条目
+    会连同 PDF 和原始图片目录一起删除。
+    下载不完整时生成的 PDF（或分卷目录）和图片目录同样登记，计入配额并一起清理；
+    内容版本变化后旧版本的 PDF 立即删除，图片目录留给新版本续传。
+    文件只在释放索引锁之后删除，锁内只读写索引。
+    """
+
+    def __init__(self, data_path: str, max_bytes: int, ttl: float):
+        self.data_path = data_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(data_path, "album_cache.db"), check_same_thread=False
+        )
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS albums (
+                    album_id TEXT PRIMARY KEY,
+                    version TEXT NOT NULL DEFAULT '',
+                    pdf_path TEXT,
+                    page_count INTEGER NOT NULL DEFAULT 0,
+                    folders TEXT NOT NULL DEFAULT '[]',
+                    urls TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(albums)")]
+            if "partial_path" not in columns:
+                self._db.execute("ALTER TABLE albums ADD COLUMN partial_path TEXT")
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _touch(self, album_id: str):
+        with self._db:
+            self._db.execute(
+                "UPDATE albums SET last_access = ? WHERE album_id = ?",
+                (time.time(), album_id),
+            )
+
+    def get_pdf(self, album_id: str) -> tuple[str, int] | None:
+        """返回缓存的 (PDF 路径, 页数)，未命中返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pdf_path, page_count, created_at FROM albums WHERE album_id = ?",
+                (album_id,),
+            ).fetchone()
+            if not row or not row[0] or self._expired(row[2]):
+                return None
+            if not os.path.exists(row[0]):
+                return None
+            self._touch(album_id)
+            return row[0], row[1]
+
+    def get_urls(self, album_id: str) -> list[str] | None:
+        """返回缓存的 Telegraph 链接列表，未命中返回 None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT urls, created_at FROM albums WHERE album_id = ?",
+                (album_id,),
+            ).fetchone()
+            if not row or not row[0] or self._expired(row[1]):
+                return None
+            self._touch(album_id)
+            return json.loads(row[0])
+
+    def _upsert(self, album_id: str, version: str, **fields) -> list[str]:
+        """写入条目，返回需要在锁外删除的旧产物"""
+        stale = []
+        now = time.time()
+        row = self._db.execute(
+            "SELECT version, created_at, pdf_path, partial_path, folders, size "
+            "FROM albums WHERE album_id = ?",
+            (album_id,),
+        ).fetchone()
+        with self._db:
+            if row is None or row[0] != version or self._expired(row[1]):
+                # 新条目、内容版本变化或已过期时重建整行，旧的链接/PDF 不再可信，
+                # 旧版本的 PDF 直接删除；图片目录仍可供新版本续传，继续计入缓存
+                folders, size = "[]", 0
+                if row is not None:
+                    folders = row[4]
+                    size = row[5]
+                    for path in (row[2], row[3]):
+                        if path and path not in fields.values():
+                            size -= _path_size(path)
+                            stale.append(path)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO albums "
+                    "(album_id, version, folders, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (album_id, version, folders, max(size, 0), now, now),
+                )
+            sets = ", ".join(f"{k} = ?" for k in fields)
+            self._db.execute(
+                f"UPDATE albums SET {sets}, last_access = ? WHERE album_id = ?",
+                (*fields.values(), now, album_id),
+            )
+        return stale
+
+    def _superseded(self, album_id: str, keep: str) -> list[str]:
+        row = self._db.execute(
+            "SELECT pdf_path, partial_path FROM albums WHERE album_id = ?",
+            (album_id,),
+        ).fetchone()
+        return [path for path in row or () if path and path != keep]
+
+    def put_pdf(
+        self,
+        album_id: str,
+        version: str,
+        pdf_path: str,
+        page_count: int,
+        folders: list[str],
+    ):
+        size = _path_size(pdf_path) + sum(_path_size(f) for f in folders)
+        with self._lock:
+            # 换了输出形式（整本/分卷）后的旧产物和之前的不完整 PDF 不再被索引，直接删除
+            stale = self._superseded(album_id, pdf_path)
+            stale += self._upsert(
+                album_id,
+                version,
+                pdf_path=pdf_path,
+                partial_path=None,
+                page_count=page_count,
+                folders=json.dumps(folders, ensure_ascii=False),
+                size=size,
+            )
+        _delete_all(stale)
+        self.evict(keep=album_id)
+
+    def put_partial(
+        self,
+        album_id: str,
+        version: str,
+        partial_path: str | None,
+        folders: list[str],
+    ):
+        """
+        登记下载不完整时生成的 PDF（或分卷目录）和已下载的图片目录
+
+        不完整的产物不会被 get_pdf 命中，只为计入配额并随条目一起清理；
+        补齐后由 put_pdf 删除。不生成不完整 PDF 时 partial_path 为 None。
+        """
+        size = sum(_path_size(f) for f in [partial_path, *folders] if f)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT partial_path FROM albums WHERE album_id = ?", (album_id,)
+            ).fetchone()
+            stale = [row[0]] if row and row[0] and row[0] != partial_path else []
+            stale += self._upsert(
+                album_id,
+                version,
+                partial_path=partial_path,
+                folders=json.dumps(folders, ensure_ascii=False),
+                size=size,
+            )
+        _delete_all(stale)
+        self.evict(keep=album_id)
+
+    def put_urls(self, album_id: str, version: str, urls: list[str]):
+        with self._lock:
+            stale = self._upsert(
+                album_id, version, urls=json.dumps(urls, ensure_ascii=False)
+            )
+        _delete_all(stale)
+
+    def _remove(
+        self,
+        album_id: str,
+        pdf_path: str | None,
+        partial_path: str | None,
+        folders: str,
+    ) -> list[str | None]:
+        """删除索引条目，返回需要在锁外删除的文件和目录"""
+        with self._db:
+            self._db.execute("DELETE FROM albums WHERE album_id = ?", (album_id,))
+        # 图片目录删除后下载清单也随之失效；中断的下载可能遗留章节 PDF 暂存目录
+        manifest = manifest_path(self.data_path, album_id)
+        parts = parts_path(self.data_path, album_id)
+        return [pdf_path, partial_path, manifest, parts, *json.loads(folders)]
+
+    def evict(self, keep: str | None = None):
+        """删除过期条目，并按最久未访问顺序删除条目直到总占用不超过配额"""
+        stale = []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT album_id, pdf_path, partial_path, folders, size, created_at "
+                "FROM albums ORDER BY last_access ASC"
+            ).fetchall()
+            total = sum(row[4] for row in rows)
+            for album_id, pdf_path, partial_path, folders, size, created_at in rows:
+                if album_id == keep:
+                    continue
+                if self._expired(created_at) or (
+                    self.max_bytes > 0 and total > self.max_bytes
+                ):
+                    logger.info(f"[album_cache] 清理本子缓存 {album_id}")
+                    stale += self._remove(album_id, pdf_path, partial_path, folders)
+                    total -= size
+        _delete_all(stale)
+
+    def clean_parts(self):
+        """删除中断的下载遗留的章节 PDF 暂存目录，只能在没有下载进行时调用（例如启动时）"""
+        try:
+            names = os.listdir(self.data_path)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(".") and name.endswith("_parts"):
+                shutil.rmtree(os.path.join(self.data_path, name), ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+from astrbot.api import logger
+
+from ..metrics.registry import metrics
+
+# 还没有延迟数据的域名按这个延迟（秒）排序
+DEFAULT_LATENCY = 1.0
+
+
+class _DomainState:
+    __slots__ = ("error_rate", "inflight", "last_decrease", "latency", "limit")
+
+    def __init__(self, limit: float):
+        self.latency: float | None = None
+        self.error_rate = 0.0
+        self.limit = limit
+        self.inflight = 0
+        self.last_decrease = 0.0
+
+    def score(self) -> float:
+        latency = DEFAULT_LATENCY if self.latency is None else self.latency
+        return latency * (1 + 4 * self.error_rate)
+
+
+class DomainController:
+    """
+    jmcomic 请求的自适应并发和域名切换
+
+    每个域名单独维护并发上限（AIMD）：上限被占满时每个成功请求增加 1/上限，
+    即大约每轮增加 1；请求失败时上限减半，同一个延迟周期内只减一次，
+    避免一批并发请求同时失败把上限压到最低。
+    同时记录每个域名延迟和错误率的指数移动平均，API 请求按得分在配置的域名间
+    排序，图片请求在 jmcomic 的图片镜像之间排序，失败时切换到下一个域名。
+    统计数据保存在 JSON 文件中，重启后优先使用上次表现最好的域名。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        min_limit: int = 2,
+        max_limit: int = 32,
+        initial_limit: int = 8,
+        alpha: float = 0.2,
+    ):
+        self.path = path
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.initial_limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self.alpha = alpha
+        self._domains: dict[str, _DomainState] = {}
+        self._cond = threading.Condition()
+        self._dirty = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            for domain, item in saved.items():
+                state = self._state(domain)
+                state.latency = item.get("latency")
+                state.error_rate = float(item.get("error_rate", 0))
+                state.limit = min(
+                    max(float(item.get("limit", state.limit)), self.min_limit),
+                    self.max_limit,
+                )
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+
+    def _state(self, domain: str) -> _DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = _DomainState(self.initial_limit)
+        return state
+
+    # ---- 并发控制 ----
+
+    @contextmanager
+    def slot(self, domains: list[str]):
+        """
+        在 domains 中占用一个并发名额，返回实际使用的域名（在工作线程中调用）
+
+        优先使用排在前面的域名；它的名额用完时，得分不超过它两倍的后续域名也可以分担请求，
+        都没有空闲名额时阻塞等待。
+        """
+        with self._cond:
+            while True:
+                domain = self._pick(domains)
+                if domain is not None:
+                    break
+                self._cond.wait()
+            state = self._state(domain)
+            state.inflight += 1
+        try:
+            yield domain
+        finally:
+            with self._cond:
+                state.inflight -= 1
+                self._cond.notify_all()
+
+    def _pick(self, domains: list[str]) -> str | None:
+        best = self._state(domains[0]).score()
+        for domain in domains:
+            state = self._state(domain)
+            if state.score() > 2 * best:
+                break
+            if state.inflight < int(state.limit):
+                return domain
+        return None
+
+    def success(self, domain: str, latency: float):
+        with self._cond:
+            state = self._state(domain)
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += self.alpha * (latency - state.latency)
+            state.error_rate *= 1 - self.alpha
+            # 只有上限真正成为瓶颈时才增长，空闲时不会无限变大
+            if state.inflight >= int(state.limit):
+                state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+                self._cond.notify_all()
+            self._dirty = True
+        metrics.inc("jm_domain_requests", domain=domain, result="ok")
+
+    def failure(self, domain: str):
+        now = time.monotonic()
+        with self._cond:
+            state = self._state(domain)
+            state.error_rate += self.alpha * (1 - state.error_rate)
+            if now - state.last_decrease >= max(state.latency or 0, DEFAULT_LATENCY):
+                state.limit = max(self.min_limit, state.limit / 2)
+                state.last_decrease = now
+            self._dirty = True
+        metrics.inc("jm_domain_requests", domain=domain, result="error")
+
+    # ---- 域名选择 ----
+
+    def ranked(self, domains: list[str]) -> list[str]:
+        """按得分从好到差排序，得分相同时保持原有顺序"""
+        with self._cond:
+            return sorted(domains, key=lambda d: self._state(d).score())
+
+    def image_mirrors(self, host: str) -> list[str]:
+        """图片域名及其可替换的镜像，不在 jmcomic 镜像列表中的域名不做替换"""
+        # 本模块只有这里用到 jmcomic，推迟到第一次调用时导入
+        from jmcomic import JmModuleConfig
+
+        mirrors = list(JmModuleConfig.DOMAIN_IMAGE_LIST)
+        if host not in mirrors:
+            return [host]
+        return self.ranked(mirrors)
+
+    def image_url(self, url: str) -> str:
+        """把图片链接换成当前最好的镜像域名"""
+        parts = urlsplit(url)
+        best = self.image_mirrors(parts.netloc)[0]
+        return urlunsplit(parts._replace(netloc=best))
+
+    # ---- jmcomic 接入 ----
+
+    def attach(self, option):
+        """
+        让 option 创建的客户端使用本控制器
+
+        图片线程数只作为上限，实际并发由各域名的名额决定。
+        会创建并缓存 option 的客户端，可能访问网络，应在工作线程中调用。
+        """
+        option.download.threading.image = self.max_limit
+        return option.build_jm_client(domain_retry_strategy=self.install)
+
+    def new_client(self, option):
+        return option.new_jm_client(domain_retry_strategy=self.install)
+
+    def install(self, client):
+        """
+        传给 jmcomic 的 domain_retry_strategy
+
+        jmcomic 创建客户端时以 strategy(client) 调用一次作为初始化钩子，之后每个请求
+        以 strategy(client, request, url, is_image, **kwargs) 调用；这里在初始化时
+        把客户端的策略换成 retry_strategy，之后的请求直接由它处理。
+        """
+        client.domain_retry_strategy = self.retry_strategy
+
+    def retry_strategy(self, client, request, url: str, is_image: bool, **kwargs):
+        """
+        替代 jmcomic 默认的重试逻辑（client.domain_retry_strategy）
+
+        按得分顺序轮流尝试各个域名，最多尝试 max(重试次数 + 1, 域名数) 次。
+        """
+        if url.startswith("/"):
+            domains = self.ranked(client.get_domain_list())
+            parts = None
+        else:
+            parts = urlsplit(url)
+            domains = self.image_mirrors(parts.netloc) if is_image else [parts.netloc]
+        attempts = max(client.retry_times + 1, len(domains))
+        for attempt in range(attempts):
+            # 每次重试把已经失败过的域名轮换到后面
+            shift = attempt % len(domains)
+            with self.slot(domains[shift:] + domains[:shift]) as domain:
+                request_kwargs = dict(kwargs)
+                if parts is None:
+                    target = client.of_api_url(url, domain)
+                    client.update_request_with_specify_domain(
+                        request_kwargs, domain, is_image
+                    )
+                else:
+                    target = urlunsplit(parts._replace(netloc=domain))
+                    if is_image:
+                        client.update_request_with_specify_domain(
+                            request_kwargs, None, is_image
+                        )
+                start = time.perf_counter()
+                try:
+                    resp = request(target, **request_kwargs)
+                    resp = client.raise_if_resp_should_retry(resp, is_image)
+                # 与 jmcomic 默认的重试逻辑一致，任何请求异常都换下一个域名重试
+                except Exception as e:  # noqa: BLE001
+                    self.failure(domain)
+                    client.before_retry(e, request_kwargs, attempt, target)
+                    continue
+                self.success(domain, time.perf_counter() - start)
+            if attempt:
+                metrics.inc("retries", source="jm_domain_failover")
+            return resp
+        return client.fallback(request, url, len(domains), attempts, is_image, **kwargs)
+
+    # ---- 持久化和状态 ----
+
+    def save(self):
+        with self._cond:
+            if not self._dirty:
+                return
+            data = {
+                domain: {
+                    "latency": state.latency,
+                    "error_rate": state.error_rate,
+                    "limit": state.limit,
+                }
+                for domain, state in self._domains.items()
+            }
+            self._dirty = False
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[domains] 保存域名统计失败: {e}")
+
+    def status(self) -> list[str]:
+        """各域名的统计，用于 /jm stats"""
+        with self._cond:
+            items = sorted(self._domains.items(), key=lambda item: item[1].score())
+            return [
+                f"{domain}: 延迟 "
+                + ("-" if state.latency is None else f"{state.latency * 1000:.0f}ms")
+                + f"，错误率 {state.error_rate:.0%}，并发 {state.inflight}/{int(state.limit)}"
+                for domain, state in items
+            ]
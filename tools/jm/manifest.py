@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+
+from astrbot.api import logger
+
+
+def manifest_path(data_path: str, album_id: str) -> str:
+    return os.path.join(data_path, ".manifests", f"{album_id}.json")
+
+
+def file_digest(path: str) -> tuple[int, str]:
+    """返回文件的 (大小, BLAKE2 摘要)"""
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+            size += len(chunk)
+    return size, h.hexdigest()
+
+
+def data_digest(data: bytes) -> tuple[int, str]:
+    """返回内存数据的 (大小, BLAKE2 摘要)，与 file_digest 对同样内容的结果相同"""
+    return len(data), hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _decodes(path: str) -> bool:
+    """完整解码一次图片，截断或损坏的文件会解码失败"""
+    # 只在校验没有记录的旧图片时用到 PIL，插件加载时不导入
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            img.load()
+        return True
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        return False
+
+
+class DownloadManifest:
+    """
+    单个本子的下载清单，保存为 JSON
+
+    记录每个章节应有的图片文件名，以及已下载图片的大小和摘要。
+    重新下载时已有且校验通过的图片直接复用，缺失或校验失败的图片才重新下载；
+    只有清单中所有章节的所有图片都校验通过时，本子才算下载完整。
+    下载线程会并发调用，内部用锁保护。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # photo_id -> {"index", "expected": [文件名], "images": {文件名: [大小, 摘要]}}
+        self.photos: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.photos = json.load(f)["photos"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def expect(self, photo_id: str, index: int, filenames: list[str]):
+        """记录章节应有的图片列表，在开始下载章节前调用"""
+        with self._lock:
+            photo = self.photos.setdefault(str(photo_id), {"images": {}})
+            photo["index"] = index
+            photo["expected"] = filenames
+            # 章节内容变化后，不在新列表中的旧记录没有意义
+            wanted = set(filenames)
+            photo["images"] = {
+                name: entry for name, entry in photo["images"].items() if name in wanted
+            }
+
+    def verify(self, photo_id: str, path: str) -> bool:
+        """
+        校验已存在的图片
+
+        有记录时比较大小和摘要；没有记录（例如启用清单之前下载的图片）时
+        完整解码一次，能解码的图片补记到清单中。
+        """
+        name = os.path.basename(path)
+        with self._lock:
+            entry = self.photos.get(str(photo_id), {}).get("images", {}).get(name)
+        try:
+            if entry is not None:
+                if os.path.getsize(path) != entry[0]:
+                    return False
+                return list(file_digest(path)) == list(entry)
+            if not _decodes(path):
+                return False
+            self.record(photo_id, path)
+            return True
+        except OSError:
+            return False
+
+    def record(self, photo_id: str, path: str):
+        """记录一张下载完成的图片"""
+        self.record_digest(photo_id, path, file_digest(path))
+
+    def record_digest(self, photo_id: str, path: str, digest: tuple[int, str]):
+        """用已经算好的 (大小, 摘要) 记录图片，图片不落盘时使用"""
+        with self._lock:
+            photo = self.photos.setdefault(str(photo_id), {"images": {}})
+            photo["images"][os.path.basename(path)] = list(digest)
+
+    def discard(self, photo_id: str, path: str):
+        """删除一张图片的记录，图片丢失或校验失败后调用"""
+        with self._lock:
+            photo = self.photos.get(str(photo_id), {})
+            photo.get("images", {}).pop(os.path.basename(path), None)
+
+    def image_paths(self, photo_id: str, folder: str) -> list[str]:
+        """章节中已校验的图片路径，按应有的顺序排列"""
+        with self._lock:
+            photo = self.photos.get(str(photo_id), {})
+            expected = photo.get("expected") or sorted(photo.get("images", {}))
+            recorded = set(photo.get("images", {}))
+        return [os.path.join(folder, name) for name in expected if name in recorded]
+
+    def missing(self) -> int:
+        """已知章节中缺少的图片数"""
+        with self._lock:
+            return sum(
+                len(set(photo.get("expected", ())) - set(photo["images"]))
+                for photo in self.photos.values()
+            )
+
+    def is_complete(self, photo_ids: list[str]) -> bool:
+        """photo_ids 中的每个章节都已记录图片列表，且所有图片都已校验"""
+        with self._lock:
+            for photo_id in photo_ids:
+                photo = self.photos.get(str(photo_id))
+                if photo is None or "expected" not in photo:
+                    return False
+                if set(photo["expected"]) - set(photo["images"]):
+                    return False
+        return True
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"photos": self.photos}, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # 多个章节线程可能同时保存，临时文件按线程区分
+            tmp = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[manifest] 保存下载清单失败: {e}")
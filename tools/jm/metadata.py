@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import time
+from collections.abc import AsyncIterator, Callable
+
+from astrbot.api import logger
+
+from ..metrics.registry import metrics
+
+
+class JmMetadata:
+    """
+    jmcomic 本子/章节详情的异步获取层
+
+    同步的客户端调用放到工作线程中执行，章节详情的并发数受信号量限制；
+    结果以普通 dict 形式同时缓存在内存和磁盘中，TTL 内重复请求不会访问上游；
+    磁盘缓存的读写同样放到工作线程中，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        client_factory: Callable,
+        ttl: float = 6 * 3600,
+        concurrency: int = 8,
+    ):
+        self.cache_dir = cache_dir
+        self.client_factory = client_factory
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._memory: dict[str, tuple[float, dict]] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    async def _get_client(self):
+        # 只有缓存未命中时才获取客户端；每次都向 client_factory 获取，配置重新加载后随之更换
+        return await asyncio.to_thread(self.client_factory)
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key: str) -> dict | None:
+        try:
+            with open(self._cache_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, saved: dict):
+        tmp = self._cache_path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(saved, f, ensure_ascii=False)
+        os.replace(tmp, self._cache_path(key))
+
+    async def _load(self, key: str) -> dict | None:
+        now = time.time()
+        item = self._memory.get(key)
+        if item and now - item[0] <= self.ttl:
+            return item[1]
+        saved = await asyncio.to_thread(self._read, key)
+        if saved is None or now - saved["time"] > self.ttl:
+            return None
+        self._memory[key] = (saved["time"], saved["data"])
+        return saved["data"]
+
+    async def _store(self, key: str, data: dict):
+        now = time.time()
+        self._memory[key] = (now, data)
+        await asyncio.to_thread(self._write, key, {"time": now, "data": data})
+
+    def prune(self):
+        """删除磁盘上已过期的缓存文件"""
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    async def album(self, album_id: str) -> dict:
+        """返回 {"id", "name", "photo_ids"}"""
+        key = f"album_{album_id}"
+        if (data := await self._load(key)) is not None:
+            metrics.inc("cache_requests", cache="jm_metadata", result="hit")
+            return data
+        metrics.inc("cache_requests", cache="jm_metadata", result="miss")
+        client = await self._get_client()
+        with metrics.timer("jm_metadata_album"):
+            album = await asyncio.to_thread(client.get_album_detail, album_id)
+        data = {
+            "id": str(album.id),
+            "name": album.name,
+            "photo_ids": [str(photo.photo_id) for photo in album],
+        }
+        await self._store(key, data)
+        return data
+
+    async def photo(self, photo_id: str) -> dict:
+        """返回 {"id", "name", "image_urls"}"""
+        key = f"photo_{photo_id}"
+        if (data := await self._load(key)) is not None:
+            metrics.inc("cache_requests", cache="jm_metadata", result="hit")
+            return data
+        metrics.inc("cache_requests", cache="jm_metadata", result="miss")
+        client = await self._get_client()
+        async with self._semaphore:
+            # 章节实体类
+            with metrics.timer("jm_metadata_photo"):
+                photo = await asyncio.to_thread(
+                    client.get_photo_detail, photo_id, False
+                )
+        logger.info(f"章节id: {photo.photo_id}")
+        data = {
+            "id": str(photo.photo_id),
+            "name": photo.name,
+            # 图片实体类
+            "image_urls": [image.img_url for image in photo],
+        }
+        await self._store(key, data)
+        return data
+
+    async def photos(self, album: dict) -> AsyncIterator[dict]:
+        """并发获取所有章节详情，按完成顺序逐个返回"""
+        tasks = [asyncio.create_task(self.photo(pid)) for pid in album["photo_ids"]]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
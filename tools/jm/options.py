@@ -0,0 +1,99 @@
+import copy
+import os
+import threading
+
+from astrbot.api import logger
+
+from ..metrics.registry import metrics
+from .domains import DomainController
+
+
+class JmOptionService:
+    """
+    op.yml 的共享配置
+
+    配置文件只解析一次，JmOption 和由它创建的 jmcomic 客户端在请求之间共享。
+    每次获取时比较文件的修改时间和大小，变化后重新加载，cookies、代理、线程数等
+    不必重启即可生效；重新加载失败时继续使用旧配置，直到文件再次变化。
+    共享的 option 不应被修改，需要改动的请求用 request_option 取得独立副本。
+    提供 domains 时客户端使用它的自适应并发和域名切换。
+    """
+
+    def __init__(self, path: str, domains: DomainController | None = None):
+        self.path = path
+        self.domains = domains
+        self.generation = 0
+        self._stamp: tuple[int, int] | None = None
+        self._option = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self._option is None:
+                raise
+            # 文件暂时不可读（例如正在被编辑器替换）时继续使用旧配置
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        # 插件加载时不导入 jmcomic，第一次使用配置时才导入
+        from jmcomic import create_option_by_file
+
+        try:
+            option = create_option_by_file(self.path)
+        except Exception as e:
+            if self._option is None:
+                raise
+            logger.warning(f"[jm] 重新加载 op.yml 失败，继续使用旧配置: {e}")
+            return
+        if self.domains is not None:
+            # 图片线程数只作为上限，实际并发由各域名的名额决定
+            option.download.threading.image = self.domains.max_limit
+        self._option = option
+        # 旧客户端由正在进行的请求继续使用，新请求换用新配置创建的客户端
+        self._client = None
+        self.generation += 1
+        if self.generation > 1:
+            logger.info("[jm] op.yml 已重新加载")
+            metrics.inc("jm_option_reloads")
+
+    def _current(self):
+        with self._lock:
+            self._reload_if_changed()
+            if self._client is None:
+                if self.domains is not None:
+                    self._client = self.domains.new_client(self._option)
+                else:
+                    self._client = self._option.new_jm_client()
+            return self._option, self._client
+
+    def client(self):
+        """
+        当前配置的共享客户端
+
+        首次使用时创建，可能访问网络，应在工作线程中调用。
+        """
+        return self._current()[1]
+
+    def request_option(self, base_dir: str | None = None):
+        """
+        供单个请求使用的配置副本
+
+        下载、客户端和插件配置都是深拷贝，修改副本不会影响共享配置；
+        副本的 build_jm_client 直接返回共享客户端，不再为每个请求创建会话。
+        """
+        from jmcomic import AdvancedDict
+
+        option, client = self._current()
+        copied = option.copy_option()
+        copied.download = AdvancedDict(copy.deepcopy(option.download.src_dict))
+        copied.client = AdvancedDict(copy.deepcopy(option.client.src_dict))
+        copied.plugins = AdvancedDict(copy.deepcopy(option.plugins.src_dict))
+        if base_dir is not None:
+            copied.dir_rule.base_dir = base_dir
+        copied.build_jm_client = lambda **kwargs: client
+        return copied
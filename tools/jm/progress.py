@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from astrbot.api import logger
+
+# 还没有历史数据时使用的默认速度（秒/页）
+DEFAULT_SECONDS_PER_PAGE = {"convert": 0.5, "merge": 0.01}
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f}秒"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}分{seconds}秒"
+
+
+def _format_rate(bytes_per_second: float) -> str:
+    if bytes_per_second >= 1024 * 1024:
+        return f"{bytes_per_second / 1024 / 1024:.1f}MB/s"
+    return f"{bytes_per_second / 1024:.0f}KB/s"
+
+
+class ThroughputModel:
+    """
+    本机 PDF 处理速度的滚动模型
+
+    每种操作（convert / merge）保留最近 window 次的 (页数, 秒数) 样本，
+    以样本总耗时 / 总页数作为每页耗时，结果保存在 JSON 文件中，重启后继续使用。
+    """
+
+    def __init__(self, path: str, window: int = 20):
+        self.path = path
+        self.window = window
+        self._samples: dict[str, deque[tuple[int, float]]] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            for kind, samples in saved.items():
+                self._samples[kind] = deque(
+                    ((int(p), float(s)) for p, s in samples), maxlen=window
+                )
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def seconds_per_page(self, kind: str) -> float:
+        with self._lock:
+            samples = list(self._samples.get(kind, ()))
+        pages = sum(p for p, _ in samples)
+        if not pages:
+            return DEFAULT_SECONDS_PER_PAGE.get(kind, 0.5)
+        return sum(s for _, s in samples) / pages
+
+    def estimate(self, kind: str, pages: int) -> float:
+        return pages * self.seconds_per_page(kind)
+
+    def observe(self, kind: str, pages: int, seconds: float):
+        """记录一次实际耗时，在工作线程中调用"""
+        if pages <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self.window)).append(
+                (pages, seconds)
+            )
+            data = {kind: list(samples) for kind, samples in self._samples.items()}
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[progress] 保存速度模型失败: {e}")
+
+
+class DownloadProgress:
+    """
+    一次本子下载的进度
+
+    下载线程和转换线程通过 image_done / convert_finished 等方法更新计数，
+    进度消息用 run_coroutine_threadsafe 投递到事件循环中发送，
+    两次消息至少间隔 interval 秒，上一条还没发完时不会再投递。
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        send: Callable[[str], Awaitable[None]] | None,
+        model: ThroughputModel,
+        interval: float = 15,
+    ):
+        self.loop = loop
+        self.send = send
+        self.model = model
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self.total_images = 0
+        self.total_chapters = 0
+        self.images = 0
+        self.bytes = 0
+        self.chapters = 0
+        self.pages_submitted = 0
+        self.pages_converted = 0
+        self.downloading = True
+        self._converting = 0
+        self._busy_since = 0.0
+        self._busy_pages = 0
+        self._last_sent = time.monotonic()
+        self._inflight = False
+        self._lock = threading.Lock()
+
+    # ---- 下载线程中调用 ----
+
+    def album_started(self, chapters: int, pages: int):
+        with self._lock:
+            self.total_chapters = chapters
+            self.total_images = pages
+
+    def image_done(self, size: int):
+        with self._lock:
+            self.images += 1
+            self.bytes += size
+        self._maybe_post()
+
+    def chapter_done(self, pages: int):
+        with self._lock:
+            self.chapters += 1
+            self.pages_submitted += pages
+
+    def download_finished(self):
+        """下载结束，之后的进度消息只报告 PDF 转换情况"""
+        with self._lock:
+            self.downloading = False
+
+    # ---- 转换线程中调用 ----
+
+    def convert_started(self):
+        with self._lock:
+            if self._converting == 0:
+                self._busy_since = time.perf_counter()
+                self._busy_pages = 0
+            self._converting += 1
+
+    def convert_finished(self, pages: int):
+        """
+        章节转换完成
+
+        转换线程可能有多个同时运行，这里统计的是至少有一个转换在进行的时间段内
+        的总页数和总时长，得到的是本机整体的转换速度而不是单个章节的速度。
+        """
+        busy = None
+        with self._lock:
+            self.pages_converted += pages
+            self._busy_pages += pages
+            self._converting -= 1
+            if self._converting == 0:
+                busy = (self._busy_pages, time.perf_counter() - self._busy_since)
+        if busy is not None:
+            self.model.observe("convert", *busy)
+        self._maybe_post()
+
+    def pages_written(self, pages: int):
+        """直出模式下章节 PDF 写完，页面在下载时已经编码，不计入转换速度"""
+        with self._lock:
+            self.pages_converted += pages
+        self._maybe_post()
+
+    # ---- 进度消息 ----
+
+    def remaining_seconds(self) -> float:
+        with self._lock:
+            remaining = max(0, self.pages_submitted - self.pages_converted)
+            total = max(self.pages_submitted, self.images)
+        return self.model.estimate("convert", remaining) + self.model.estimate(
+            "merge", total
+        )
+
+    def render(self) -> str:
+        if not self.downloading:
+            return (
+                f"PDF制作中: 已转换 {self.pages_converted}/{self.pages_submitted} 页，"
+                f"预计还需 {format_duration(self.remaining_seconds())}"
+            )
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self.started_at)
+            images, total = self.images, self.total_images
+            chapters, total_chapters = self.chapters, self.total_chapters
+            rate = self.bytes / elapsed
+            converted = self.pages_converted
+        total_str = f"/{total}" if total else ""
+        return (
+            f"下载中: 章节 {chapters}/{total_chapters}，图片 {images}{total_str} 张"
+            f"（{_format_rate(rate)}），已转换 {converted} 页"
+        )
+
+    def _maybe_post(self):
+        if self.send is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._inflight or now - self._last_sent < self.interval:
+                return
+            if not self.downloading and self.pages_converted >= self.pages_submitted:
+                # 全部转换完成后由调用方发送结果，不再推送进度
+                return
+            self._inflight = True
+            self._last_sent = now
+        asyncio.run_coroutine_threadsafe(self._post(self.render()), self.loop)
+
+    async def _post(self, text: str):
+        try:
+            await self.send(text)
+        # 进度推送失败不应中断下载，各平台的发送异常没有共同的基类
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"[progress] 发送进度失败: {e}")
+        finally:
+            self._inflight = False
+
+    async def announce(self, text: str):
+        """在事件循环中立即发送一条消息（不受间隔限制）"""
+        if self.send is None:
+            return
+        self._last_sent = time.monotonic()
+        try:
+            await self.send(text)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"[progress] 发送进度失败: {e}")
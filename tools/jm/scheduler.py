@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import Awaitable, Callable
+
+from astrbot.api import logger
+
+
+class QuotaExceededError(Exception):
+    """用户或群的排队任务数已达上限"""
+
+
+class _Ticket:
+    def __init__(self, user_id: str, group_id: str, label: str):
+        self.user_id = user_id
+        self.group_id = group_id
+        self.label = label
+        self.created_at = time.time()
+        self.granted: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _Reservation:
+    """已占用的配额，请求结束时 release（可重复调用）；也可以作为上下文管理器使用"""
+
+    def __init__(self, scheduler: "JobScheduler", keys: tuple):
+        self._scheduler = scheduler
+        self._keys = keys
+
+    def release(self):
+        if self._keys:
+            self._scheduler._reserved.subtract(self._keys)
+            self._keys = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class JobScheduler:
+    """
+    /jm 任务调度器
+
+    全局同时运行的任务数不超过 max_running，每个用户、每个群处理中的请求数
+    分别受 per_user / per_group 限制（由 reserve 占用，合并到同一任务的请求各自计数）；
+    有空位时在各个群之间轮流放行，避免一个群的大量请求占满所有下载线程。
+    """
+
+    def __init__(self, max_running: int = 2, per_user: int = 2, per_group: int = 4):
+        self.max_running = max(1, max_running)
+        self.per_user = per_user
+        self.per_group = per_group
+        # 每个群一个先进先出队列，OrderedDict 的顺序即轮转顺序
+        self._queues: OrderedDict[str, deque[_Ticket]] = OrderedDict()
+        self._running: list[_Ticket] = []
+        # 各用户、各群已占用的配额，键为 ("user", 用户) / ("group", 群)
+        self._reserved: Counter[tuple[str, str]] = Counter()
+
+    def _queue_order(self) -> list[_Ticket]:
+        """按轮转规则模拟出的放行顺序"""
+        queues = [list(q) for q in self._queues.values()]
+        order = []
+        while any(queues):
+            for q in queues:
+                if q:
+                    order.append(q.pop(0))
+        return order
+
+    def _dispatch(self):
+        while len(self._running) < self.max_running and self._queues:
+            group_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            # 放行后把该群移到轮转末尾
+            del self._queues[group_id]
+            if queue:
+                self._queues[group_id] = queue
+            if ticket.granted.done():
+                continue
+            self._running.append(ticket)
+            ticket.granted.set_result(None)
+
+    def _discard(self, ticket: _Ticket):
+        queue = self._queues.get(ticket.group_id)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.group_id]
+        if ticket in self._running:
+            self._running.remove(ticket)
+        self._dispatch()
+
+    def reserve(self, user_id: str, group_id: str) -> _Reservation:
+        """
+        检查并占用用户和群的配额，超出上限时抛出 QuotaExceededError
+
+        检查和占用之间没有挂起点，同一用户同时发出的多个请求不会都通过检查。
+        应由每个请求者在加入合并任务之前调用，超额的错误只发给超额的人，
+        不会经由共享的任务传给其他等待者；请求结束时调用返回值的 release。
+        """
+        user_key, group_key = ("user", user_id), ("group", group_id)
+        if self.per_user > 0 and self._reserved[user_key] >= self.per_user:
+            raise QuotaExceededError(
+                f"你已有 {self.per_user} 个任务在处理中，请稍后再试"
+            )
+        if self.per_group > 0 and self._reserved[group_key] >= self.per_group:
+            raise QuotaExceededError(
+                f"当前会话已有 {self.per_group} 个任务在处理中，请稍后再试"
+            )
+        keys = (user_key, group_key)
+        self._reserved.update(keys)
+        return _Reservation(self, keys)
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        user_id: str,
+        group_id: str,
+        label: str,
+        on_queued: Callable[[int], Awaitable[None]] | None = None,
+    ):
+        """
+        获取一个运行名额，退出上下文时释放
+
+        不检查配额，配额由 reserve 在此之前占用。
+        需要排队时调用 on_queued(排队位置)，通知失败只记录日志，任务照常排队；
+        等待期间被取消会直接移出队列。
+        """
+        ticket = _Ticket(user_id, group_id, label)
+        self._queues.setdefault(group_id, deque()).append(ticket)
+        self._dispatch()
+        try:
+            if not ticket.granted.done() and on_queued is not None:
+                try:
+                    await on_queued(self._queue_order().index(ticket) + 1)
+                # 各平台适配器的发送异常没有共同的基类，通知失败不能影响共享的任务
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"[scheduler] 排队通知发送失败: {e}")
+            await ticket.granted
+            yield
+        finally:
+            self._discard(ticket)
+
+    def status(self, user_id: str) -> list[str]:
+        """返回该用户所有任务的状态描述"""
+        lines = [
+            f"{t.label}: 运行中 ({time.time() - t.created_at:.0f}秒)"
+            for t in self._running
+            if t.user_id == user_id
+        ]
+        for pos, t in enumerate(self._queue_order(), start=1):
+            if t.user_id == user_id:
+                lines.append(f"{t.label}: 排队第{pos}位")
+        return lines
+
+    def summary(self) -> str:
+        queued = sum(len(q) for q in self._queues.values())
+        return f"运行中 {len(self._running)}/{self.max_running}，排队 {queued}"
@@ -0,0 +1,91 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from astrbot.api import logger
+
+ProgressCallback = Callable[..., Awaitable[None]]
+
+
+async def _send(callback: ProgressCallback, args: tuple):
+    """推送一条进度，发送失败只记录日志，不影响任务和其他等待者"""
+    try:
+        await callback(*args)
+    # 各平台适配器的发送异常没有共同的基类
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"[single_flight] 进度推送失败: {e}")
+
+
+class _Flight:
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.subscribers: list[ProgressCallback] = []
+        self.waiters = 0
+        self.cancelled = False
+        self.last_progress: tuple | None = None
+
+    async def broadcast(self, *args):
+        """把进度推送给所有等待者，单个等待者发送失败不影响其他人"""
+        self.last_progress = args
+        for callback in list(self.subscribers):
+            await _send(callback, args)
+
+
+class SingleFlight:
+    """
+    合并相同 key 的并发任务
+
+    同一个 key 同时只会执行一次，后来的请求挂到正在执行的任务上，
+    任务结束后所有等待者拿到同一个结果；任务产生的进度会推送给每个等待者。
+    所有等待者都离开后任务会被取消；取消的任务收尾期间到达的新请求等它结束后
+    重新开始，不会加入即将以取消告终的任务，也不会与它并发执行。
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def waiters(self, key: Hashable) -> int:
+        flight = self._flights.get(key)
+        return flight.waiters if flight else 0
+
+    async def run(
+        self,
+        key: Hashable,
+        job: Callable[[ProgressCallback], Awaitable[Any]],
+        on_progress: ProgressCallback | None = None,
+    ) -> Any:
+        """
+        执行或加入 key 对应的任务
+
+        job 接收一个进度回调协程函数，调用它即可把进度推送给所有等待者。
+        """
+        flight = self._flights.get(key)
+        while flight is not None and flight.cancelled:
+            await asyncio.wait([flight.task])
+            flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(job(flight.broadcast))
+            flight.task.add_done_callback(lambda _: self._flights.pop(key, None))
+        flight.waiters += 1
+        try:
+            if on_progress is not None and flight.last_progress is not None:
+                # 后加入的等待者补发最近一次进度
+                await _send(on_progress, flight.last_progress)
+            if on_progress is not None:
+                flight.subscribers.append(on_progress)
+            # shield: 某个等待者被取消时不影响任务本身和其他等待者
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if on_progress is not None and on_progress in flight.subscribers:
+                flight.subscribers.remove(on_progress)
+            if flight.waiters == 0 and not flight.task.done():
+                # 已经没有人在等待结果，取消任务（排队中的任务会直接出队）
+                logger.info(f"[single_flight] 任务 {key} 已无等待者，取消")
+                flight.cancelled = True
+                flight.task.cancel()
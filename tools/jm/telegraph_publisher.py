@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import time
+
+from astrbot.api import logger
+from telegraph.aio import RetryAfterError, Telegraph, TelegraphException
+
+from ..metrics.registry import metrics
+
+# Telegraph 单页内容上限约 64KB，留出 JSON 节点结构的余量
+MAX_PAGE_HTML = 48 * 1024
+
+
+class AdaptiveTokenBucket:
+    """
+    令牌桶限速器，根据 RetryAfterError 自动调整速率
+
+    触发限流时所有请求暂停 retry_after 秒并把速率减半，暂停期间不积累令牌；
+    之后每次成功请求都会小幅提高速率，直到恢复到初始值。
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 3, min_rate: float = 0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + 0.05)
+
+    def on_retry_after(self, retry_after: float):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0
+        self._blocked_until = max(
+            self._blocked_until, time.monotonic() + retry_after + 1
+        )
+        # 暂停期间不积累令牌，恢复后按降低的速率逐个放行，而不是立即突发
+        self._updated = self._blocked_until
+
+
+def split_chapter_html(header: str, image_urls: list[str]) -> list[str]:
+    """
+    拼接章节 HTML，超过单页大小时按图片拆分为多页
+    """
+    pages: list[str] = []
+    parts = [header]
+    size = len(header.encode())
+    for image_url in image_urls:
+        tag = f"<img src='{image_url}'></img>"
+        tag_size = len(tag.encode())
+        if size + tag_size > MAX_PAGE_HTML and len(parts) > 1:
+            pages.append("".join(parts))
+            parts = [header]
+            size = len(header.encode())
+        parts.append(tag)
+        size += tag_size
+    pages.append("".join(parts))
+    return pages
+
+
+class TelegraphPublisher:
+    """
+    复用同一个 Telegraph 账号并发发布页面
+
+    账号 token 保存在 token_path 中，重启后继续使用；
+    页面并发创建，由自适应令牌桶控制请求速率。
+    """
+
+    def __init__(self, token_path: str, concurrency: int = 4):
+        self.token_path = token_path
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._bucket = AdaptiveTokenBucket()
+        self._telegraph: Telegraph | None = None
+        self._account_lock = asyncio.Lock()
+
+    def _load_token(self) -> str | None:
+        if not os.path.exists(self.token_path):
+            return None
+        with open(self.token_path, encoding="utf-8") as f:
+            return json.load(f).get("access_token")
+
+    def _save_token(self, token: str):
+        with open(self.token_path, "w", encoding="utf-8") as f:
+            json.dump({"access_token": token}, f)
+
+    def _remove_token(self):
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+
+    async def _client(self) -> Telegraph:
+        async with self._account_lock:
+            if self._telegraph is not None:
+                return self._telegraph
+            # token 文件的读写放在工作线程中，不阻塞事件循环
+            token = await asyncio.to_thread(self._load_token)
+            telegraph = Telegraph(access_token=token)
+            if not token:
+                account = await telegraph.create_account(short_name="1337")
+                logger.info("[telegraph] 已创建新的 Telegraph 账号")
+                await asyncio.to_thread(self._save_token, account["access_token"])
+            self._telegraph = telegraph
+            return telegraph
+
+    async def _reset(self, stale: Telegraph):
+        async with self._account_lock:
+            if self._telegraph is stale:
+                self._telegraph = None
+                await asyncio.to_thread(self._remove_token)
+
+    async def _create_page(self, title: str, html_content: str) -> str:
+        telegraph = await self._client()
+        async with self._semaphore:
+            while True:
+                with metrics.timer("telegraph_wait"):
+                    await self._bucket.acquire()
+                try:
+                    with metrics.timer("telegraph_publish"):
+                        response = await telegraph.create_page(
+                            title, html_content=html_content
+                        )
+                    self._bucket.on_success()
+                    metrics.inc("telegraph_pages")
+                    return response["url"]
+                except RetryAfterError as e:
+                    # 如果触发限制，所有请求一起暂停并降低速率
+                    logger.info(
+                        f"Telegraph 限制频率（Flood control），需要等待 {e.retry_after} 秒..."
+                    )
+                    metrics.inc("retries", source="telegraph_retry_after")
+                    metrics.inc("telegraph_retry_after_seconds", e.retry_after)
+                    self._bucket.on_retry_after(e.retry_after)
+                except TelegraphException as e:
+                    if "ACCESS_TOKEN" not in str(e):
+                        raise
+                    # 缓存的 token 失效，重新创建账号后重试
+                    logger.info("[telegraph] 账号 token 已失效，重新创建账号")
+                    metrics.inc("retries", source="telegraph_token")
+                    await self._reset(telegraph)
+                    telegraph = await self._client()
+
+    async def publish(self, pages: list[tuple[str, str]]) -> list[str]:
+        """并发发布 (标题, HTML) 列表，返回顺序与输入一致的链接列表"""
+        return list(
+            await asyncio.gather(
+                *(self._create_page(title, html) for title, html in pages)
+            )
+        )
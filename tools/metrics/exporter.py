@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+from aiohttp import web
+from astrbot.api import logger
+
+from .registry import Metrics
+
+
+class MetricsExporter:
+    """
+    把运行指标以 Prometheus 文本格式导出
+
+    textfile 不为空时定期原子写入该文件（供 node_exporter 的 textfile collector 读取）；
+    port 大于 0 时在本机 host:port/metrics 提供 HTTP 抓取端点。两者都是可选的。
+    """
+
+    def __init__(
+        self,
+        registry: Metrics,
+        textfile: str = "",
+        port: int = 0,
+        host: str = "127.0.0.1",
+        interval: float = 15,
+    ):
+        self.registry = registry
+        self.textfile = textfile
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self._runner: web.AppRunner | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self.port > 0:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            try:
+                await web.TCPSite(self._runner, self.host, self.port).start()
+            except OSError as e:
+                logger.error(f"[metrics] 监听 {self.host}:{self.port} 失败: {e}")
+                await self._runner.cleanup()
+                self._runner = None
+            else:
+                logger.info(
+                    f"[metrics] 指标端点 http://{self.host}:{self.port}/metrics"
+                )
+        if self.textfile:
+            self._task = asyncio.create_task(self._write_loop())
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.registry.render_prometheus(),
+            content_type="text/plain",
+            charset="utf-8",
+        )
+
+    def write_textfile(self):
+        tmp = self.textfile + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.registry.render_prometheus())
+        os.replace(tmp, self.textfile)
+
+    async def _write_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.write_textfile)
+            except OSError as e:
+                logger.warning(f"[metrics] 写入指标文件失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
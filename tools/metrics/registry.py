@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# 每个阶段保留最近的耗时样本，用于估算分位数
+SAMPLE_SIZE = 512
+
+_NULL_TIMER = nullcontext()
+
+
+def _quantile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _StageStats:
+    __slots__ = ("count", "max", "samples", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: deque[float] = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+
+class _Timer:
+    __slots__ = ("registry", "stage", "start")
+
+    def __init__(self, registry: "Metrics", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    进程内的运行指标: 按阶段统计耗时，按名称和标签累加计数
+
+    下载线程和事件循环都会写入，内部用锁保护。enabled 为 False 时
+    timer() 返回共享的空上下文、inc() 直接返回，几乎没有额外开销。
+    """
+
+    def __init__(self, enabled: bool = True, namespace: str = "fanbook"):
+        self.enabled = enabled
+        self.namespace = namespace
+        self.started_at = time.time()
+        self._stages: dict[str, _StageStats] = {}
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage: str):
+        """统计一段代码耗时: with metrics.timer("pdf_merge"): ..."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        """记录一次已测得的阶段耗时（例如子进程中测量后带回的耗时）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats()
+            stats.add(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def counter(self, name: str, **labels: str) -> float:
+        """读取计数；不指定标签时返回该名称下所有标签的总和"""
+        with self._lock:
+            if labels:
+                return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def stage(self, stage: str) -> dict[str, float]:
+        with self._lock:
+            stats = self._stages.get(stage)
+            samples = list(stats.samples) if stats else []
+            count, total, peak = (
+                (stats.count, stats.total, stats.max) if stats else (0, 0.0, 0.0)
+            )
+        return {
+            "count": count,
+            "total": total,
+            "mean": total / count if count else 0.0,
+            "p50": _quantile(samples, 0.5),
+            "p99": _quantile(samples, 0.99),
+            "max": peak,
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = list(self._stages)
+            counters = dict(self._counters)
+        return {
+            "uptime": time.time() - self.started_at,
+            "stages": {stage: self.stage(stage) for stage in sorted(stages)},
+            "counters": counters,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        ns = self.namespace
+        snapshot = self.snapshot()
+        lines = [
+            f"# TYPE {ns}_uptime_seconds gauge",
+            f"{ns}_uptime_seconds {snapshot['uptime']:.3f}",
+            f"# TYPE {ns}_stage_seconds summary",
+        ]
+        for stage, stats in snapshot["stages"].items():
+            for q in ("0.5", "0.99"):
+                value = stats["p50"] if q == "0.5" else stats["p99"]
+                lines.append(
+                    f'{ns}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}'
+                )
+            lines.append(
+                f'{ns}_stage_seconds_sum{{stage="{stage}"}} {stats["total"]:.6f}'
+            )
+            lines.append(
+                f'{ns}_stage_seconds_count{{stage="{stage}"}} {stats["count"]}'
+            )
+
+        typed: set[str] = set()
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            metric = f"{ns}_{name}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            label_str = ",".join(
+                f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels
+            )
+            number = f"{value:.0f}" if float(value).is_integer() else repr(value)
+            lines.append(
+                f"{metric}{{{label_str}}} {number}"
+                if label_str
+                else f"{metric} {number}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+# 插件内共享的指标实例，由 main.py 根据配置开关
+metrics = Metrics()
@@ -0,0 +1,89 @@
+from .registry import Metrics
+
+# 阶段名称对应的中文说明，未列出的阶段直接显示名称
+STAGE_NAMES = {
+    "jm_request_file": "/jm 文件请求总耗时",
+    "jm_request_url": "/jm 链接请求总耗时",
+    "jm_queue_wait": "排队等待",
+    "jm_metadata_album": "本子详情获取",
+    "jm_metadata_photo": "章节详情获取",
+    "jm_download": "图片下载",
+    "pdf_convert": "章节 PDF 转换",
+    "pdf_merge": "PDF 合并",
+    "telegraph_wait": "Telegraph 限速等待",
+    "telegraph_publish": "Telegraph 发布",
+    "image_fetch": "番茄图片下载",
+    "fanqie_decode": "番茄解码",
+    "fanqie_permute": "番茄置换",
+    "fanqie_encode": "番茄编码",
+    "fanqie_watermark": "番茄水印",
+}
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def format_report(registry: Metrics) -> str:
+    """/jm stats 使用的文本报告"""
+    if not registry.enabled:
+        return "运行指标已关闭（配置项 metrics_enabled）。"
+    snapshot = registry.snapshot()
+    lines = [f"运行指标（统计 {snapshot['uptime'] / 3600:.1f} 小时）"]
+
+    stages = snapshot["stages"]
+    if stages:
+        lines.append("阶段耗时 (次数 / 平均 / p50 / p99 / 最大):")
+        for stage, stats in stages.items():
+            lines.append(
+                f"  {STAGE_NAMES.get(stage, stage)}: {stats['count']}次 / "
+                f"{stats['mean']:.2f}s / {stats['p50']:.2f}s / "
+                f"{stats['p99']:.2f}s / {stats['max']:.2f}s"
+            )
+
+    download_time = stages.get("jm_download", {}).get("total", 0)
+    images = registry.counter("jm_download_images")
+    if images:
+        size = registry.counter("jm_download_bytes")
+        lines.append(
+            f"本子下载: {int(images)}张 {_format_bytes(size)}，"
+            f"失败 {int(registry.counter('jm_download_failed_images'))}张"
+        )
+        if download_time:
+            lines.append(
+                f"  平均速度 {images / download_time:.1f}张/s，"
+                f"{_format_bytes(size / download_time)}/s"
+            )
+
+    caches: dict[str, dict[str, float]] = {}
+    for (name, labels), value in snapshot["counters"].items():
+        if name == "cache_requests":
+            label = dict(labels)
+            caches.setdefault(label["cache"], {})[label["result"]] = value
+    if caches:
+        lines.append("缓存命中:")
+        for cache, results in sorted(caches.items()):
+            total = sum(results.values())
+            hits = total - results.get("miss", 0)
+            lines.append(f"  {cache}: {int(hits)}/{int(total)} ({hits / total:.0%})")
+
+    retries = {
+        dict(labels)["source"]: value
+        for (name, labels), value in snapshot["counters"].items()
+        if name == "retries"
+    }
+    if retries:
+        lines.append(
+            "重试: "
+            + "，".join(f"{source} {int(n)}次" for source, n in sorted(retries.items()))
+        )
+    waited = registry.counter("telegraph_retry_after_seconds")
+    if waited:
+        lines.append(f"Telegraph 限流等待共 {waited:.0f} 秒")
+    if len(lines) == 1:
+        lines.append("暂无数据。")
+    return "\n".join(lines)
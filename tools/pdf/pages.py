@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+# 本模块不依赖 astrbot，页面转换函数会在子进程中执行
+
+# img2pdf 可以原样嵌入、无需重新编码的格式和色彩模式
+_PASSTHROUGH = {"JPEG": ("RGB", "L", "CMYK"), "PNG": ("RGB", "L")}
+
+# 图片没有记录 DPI 时 img2pdf 按这个值计算页面尺寸
+_DEFAULT_DPI = 96
+
+# 转换结果的缓存目录名，位于原图所在目录中，随原图目录一起删除
+PAGE_CACHE_DIR = ".pages"
+
+
+class PageOptions:
+    """
+    PDF 页面的规范化选项，可被 pickle 传入子进程
+
+    jpeg_quality: 重新编码为 JPEG 时的质量
+    max_width:    页面宽度上限（像素），更宽的图片等比缩小，0 表示不缩放；
+                  缩小时同比例降低 DPI，PDF 中的页面尺寸保持不变
+    cache:        把转换结果缓存在原图目录的 .pages 中，重新生成 PDF 时不再解码
+    """
+
+    def __init__(self, jpeg_quality: int = 90, max_width: int = 0, cache: bool = True):
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max(0, max_width)
+        self.cache = cache
+
+    def cache_tag(self) -> str:
+        """参与缓存文件名的转换参数"""
+        return f"q{self.jpeg_quality}w{self.max_width}"
+
+
+def _cache_name(src_path: str, options: PageOptions) -> str:
+    # 原图的大小和修改时间变化后（例如重新下载）缓存自动失效
+    st = os.stat(src_path)
+    key = f"{st.st_size}:{st.st_mtime_ns}:{options.cache_tag()}"
+    digest = hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+    name = os.path.splitext(os.path.basename(src_path))[0]
+    return f"{name}-{digest}"
+
+
+def _cached(dst_dir: str, stem: str) -> str | None:
+    for ext in (".jpg", ".png"):
+        path = os.path.join(dst_dir, stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _prepare(img: Image.Image, options: PageOptions) -> tuple[Image.Image, str, dict]:
+    """按选项缩放图片并选择编码格式，返回 (图片, 扩展名, save 参数)"""
+    dpi = img.info.get("dpi", (_DEFAULT_DPI, _DEFAULT_DPI))
+    if options.max_width and img.width > options.max_width:
+        scale = options.max_width / img.width
+        # JPEG 会按 draft 模式在解码时直接缩小，省去大部分解码开销
+        img.thumbnail((options.max_width, img.height), Image.Resampling.LANCZOS)
+        dpi = (dpi[0] * scale, dpi[1] * scale)
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        return img, ".png", {"format": "PNG", "compress_level": 1, "dpi": dpi}
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return img, ".jpg", {"format": "JPEG", "quality": options.jpeg_quality, "dpi": dpi}
+
+
+def encode_page(img: Image.Image, options: PageOptions | None = None) -> bytes:
+    """把内存中的图片编码为 img2pdf 可以直接嵌入的数据，规则与 normalize_page 相同"""
+    img, _, save = _prepare(img, options or PageOptions())
+    output = io.BytesIO()
+    img.save(output, **save)
+    return output.getvalue()
+
+
+def normalize_page(
+    src_path: str, dst_dir: str | None = None, options: PageOptions | None = None
+) -> str:
+    """
+    把一张图片转换为 img2pdf 可以直接嵌入的文件，返回其路径
+
+    不需要缩放的 JPEG 和不透明 PNG 原样返回；其他图片解码后，不透明的编码为 JPEG，
+    带透明通道的编码为 PNG。dst_dir 为 None 时写入原图目录下的缓存目录，
+    已有相同参数的转换结果时直接返回，不再解码。
+    """
+    options = options or PageOptions()
+    cache_dir = dst_dir is None
+    if cache_dir:
+        dst_dir = os.path.join(os.path.dirname(src_path), PAGE_CACHE_DIR)
+        stem = _cache_name(src_path, options)
+        if hit := _cached(dst_dir, stem):
+            return hit
+        os.makedirs(dst_dir, exist_ok=True)
+    else:
+        stem = os.path.splitext(os.path.basename(src_path))[0]
+
+    with Image.open(src_path) as img:
+        resize = options.max_width and img.width > options.max_width
+        if (
+            not resize
+            and img.mode in _PASSTHROUGH.get(img.format, ())
+            and not img.info.get("interlace")
+        ):
+            return src_path
+        img, ext, save = _prepare(img, options)
+        dst_path = os.path.join(dst_dir, stem + ext)
+        # 先写临时文件再改名，多个进程同时转换同一页时不会读到半截文件
+        tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+        img.save(tmp_path, **save)
+    os.replace(tmp_path, dst_path)
+    return dst_path
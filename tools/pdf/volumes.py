@@ -0,0 +1,141 @@
+import os
+from collections.abc import Callable
+
+import pikepdf
+
+VOLUME_MODES = ("off", "chapter", "size")
+
+# 估算单页体积时图片数据之外的固定开销（字节）
+_PAGE_OVERHEAD = 1024
+
+
+class VolumeOptions:
+    """
+    分卷输出选项
+
+    mode:
+        off     整本生成一个 PDF
+        chapter 每个章节一卷
+        size    按预算分卷，每卷不超过 max_bytes 字节和 max_pages 页（0 表示不限制），
+                单页超过预算时单独成卷；超长章节会在章节中间分卷
+    """
+
+    def __init__(self, mode: str = "off", max_bytes: int = 0, max_pages: int = 0):
+        self.mode = mode if mode in VOLUME_MODES else "off"
+        self.max_bytes = max(0, max_bytes)
+        self.max_pages = max(0, max_pages)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def tag(self) -> str:
+        """分卷参数的标记，参数变化后已缓存的分卷不再复用"""
+        if self.mode == "chapter":
+            return "chapter"
+        return f"{self.max_bytes // 1024}k{self.max_pages}p"
+
+
+def volume_files(volume_dir: str) -> list[str]:
+    """按卷号顺序返回分卷目录中的 PDF"""
+    return [
+        os.path.join(volume_dir, name)
+        for name in sorted(os.listdir(volume_dir))
+        if name.lower().endswith(".pdf")
+    ]
+
+
+def _page_bytes(page: pikepdf.Page) -> int:
+    # 页面体积基本等于其中图片数据流的长度，不需要真正写出就能估算
+    size = _PAGE_OVERHEAD
+    for image in page.images.values():
+        size += int(image.get("/Length", 0))
+    return size
+
+
+class VolumeWriter:
+    """
+    把章节 PDF 按顺序组合为分卷
+
+    add_chapter 每次加入一个章节，返回因此写完的分卷路径，调用方可以立即发送；
+    finish 写出最后一卷。只复制页面引用，不重新编码图片。
+    path_for(卷号, 是否不完整) 决定分卷的文件路径，卷号从 1 开始。
+    """
+
+    def __init__(
+        self,
+        options: VolumeOptions,
+        path_for: Callable[[int, bool], str],
+        title: str,
+    ):
+        self.options = options
+        self.path_for = path_for
+        self.title = title
+        self.volumes: list[str] = []
+        self._pdf: pikepdf.Pdf | None = None
+        self._sources: list[pikepdf.Pdf] = []
+        self._bytes = 0
+        self._pages = 0
+        self._partial = False
+
+    def _full(self, page_bytes: int) -> bool:
+        if not self._pages or self.options.mode != "size":
+            return False
+        if self.options.max_pages and self._pages >= self.options.max_pages:
+            return True
+        return bool(
+            self.options.max_bytes and self._bytes + page_bytes > self.options.max_bytes
+        )
+
+    def add_chapter(self, part_pdf: str, complete: bool = True) -> list[str]:
+        finished = []
+        src = pikepdf.Pdf.open(part_pdf)
+        self._sources.append(src)
+        for page in src.pages:
+            page_bytes = _page_bytes(page)
+            if self._full(page_bytes):
+                finished.append(self._flush(keep=src))
+            if self._pdf is None:
+                self._pdf = pikepdf.Pdf.new()
+            self._pdf.pages.append(page)
+            self._bytes += page_bytes
+            self._pages += 1
+            self._partial |= not complete
+        if self.options.mode == "chapter" and self._pages:
+            finished.append(self._flush())
+        return finished
+
+    def finish(self) -> list[str]:
+        if not self._pages:
+            self.close()
+            return []
+        return [self._flush()]
+
+    def _flush(self, keep: pikepdf.Pdf | None = None) -> str:
+        index = len(self.volumes) + 1
+        path = self.path_for(index, self._partial)
+        title = f"{self.title} 第{index}卷"
+        if self._partial:
+            title += "（不完整）"
+        self._pdf.docinfo["/Title"] = title
+        self._pdf.save(path)
+        self._pdf.close()
+        self._pdf = None
+        # 正在读取的章节还有页面要放进下一卷，暂不关闭
+        for src in self._sources:
+            if src is not keep:
+                src.close()
+        self._sources = [keep] if keep is not None else []
+        self._bytes = 0
+        self._pages = 0
+        self._partial = False
+        self.volumes.append(path)
+        return path
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        for src in self._sources:
+            src.close()
+        self._sources = []
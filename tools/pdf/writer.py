@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Executor
+
+import img2pdf
+import pikepdf
+
+from .pages import PageOptions, normalize_page
+
+# 本模块不依赖 astrbot，页面转换函数会在子进程中执行
+
+
+def merge_pdfs(pdf_paths: list[str], output_pdf: str, title: str | None = None):
+    """
+    按顺序把多个 PDF 合并为一个文件，可选写入文档标题
+
+    pikepdf 按需从源文件读取页面数据，合并时不会把所有页面同时读入内存。
+    """
+    with pikepdf.Pdf.new() as merged:
+        sources = []
+        try:
+            for path in pdf_paths:
+                src = pikepdf.Pdf.open(path)
+                sources.append(src)
+                merged.pages.extend(src.pages)
+            if title:
+                merged.docinfo["/Title"] = title
+            merged.save(output_pdf)
+        finally:
+            for src in sources:
+                src.close()
+
+
+class StreamingPdfWriter:
+    """
+    逐页写入 PDF，内存占用只与单批页数有关
+
+    每攒够 batch_pages 页就用 img2pdf 写出一个分段 PDF 到磁盘，
+    close 时再用 pikepdf 把分段依次合并为最终文件。
+    """
+
+    def __init__(self, output_pdf: str, batch_pages: int = 32):
+        self.output_pdf = output_pdf
+        self.batch_pages = max(1, batch_pages)
+        self.page_count = 0
+        self._batch: list[str] = []
+        self._parts: list[str] = []
+        self._tmp_dir = tempfile.mkdtemp(
+            prefix=".pdfparts_", dir=os.path.dirname(os.path.abspath(output_pdf))
+        )
+
+    def add_page(self, image: str | bytes):
+        """加入一页，image 为图片路径或 img2pdf 可以直接嵌入的图片数据"""
+        self._batch.append(image)
+        self.page_count += 1
+        if len(self._batch) >= self.batch_pages:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        part = os.path.join(self._tmp_dir, f"{len(self._parts):06d}.pdf")
+        with open(part, "wb") as f:
+            img2pdf.convert(self._batch, outputstream=f)
+        self._parts.append(part)
+        self._batch = []
+
+    def close(self) -> int:
+        """写出剩余页面并生成最终 PDF，返回总页数"""
+        try:
+            self._flush()
+            if len(self._parts) == 1:
+                shutil.move(self._parts[0], self.output_pdf)
+            elif self._parts:
+                merge_pdfs(self._parts, self.output_pdf)
+            return self.page_count
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+
+class OrderedPageWriter:
+    """
+    按页码顺序写入乱序到达的页面
+
+    多个下载线程并发调用 put，连续的页面立即交给 StreamingPdfWriter，
+    只有排在空缺后面的页面暂存在内存中。close 时缺失的页码直接跳过。
+    """
+
+    def __init__(self, output_pdf: str, first_index: int = 1, batch_pages: int = 32):
+        self.writer = StreamingPdfWriter(output_pdf, batch_pages=batch_pages)
+        self.tmp_dir = self.writer._tmp_dir
+        self._next = first_index
+        self._pending: dict[int, str | bytes] = {}
+        self._lock = threading.Lock()
+
+    def put(self, index: int, image: str | bytes):
+        with self._lock:
+            self._pending[index] = image
+            while self._next in self._pending:
+                self.writer.add_page(self._pending.pop(self._next))
+                self._next += 1
+
+    def close(self) -> int:
+        """写出剩余页面并生成 PDF，返回总页数"""
+        with self._lock:
+            try:
+                for index in sorted(self._pending):
+                    self.writer.add_page(self._pending.pop(index))
+            except BaseException:
+                self.writer.abort()
+                raise
+        return self.writer.close()
+
+    def abort(self):
+        self.writer.abort()
+
+
+def images_to_pdf(
+    image_paths: list[str],
+    output_pdf: str,
+    executor: Executor | None = None,
+    batch_pages: int = 32,
+    options: PageOptions | None = None,
+) -> int:
+    """
+    把一组图片按给定顺序写成 PDF，返回页数
+
+    提供 executor（通常是进程池）时页面规范化并行执行，结果仍按原顺序写入。
+    options.cache 为真时转换结果保存在原图目录中，否则写入临时目录，用完即删。
+    """
+    options = options or PageOptions(cache=False)
+    writer = StreamingPdfWriter(output_pdf, batch_pages=batch_pages)
+    pages_dir = (
+        None
+        if options.cache
+        else tempfile.mkdtemp(prefix=".pages_", dir=writer._tmp_dir)
+    )
+    try:
+        if executor is None:
+            converted = (normalize_page(p, pages_dir, options) for p in image_paths)
+        else:
+            converted = executor.map(
+                normalize_page,
+                image_paths,
+                [pages_dir] * len(image_paths),
+                [options] * len(image_paths),
+                chunksize=4,
+            )
+        for page_path in converted:
+            writer.add_page(page_path)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
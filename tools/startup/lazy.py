@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+
+from astrbot.api import logger
+
+# 插件模块和各延迟模块的导入耗时（秒），按导入顺序排列
+import_times: dict[str, float] = {}
+
+
+class LazyModule:
+    """
+    第一次访问属性时才导入的模块
+
+    插件加载时只创建这个外壳，jmcomic、img2pdf、NumPy 等重量级依赖等到第一次使用时
+    才导入，闲置的机器人不必为它们付出加载时间和常驻内存。
+    在事件循环中应先 await aload()，导入在工作线程中进行，不会阻塞其他消息。
+    """
+
+    def __init__(self, name: str, package: str | None = None):
+        self.name = name
+        self.package = package
+        self.label = name.rsplit(".", 1)[-1]
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    name = importlib.util.resolve_name(self.name, self.package)
+                    # 已经随其他模块导入的不再计入耗时
+                    imported = name in sys.modules
+                    start = time.perf_counter()
+                    module = importlib.import_module(name)
+                    if not imported:
+                        seconds = time.perf_counter() - start
+                        import_times[self.label] = seconds
+                        logger.info(
+                            f"[lazy] 导入 {self.label} 耗时 {seconds * 1000:.0f}ms"
+                        )
+                    self._module = module
+        return self._module
+
+    async def aload(self):
+        if self._module is None:
+            await asyncio.to_thread(self.load)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+
+def warm_up(modules: list[LazyModule]):
+    """依次导入全部模块，在工作线程中调用；导入失败只记录日志，等到使用时再报错"""
+    for module in modules:
+        try:
+            module.load()
+        except ImportError as e:
+            logger.warning(f"[lazy] 预热 {module.label} 失败: {e}")
+
+
+def import_report(modules: list[LazyModule]) -> list[str]:
+    """各模块的导入耗时，用于 /jm stats"""
+    lines = [
+        f"{label}: {seconds * 1000:.0f}ms" for label, seconds in import_times.items()
+    ]
+    idle = [module.label for module in modules if not module.loaded]
+    if idle:
+        lines.append("未加载: " + "、".join(idle))
+    return lines